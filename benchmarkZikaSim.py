@@ -0,0 +1,831 @@
+#!/usr/bin/python3
+"""
+benchmarkZikaSim.py times the simulator on synthetic airport networks so we can
+see how it scales past the 25 hub list towards OpenFlights sized networks.
+
+Usage:
+    benchmarkZikaSim.py [-j] [number of airports ...]
+    benchmarkZikaSim.py -e|-a|-p|-f|-o <airport database> <route database>
+        <mosquito curves database>
+    benchmarkZikaSim.py -s [--json=<results .json>] [--sizes=<airports,...>]
+        <airport database> <route database> <mosquito curves database>
+    benchmarkZikaSim.py -t [<airport database> <route database>
+        <mosquito curves database>]
+
+Each size writes airport, route and mosquito curve files in the same format
+as the ./Data files, builds the network with create_network() and from a
+zikaCache.py snapshot, times the infection() time steps of both engines and
+of the numpy engine with expected imports, and a simulated year with the
+numpy engine with its peak memory.
+
+Flags:
+    -s          Run the benchmark suite: create_network(), a 365 day run
+                with each engine, updateIDic() and the -a sweep on the given
+                data and on synthetic networks with the power law out
+                degrees of ./Data/powerLawData.csv, written as JSON with the
+                time, CPU time and peak memory of each
+    -t          Time a fresh interpreter importing zikaSim.py, zikaSweep.py
+                and zikaEngine.py, listing the plotting and stats modules
+                each loads, and a plain zikaSim.py run on the given data
+    -j          Time the numpy engine with and without the Numba compiled
+                loop of zikaKernel.py on synthetic networks of the given
+                sizes, with the compile time reported on its own
+    -e          Check that the python and numpy engines produce the same
+                I, S, V and R trajectories for every city on the given data
+    -a          Time the -a sweep of every city and month one scenario at a
+                time against the batched numpy sweep on the given data
+    -p          Time the -a sweep on 1, 2, 4, ... worker processes up to the
+                number of CPUs with zikaSweep.py on the given data
+    -f          Time the python engine stepping every airport against only
+                the active ones, on late season and low TAU runs of every
+                city on the given data
+    -o          Compare the CPU time and the error of the zikaODE.py solver
+                at a range of tolerances and of the numpy stepper against
+                the python stepper, on an outbreak of the given data
+"""
+
+# python benchmarkZikaSim.py 25 500 2000 7000
+# python benchmarkZikaSim.py -e ./Data/airportsMin.csv
+# ./Data/airlineRoutesPassengerData.csv ./Data/mosCurves.csv
+# python benchmarkZikaSim.py -a ./Data/airportsMin.csv
+# ./Data/airlineRoutesPassengerData.csv ./Data/mosCurves.csv
+# python benchmarkZikaSim.py -s --json=bench.json ./Data/airportsMin.csv
+# ./Data/airlineRoutesPassengerData.csv ./Data/mosCurves.csv
+
+import bisect
+import collections
+import contextlib
+import datetime
+import getopt
+import io
+import itertools
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import zikaCache
+import zikaEngine
+import zikaHistory
+import zikaKernel
+import zikaODE
+import zikaSim
+import zikaSweep
+
+
+DEFAULT_SIZES = [25, 500, 2000, 7000]
+ROUTES_PER_AIRPORT = 20  # OpenFlights averages about 20 routes per airport
+STEPS = 10
+SCHEDULER_RUNS = ((300, zikaSim.TAU), (1, 0.05))  # (date to infect, TAU)
+ODE_TOLERANCES = [1e-2, 1e-3, 1e-4, 1e-5, 1e-6, 1e-7]
+ODE_DATE = 125  # infect in May, when the outbreak spreads (--d 125)
+POWER_LAW_DATA = "./Data/powerLawData.csv"
+SUITE_SIZES = [100, 500, 2000]
+SWEEP_HUBS = 25  # hubs of the -a sweep on synthetic networks, like the data
+STARTUP_MODULES = ["zikaSim", "zikaSweep", "zikaEngine"]
+HEAVY_MODULES = ["matplotlib", "mpl_toolkits.basemap", "scipy.stats",
+                 "scipy.integrate", "networkx", "numba", "pyproj"]
+STARTUP_RUNS = 5  # fresh interpreters per measurement, the fastest is kept
+STARTUP_CODE = ("import sys, time\n"
+                "begin = time.perf_counter()\n"
+                "import {module}\n"
+                "print(time.perf_counter() - begin)\n"
+                "print(' '.join(name for name in {heavy} "
+                "if name in sys.modules))\n")
+
+
+def powerLawDegrees(numAirports, path=POWER_LAW_DATA, seed=1):
+    """
+    Draw an out degree for every airport from the distribution of out degrees
+    of the domestic airports written by powerLawAirlineRoutes.py
+
+    Args:
+        numAirports: Number of airports in the network
+        path: The file path to the [number of degrees, count] .csv file
+        seed: Seed for the random generator so runs are repeatable
+
+    Returns:
+        List of the number of outgoing routes of every airport
+    """
+
+    degrees = list()
+    counts = list()
+    with open(path, 'r') as f:
+        for line in f:
+            degree, count = line.split(",")
+            degrees.append(int(degree))
+            counts.append(int(count))
+
+    rand = random.Random(seed)
+    return [min(degree, numAirports - 1)
+            for degree in rand.choices(degrees, counts, k=numAirports)]
+
+
+def writeSyntheticNetwork(directory, numAirports, routesPerAirport, seed=1):
+    """
+    Write airport, route and mosquito curve files for a random network
+
+    Args:
+        directory: Folder to write the three .csv files to
+        numAirports: Number of airports in the network
+        routesPerAirport: Number of outgoing routes from each airport, or a
+            list with the number of every airport, e.g. from
+            powerLawDegrees(), whose destinations are then drawn in
+            proportion to their own number of routes so hubs connect to hubs
+        seed: Seed for the random generator so runs are repeatable
+
+    Returns:
+        Paths to the airport, route and mosquito curve files
+    """
+
+    rand = random.Random(seed)
+    airportsFile = os.path.join(directory, "airports.csv")
+    routesFile = os.path.join(directory, "routes.csv")
+    curvesFile = os.path.join(directory, "curves.csv")
+
+    codes = ["X" + str(i) for i in range(1, numAirports + 1)]
+
+    with open(airportsFile, 'w') as f, open(curvesFile, 'w') as c:
+        for i, code in enumerate(codes, 1):
+            f.write(",".join([str(i), "Airport " + code, code,
+                              str(rand.uniform(10, 80)),
+                              str(rand.uniform(-160, -60)),
+                              str(rand.randint(100000, 5000000)), "\n"]))
+            c.write(",".join([str(i), code] +
+                             [str(rand.choice([0, 0.33, 0.67, 1]))
+                              for _ in range(zikaSim.MONTHS_IN_YEAR)]) + "\n")
+
+    degrees = routesPerAirport if isinstance(routesPerAirport, list) else None
+    if degrees is not None:
+        cumulative = list(itertools.accumulate(degrees))
+
+    with open(routesFile, 'w') as f:
+        for i, code in enumerate(codes, 1):
+            if degrees is None:
+                destinations = rand.sample(range(1, numAirports + 1),
+                                           min(routesPerAirport,
+                                               numAirports - 1) + 1)
+            else:
+                # Distinct destinations, so a few less for the biggest hubs
+                destinations = {bisect.bisect(cumulative, rand.random() *
+                                              cumulative[-1]) + 1
+                                for _ in range(degrees[i - 1])}
+            for j in destinations:
+                if j != i:
+                    f.write(",".join([code, str(i), codes[j - 1], str(j),
+                                      str(float(rand.randint(365, 2000000))),
+                                      "\n"]))
+
+    return airportsFile, routesFile, curvesFile
+
+
+def benchmarkSize(numAirports):
+    """
+    Time network creation and infection() steps for one network size
+
+    Args:
+        numAirports: Number of airports in the synthetic network
+
+    Returns:
+        Dictionary of timings in seconds
+    """
+
+    with tempfile.TemporaryDirectory() as directory:
+        files = writeSyntheticNetwork(directory, numAirports,
+                                      ROUTES_PER_AIRPORT)
+        with contextlib.redirect_stdout(io.StringIO()):
+            begin = time.perf_counter()
+            network = zikaSim.create_network(*files)
+            buildTime = time.perf_counter() - begin
+
+            cacheDir = os.path.join(directory, "Cache")
+            zikaCache.cachedNetwork(*files, zikaSim.create_network, cacheDir)
+            begin = time.perf_counter()
+            zikaCache.cachedNetwork(*files, zikaSim.create_network, cacheDir,
+                                    routes=False)
+            snapshotTime = time.perf_counter() - begin
+
+            simulation = zikaSim.Simulation(network, cityToInfect="X1",
+                                            dateToInfect=0)
+            begin = time.perf_counter()
+            for i in range(STEPS):
+                simulation.infection(i * simulation.incubation)
+            stepTime = (time.perf_counter() - begin) / STEPS
+
+            arrays = simulation.getArrays()
+            params = simulation.params()
+            state = zikaEngine.setupState(arrays, [("X1", 0)], params)
+            begin = time.perf_counter()
+            for i in range(STEPS):
+                zikaEngine.infection(arrays, state, i * simulation.incubation,
+                                     params)
+            arrayStepTime = (time.perf_counter() - begin) / STEPS
+
+            params = dict(params, IMPORTS="expected")
+            state = zikaEngine.setupState(arrays, [("X1", 0)], params)
+            begin = time.perf_counter()
+            for i in range(STEPS):
+                zikaEngine.infection(arrays, state, i * simulation.incubation,
+                                     params)
+            expectedStepTime = (time.perf_counter() - begin) / STEPS
+
+            # A whole simulated year with the numpy engine and the most
+            # memory it holds at once
+            simulation = zikaSim.Simulation(network, cityToInfect="X1",
+                                            engine="numpy")
+            tracemalloc.start()
+            begin = time.perf_counter()
+            simulation.run()
+            yearTime = time.perf_counter() - begin
+            yearMemory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+    return {"airports": numAirports,
+            "routes": len(network.graph["routeInfo"]),
+            "build": buildTime, "snapshot": snapshotTime, "step": stepTime,
+            "arrayStep": arrayStepTime, "expectedStep": expectedStepTime,
+            "year": yearTime, "yearMemory": yearMemory}
+
+
+def compareEngines(airports, routes, curves):
+    """
+    Run every city with a few infection dates, vaccination and screening
+    settings through both engines and compare the I, S, V, R trajectories
+
+    Args:
+        airports: The file path to the airports .csv file
+        routes: The file path to the routes .csv file
+        curves: The file path to the mosquito curves .csv file
+
+    Returns:
+        Number of scenarios whose trajectories differ
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        network = zikaSim.create_network(airports, routes, curves)
+
+    mismatches = 0
+    scenarios = 0
+    for airport in list(network.graph["approvedAirports"]):
+        for date, vaccinate, screen in ((1, False, 0), (125, True, 0),
+                                        (200, False, 0.5)):
+            results = list()
+            for engine in ("python", "numpy"):
+                simulation = zikaSim.Simulation(network, cityToInfect=airport,
+                                                dateToInfect=date,
+                                                vaccinate=vaccinate,
+                                                screenPerc=screen,
+                                                engine=engine)
+                with contextlib.redirect_stdout(io.StringIO()):
+                    simulation.run()
+                results.append(simulation.history)
+            expected, actual = results
+
+            scenarios += 1
+            if not np.array_equal(expected.data[:expected.length],
+                                  actual.data[:actual.length]):
+                mismatches += 1
+                print("MISMATCH", airport, date, vaccinate, screen)
+
+    print(scenarios, "scenarios compared,", mismatches, "mismatches")
+    return mismatches
+
+
+def benchmarkRunAll(airports, routes, curves):
+    """
+    Time the -a sweep one scenario at a time and with the batched engine
+
+    Args:
+        airports: The file path to the airports .csv file
+        routes: The file path to the routes .csv file
+        curves: The file path to the mosquito curves .csv file
+
+    Returns:
+        True if both sweeps give the same infectionAllStats
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        network = zikaSim.create_network(airports, routes, curves)
+        simulation = zikaSim.Simulation(network)
+        simulation.getArrays()
+
+        begin = time.perf_counter()
+        batched = simulation.runAllScenarios()
+        batchedTime = time.perf_counter() - begin
+
+        begin = time.perf_counter()
+        expected = simulation.runAll()
+        loopTime = time.perf_counter() - begin
+
+    print("%d scenarios" % sum(len(stats) for stats in expected.values()))
+    print("one at a time     %10.3f s" % loopTime)
+    print("batched numpy     %10.3f s (%.0fx)" % (batchedTime,
+                                                 loopTime / batchedTime))
+    print("results match" if batched == expected else "RESULTS DIFFER")
+    return batched == expected
+
+
+def benchmarkWorkers(airports, routes, curves):
+    """
+    Time the -a sweep on the process pool for a doubling number of workers
+
+    Args:
+        airports: The file path to the airports .csv file
+        routes: The file path to the routes .csv file
+        curves: The file path to the mosquito curves .csv file
+
+    Returns:
+        Nothing
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        network = zikaSim.create_network(airports, routes, curves)
+    simulation = zikaSim.Simulation(network)
+    arrays = simulation.getArrays()
+    tasks = zikaSweep.sweepTasks(list(simulation.approvedAirports),
+                                 list(range(1, zikaSim.DAYS_IN_YEAR,
+                                            zikaSim.DAYS_IN_MONTH)),
+                                 [simulation.tau], [simulation.vaccinatePerc],
+                                 [simulation.screenPerc], simulation.params())
+
+    print("%8s %10s %9s" % ("workers", "sweep (s)", "speedup"))
+    workers = 1
+    while workers <= os.cpu_count():
+        begin = time.perf_counter()
+        for result in zikaSweep.runSweep(arrays, tasks, workers):
+            pass
+        sweepTime = time.perf_counter() - begin
+        if workers == 1:
+            serialTime = sweepTime
+        print("%8d %10.3f %9.2f" % (workers, sweepTime,
+                                     serialTime / sweepTime))
+        sys.stdout.flush()
+        workers *= 2
+
+
+def benchmarkScheduler(airports, routes, curves):
+    """
+    Time full runs of every city with the python engine stepping every
+    airport and only the active ones, on runs that start late in the season
+    or spread slowly so most airports sit idle
+
+    Args:
+        airports: The file path to the airports .csv file
+        routes: The file path to the routes .csv file
+        curves: The file path to the mosquito curves .csv file
+
+    Returns:
+        True if both schedulers give the same I, S, V, R trajectories
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        network = zikaSim.create_network(airports, routes, curves)
+
+    match = True
+    print("%6s %8s %10s %13s %9s" % ("date", "TAU", "all (s)", "active (s)",
+                                     "speedup"))
+    for date, tau in SCHEDULER_RUNS:
+        times = dict()
+        histories = dict()
+        for scheduler in ("all", "active"):
+            times[scheduler] = 0
+            histories[scheduler] = list()
+            for airport in list(network.graph["approvedAirports"]):
+                simulation = zikaSim.Simulation(network, cityToInfect=airport,
+                                                dateToInfect=date, tau=tau,
+                                                scheduler=scheduler)
+                begin = time.perf_counter()
+                with contextlib.redirect_stdout(io.StringIO()):
+                    simulation.run()
+                times[scheduler] += time.perf_counter() - begin
+                history = simulation.history
+                histories[scheduler].append(history.data[:history.length])
+
+        match &= all(np.array_equal(expected, actual) for expected, actual in
+                     zip(histories["all"], histories["active"]))
+        print("%6d %8.3f %10.3f %13.3f %9.2f" % (
+            date, tau, times["all"], times["active"],
+            times["all"] / times["active"]))
+        sys.stdout.flush()
+
+    print("results match" if match else "RESULTS DIFFER")
+    return match
+
+
+def benchmarkJit(sizes):
+    """
+    Time a simulated year with the numpy engine stepping with NumPy
+    operations and with the compiled zikaKernel.py loop, after compiling the
+    kernel once so the warm up is kept out of the steady state times
+
+    Args:
+        sizes: numbers of airports of the synthetic networks
+
+    Returns:
+        True if both give the same I, S, V, R trajectories for every size
+    """
+
+    if not zikaKernel.available():
+        print("Numba is not installed")
+        return False
+
+    print("warm up (compile or load from cache) %.3f s" % zikaKernel.warmUp())
+    print("%8s %10s %11s %11s %9s" % ("airports", "steps", "numpy (s)",
+                                      "jit (s)", "speedup"))
+    match = True
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            files = writeSyntheticNetwork(directory, size, ROUTES_PER_AIRPORT)
+            with contextlib.redirect_stdout(io.StringIO()):
+                network = zikaSim.create_network(*files)
+
+        times = dict()
+        histories = dict()
+        for jit in (False, True):
+            simulation = zikaSim.Simulation(network, cityToInfect="X1",
+                                            engine="numpy", jit=jit)
+            begin = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                simulation.run()
+            times[jit] = time.perf_counter() - begin
+            history = simulation.history
+            histories[jit] = history.data[:history.length]
+
+        match &= np.array_equal(histories[False], histories[True])
+        print("%8d %10d %11.3f %11.3f %9.2f" % (
+            size, len(histories[True]), times[False], times[True],
+            times[False] / times[True]))
+        sys.stdout.flush()
+
+    print("results match" if match else "RESULTS DIFFER")
+    return match
+
+
+def infectedError(history, reference):
+    """
+    Largest difference of the total infected over the days both record,
+    relative to the peak of the reference
+
+    Args:
+        history: zikaHistory.History of a run
+        reference: zikaHistory.History of the reference run
+
+    Returns:
+        Relative error
+    """
+
+    days = np.intersect1d(history.days, reference.days)
+    infected = history.compartment("I").sum(axis=1)[
+        np.searchsorted(history.days, days)]
+    expected = reference.compartment("I").sum(axis=1)[
+        np.searchsorted(reference.days, days)]
+    return np.abs(infected - expected).max() / max(expected.max(), 1)
+
+
+def peakDay(history):
+    """
+    Day with the most infected over every airport
+
+    Args:
+        history: zikaHistory.History of a run
+
+    Returns:
+        Day of the peak
+    """
+
+    return int(history.days[np.argmax(history.compartment("I").sum(axis=1))])
+
+
+def benchmarkODE(airports, routes, curves):
+    """
+    Time the default city infected on ODE_DATE, when the outbreak spreads,
+    with the zikaODE.py solver at every tolerance of ODE_TOLERANCES and with
+    the numpy stepper, and measure the error of each against the python
+    stepper on the days both record: the largest difference of the total
+    infected relative to the peak, the day of the peak and the difference
+    of the total recovered at the end.  The error of the solver levels off
+    at how far the continuous rates are from stepping every INCUBATION days.
+
+    Args:
+        airports: The file path to the airports .csv file
+        routes: The file path to the routes .csv file
+        curves: The file path to the mosquito curves .csv file
+
+    Returns:
+        Nothing
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        network = zikaSim.create_network(airports, routes, curves)
+
+    def step(engine):
+        stepper = zikaSim.Simulation(network, engine=engine,
+                                     dateToInfect=ODE_DATE)
+        begin = time.process_time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            stepper.run()
+        return (engine + " stepper", "%d days" % stepper.incubation,
+                stepper.history, time.process_time() - begin,
+                stepper.history.length)
+
+    reference = step("python")
+    days = reference[2].days
+    simulation = zikaSim.Simulation(network, dateToInfect=ODE_DATE)
+    arrays = simulation.getArrays()
+    params = simulation.params()
+
+    def solve(tolerance):
+        history = zikaHistory.History(arrays["IATA"], len(days), np.float64)
+        begin = time.process_time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            final, evaluations = zikaODE.solve(
+                arrays, params, simulation.cityToInfect, ODE_DATE, days,
+                history, rtol=tolerance, atol=tolerance)
+        return ("ode " + zikaODE.ODE_METHOD, "%.0e" % tolerance, history,
+                time.process_time() - begin, evaluations)
+
+    # The first solve imports scipy.integrate, so it is not timed
+    solve(ODE_TOLERANCES[0])
+    runs = [reference, step("numpy")] + [solve(tolerance)
+                                         for tolerance in ODE_TOLERANCES]
+    expectedPeak = peakDay(reference[2])
+    expectedRecovered = reference[2].compartment("R")[-1].sum()
+
+    print("%s infected on day %d, python stepper peak on day %d" % (
+        simulation.cityToInfect, ODE_DATE, expectedPeak))
+    print("%-14s %9s %9s %12s %11s %9s %11s" % (
+        "solver", "step", "CPU (s)", "evaluations", "I error", "peak day",
+        "R error"))
+    for solver, step, history, cpuTime, evaluations in runs:
+        recovered = history.compartment("R")[-1].sum()
+        print("%-14s %9s %9.3f %12d %11.2e %9d %11.2e" % (
+            solver, step, cpuTime, evaluations,
+            infectedError(history, reference[2]), peakDay(history),
+            abs(recovered - expectedRecovered) / max(expectedRecovered, 1)))
+        sys.stdout.flush()
+
+
+def measure(function):
+    """
+    Time a benchmark, then run it again under tracemalloc for its peak
+    memory so the tracing does not slow the timed run
+
+    Args:
+        function: benchmark to call without arguments
+
+    Returns:
+        {"seconds", "cpuSeconds", "peakMemory" in bytes}
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        begin = time.perf_counter()
+        cpuBegin = time.process_time()
+        function()
+        seconds = time.perf_counter() - begin
+        cpuSeconds = time.process_time() - cpuBegin
+
+        tracemalloc.start()
+        function()
+        peakMemory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {"seconds": seconds, "cpuSeconds": cpuSeconds,
+            "peakMemory": peakMemory}
+
+
+def suiteNetwork(name, files, hubs=None):
+    """
+    Run every benchmark of the suite on one network
+
+    Args:
+        name: Name of the network in the results
+        files: Paths to the airport, route and mosquito curve files
+        hubs: Number of hubs with the most routes to sweep with -a, all of
+            the approved airports if None
+
+    Returns:
+        List of results, one per benchmark
+    """
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        network = zikaSim.create_network(*files)
+    approvedAirports = network.graph["approvedAirports"]
+    if hubs is not None:
+        routes = collections.Counter(key[0]
+                                     for key in network.graph["routeInfo"])
+        approvedAirports = {airport: approvedAirports[airport]
+                            for airport, count in routes.most_common(hubs)}
+    city = max(approvedAirports, key=lambda airport: network.node[
+        approvedAirports[airport]]["pop"])
+
+    simulations = {engine: zikaSim.Simulation(network, cityToInfect=city,
+                                              engine=engine)
+                   for engine in ("python", "numpy")}
+    for simulation in simulations.values():
+        simulation.approvedAirports = approvedAirports
+
+    benchmarks = [
+        ("create_network", lambda: zikaSim.create_network(*files)),
+        ("run python", simulations["python"].run),
+        ("run numpy", simulations["numpy"].run),
+        # Reads the history of the python run
+        ("updateIDic", simulations["python"].updateIDic),
+        ("runAll numpy", simulations["numpy"].runAll)]
+    # One scenario at a time is only quick enough on the hub list
+    if hubs is None:
+        benchmarks.append(("runAll python", simulations["python"].runAll))
+
+    results = list()
+    for benchmark, function in benchmarks:
+        result = {"network": name, "airports": len(network.nodes()),
+                  "routes": len(network.graph["routeInfo"]),
+                  "benchmark": benchmark}
+        result.update(measure(function))
+        print("%-16s %-16s %9.3f s %9.1f MB" % (
+            name, benchmark, result["seconds"], result["peakMemory"] / 2**20))
+        sys.stdout.flush()
+        results.append(result)
+
+    return results
+
+
+def commitHash():
+    """
+    Commit of the working tree, so results can be tracked across commits
+
+    Args:
+        Nothing
+
+    Returns:
+        Hash of HEAD, None outside a git checkout
+    """
+
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmarkSuite(airports, routes, curves, sizes=SUITE_SIZES, output=None):
+    """
+    Run the benchmark suite on the given data and on synthetic power law
+    networks of the given sizes, and write the results as JSON
+
+    Args:
+        airports: The file path to the airports .csv file
+        routes: The file path to the routes .csv file
+        curves: The file path to the mosquito curves .csv file
+        sizes: Numbers of airports of the synthetic networks
+        output: File to write the JSON to, standard output if None
+
+    Returns:
+        Dictionary written as JSON
+    """
+
+    results = suiteNetwork("data", (airports, routes, curves))
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as directory:
+            files = writeSyntheticNetwork(directory, size,
+                                          powerLawDegrees(size))
+            results += suiteNetwork("powerlaw-%d" % size, files, SWEEP_HUBS)
+
+    report = {"commit": commitHash(),
+              "date": datetime.datetime.now().isoformat(timespec="seconds"),
+              "python": platform.python_version(),
+              "numpy": np.__version__,
+              "platform": platform.platform(),
+              "cpus": os.cpu_count(),
+              # Linux reports the peak resident set size in kilobytes
+              "maxResidentMemory": resource.getrusage(
+                  resource.RUSAGE_SELF).ru_maxrss * 1024,
+              "results": results}
+
+    if output is None:
+        print(json.dumps(report, indent=2))
+    else:
+        with open(output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    return report
+
+
+def benchmarkStartup(files=None, runs=STARTUP_RUNS):
+    """
+    Time how long a fresh interpreter takes to import the simulator modules,
+    and a whole plain zikaSim.py run, which must not load the plotting and
+    stats stack
+
+    Args:
+        files: optional airport, route and mosquito curve files of a plain
+            run to time
+        runs: fresh interpreters per measurement, the fastest is kept
+
+    Returns:
+        True if no module imports any of HEAVY_MODULES
+    """
+
+    directory = os.path.dirname(os.path.abspath(__file__))
+    clean = True
+
+    print("%-12s %10s %10s  %s" % ("module", "import (s)", "python (s)",
+                                   "heavy modules loaded"))
+    for module in STARTUP_MODULES:
+        code = STARTUP_CODE.format(module=module, heavy=HEAVY_MODULES)
+        imports = list()
+        totals = list()
+        for run in range(runs):
+            begin = time.perf_counter()
+            output = subprocess.run([sys.executable, "-c", code],
+                                    cwd=directory, capture_output=True,
+                                    text=True, check=True).stdout
+            totals.append(time.perf_counter() - begin)
+            seconds, loaded = output.split("\n")[:2]
+            imports.append(float(seconds))
+        clean &= not loaded
+        print("%-12s %10.3f %10.3f  %s" % (module, min(imports), min(totals),
+                                           loaded or "none"))
+        sys.stdout.flush()
+
+    if files:
+        # The first run compiles the network snapshot and caches the result
+        command = [sys.executable, os.path.join(directory, "zikaSim.py")] + \
+            [os.path.abspath(path) for path in files]
+        subprocess.run(command, cwd=directory, capture_output=True,
+                       check=True)
+        totals = list()
+        for run in range(runs):
+            begin = time.perf_counter()
+            subprocess.run(command, cwd=directory, capture_output=True,
+                           check=True)
+            totals.append(time.perf_counter() - begin)
+        print("%-12s %21.3f  (plain run, cached network and result)" %
+              ("zikaSim.py", min(totals)))
+
+    return clean
+
+
+def main():
+
+    opts, args = getopt.getopt(sys.argv[1:], "eapfojst", ["json=", "sizes="])
+    options = dict(opts)
+
+    if "-s" in options:
+        if len(args) < 3:
+            print(__doc__)
+            exit()
+        sizes = [int(size) for size in options["--sizes"].split(",")] \
+            if options.get("--sizes") else SUITE_SIZES
+        benchmarkSuite(*args[:3], sizes=sizes, output=options.get("--json"))
+        exit()
+
+    if ("-t", "") in opts:
+        exit(0 if benchmarkStartup(args[:3]) else 1)
+
+    if ("-j", "") in opts:
+        exit(0 if benchmarkJit([int(arg) for arg in args] or DEFAULT_SIZES)
+             else 1)
+
+    if opts:
+        if len(args) < 3:
+            print(__doc__)
+            exit()
+        if ("-e", "") in opts:
+            exit(1 if compareEngines(*args[:3]) else 0)
+        if ("-p", "") in opts:
+            exit(benchmarkWorkers(*args[:3]))
+        if ("-f", "") in opts:
+            exit(0 if benchmarkScheduler(*args[:3]) else 1)
+        if ("-o", "") in opts:
+            exit(benchmarkODE(*args[:3]))
+        exit(0 if benchmarkRunAll(*args[:3]) else 1)
+
+    sizes = [int(arg) for arg in args] or DEFAULT_SIZES
+
+    print("%8s %8s %10s %13s %12s %14s %16s %19s %15s %10s" % (
+        "airports", "routes", "build (s)", "snapshot (s)", "step (ms)",
+        "ns per route", "numpy step (ms)", "expected step (ms)",
+        "numpy year (s)", "peak (MB)"))
+    for size in sizes:
+        result = benchmarkSize(size)
+        print(("%8d %8d %10.3f %13.3f %12.3f %14.1f %16.3f %19.3f %15.3f "
+               "%10.1f") % (
+            result["airports"], result["routes"], result["build"],
+            result["snapshot"], result["step"] * 1e3,
+            result["step"] * 1e9 / result["routes"],
+            result["arrayStep"] * 1e3, result["expectedStep"] * 1e3,
+            result["year"], result["yearMemory"] / 2**20))
+        sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    main()
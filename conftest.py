@@ -0,0 +1,34 @@
+"""
+conftest.py holds the pytest fixtures shared by the test modules: the ./Data
+network, built once per test session.
+"""
+
+# Title:  conftest.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+import contextlib
+import io
+import os
+
+import pytest
+
+import zikaSim
+
+
+# GLOBAL
+DATA_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Data")
+AIRPORT_DATA = os.path.join(DATA_FOLDER, "airportsMin.csv")
+ROUTE_DATA = os.path.join(DATA_FOLDER, "airlineRoutesPassengerData.csv")
+MOSQUITO_CURVES = os.path.join(DATA_FOLDER, "mosCurves.csv")
+
+
+@pytest.fixture(scope="session")
+def network():
+    """
+    The ./Data network, skipping the tests without networkx
+    """
+
+    pytest.importorskip("networkx")
+    with contextlib.redirect_stdout(io.StringIO()):
+        return zikaSim.create_network(AIRPORT_DATA, ROUTE_DATA,
+                                      MOSQUITO_CURVES)
@@ -1,55 +1,473 @@
+"""
+convertAirlinePassenger.py totals the passengers flown between the approved
+airports in BTS T-100 segment files and writes the routes file used by
+zikaSim.py.  Each file is read in large blocks that are tokenized in NumPy,
+finding the separators from the quote parity of every comma so quoted commas
+are kept, and only the passenger, origin and destination fields are pulled
+out.  Rows are dropped by origin and destination before the passenger numbers
+are parsed, and the routes are totalled with integer airport codes, keeping
+only the routes that occur.  Several
+files (e.g. one per year) are read in parallel and added together.
+
+When the files have a MONTH column the passengers of every route are also
+totalled by month and written as a routes x 12 flow tensor in a .npz file for
+the --monthly option of zikaSim.py.
+
+Usage:
+    convertAirlinePassenger.py [--workers=<processes>] [--out=<routes .csv>]
+        [--monthly=<monthly flows .npz>]
+        <T-100 segment file> [<T-100 segment file> ...] <airports file>
+    convertAirlinePassenger.py --check <T-100 segment file> [...]
+
+Option:
+    --workers   Number of processes reading files (number of CPUs is default)
+    --out       File to write routes to
+                (./Data/airlineRoutesPassengerData.csv is default)
+    --monthly   File to write monthly flows to
+                (./Data/airlineRoutesMonthly.npz is default)
+    --check     Compare the fields found by the block tokenizer with
+                csv.reader on every row of the T-100 files
+"""
+
+import csv
+import getopt
+import multiprocessing
+import os
 import sys
-import re
+
+import numpy as np
 
 # python convertAirlinePassenger.py
 # ./Data/182980864_T_T100D_SEGMENT_ALL_CARRIER2.csv ./Data/airportsMin.csv
 
 
-def main():
+# GLOBAL
+BLOCK_BYTES = 1 << 24
+COMMA, NEWLINE, QUOTE, RETURN = ord(","), ord("\n"), ord('"'), ord("\r")
+COLUMNS = ("PASSENGERS", "ORIGIN", "DEST")
+DEFAULT_COLUMNS = (0, 4, 6)  # positions in files without these header names
+MONTH_COLUMN = "MONTH"
+MONTHS_IN_YEAR = 12
+MIN_PASSENGERS = 365         # at least one passenger a day
+OUTPUT_FILE = './Data/airlineRoutesPassengerData.csv'
+MONTHLY_FILE = './Data/airlineRoutesMonthly.npz'
 
-    args = sys.argv
 
-    dataFile = args[1]
-    airportsFile = args[2]
+def loadApprovedAirports(airportsFile):
+    """
+    Read the airports the routes are kept for
+
+    Args:
+        airportsFile: The file path to the airports .csv file
+
+    Returns:
+        {IATA: airport ID} in file order
+    """
 
-    data = open(dataFile, 'r')
-    airports = open(airportsFile, 'r')
-    outputFile = open('./Data/airlineRoutesPassengerData.csv','w')
     approvedAirports = dict()
+    with open(airportsFile, 'r') as airports:
+        for line in airports:
+            segmentedLine = line.split(",")
+            approvedAirports[segmentedLine[2]] = segmentedLine[0]
+
+    return approvedAirports
+
+
+def findColumns(header):
+    """
+    Find the passengers, origin, destination and month columns from the
+    header
+
+    Args:
+        header: first row of a T-100 file
+
+    Returns:
+        Positions of the passengers, origin IATA and destination IATA columns,
+        followed by the month column if the file has one
+    """
+
+    names = [name.strip().upper() for name in header or []]
+    if not all(column in names for column in COLUMNS):
+        return DEFAULT_COLUMNS
+
+    columns = tuple(names.index(column) for column in COLUMNS)
+    if MONTH_COLUMN in names:
+        columns += (names.index(MONTH_COLUMN),)
+
+    return columns
+
+
+def readBlocks(data, size):
+    """
+    Read a binary file in blocks of whole lines
+
+    Args:
+        data: file open in binary mode
+        size: number of bytes to read at a time
+
+    Returns:
+        Generator of blocks, each ending with a new line
+    """
+
+    rest = b""
+    while True:
+        block = data.read(size)
+        if not block:
+            if rest:
+                yield rest + b"\n"
+            return
+        block = rest + block
+        cut = block.rfind(b"\n") + 1
+        rest = block[cut:]
+        if cut:
+            yield block[:cut]
+
+
+def splitFields(text, columns):
+    """
+    Find the selected fields of every line of a block without splitting
+    whole lines, commas inside quotes are not separators (T-100 fields never
+    hold new lines)
+
+    Args:
+        text: block as a uint8 array
+        columns: positions of the fields to find
+
+    Returns:
+        starts, ends: arrays of shape (lines, columns) of the first byte and
+            one past the last byte of each field, for the lines that have
+            every column
+    """
+
+    special = np.flatnonzero((text == COMMA) | (text == NEWLINE) |
+                             (text == QUOTE))
+    chars = text[special]
+    quote = chars == QUOTE
+    separators = special[~quote & ~np.logical_xor.accumulate(quote)]
+    lineEnds = np.flatnonzero(text[separators] == NEWLINE)
+
+    # separators[first + k] ends field k of a line
+    first = np.concatenate(([0], lineEnds[:-1] + 1))
+    # A line with k separators has k + 1 fields
+    complete = lineEnds - first >= max(columns)
+    first = first[complete]
+    columns = np.array(columns)
+    ends = separators[first[:, np.newaxis] + columns]
+    starts = np.where(columns > 0,
+                      separators[first[:, np.newaxis] + columns - 1] + 1,
+                      np.concatenate(([0], separators[lineEnds[:-1]] + 1))
+                      [complete][:, np.newaxis])
+
+    return starts, ends
+
+
+def unquote(text, starts, ends):
+    """
+    Trim quotes and carriage returns from fields
+
+    Args:
+        text: block as a uint8 array
+        starts: first byte of every field
+        ends: one past the last byte of every field
+
+    Returns:
+        Trimmed starts and ends
+    """
+
+    ends = ends - ((ends > starts) & (text[ends - 1] == RETURN))
+    quoted = (ends - starts >= 2) & (text[starts] == QUOTE) & \
+        (text[ends - 1] == QUOTE)
+
+    return starts + quoted, ends - quoted
+
+
+def packCodes(text, starts, ends):
+    """
+    Pack three letter IATA code fields into integers
+
+    Args:
+        text: block as a uint8 array
+        starts: first byte of every field
+        ends: one past the last byte of every field
+
+    Returns:
+        Packed code of every field, -1 for fields that are not three bytes
+    """
+
+    starts = np.minimum(starts, len(text) - 3)
+    packed = (text[starts].astype(np.int64) << 16) | \
+        (text[starts + 1].astype(np.int64) << 8) | text[starts + 2]
+
+    return np.where(ends - starts == 3, packed, -1)
+
+
+def parseFields(block, starts, ends, dtype):
+    """
+    Parse the numbers in a few fields of a block
+
+    Args:
+        block: bytes of the block
+        starts: first byte of every field
+        ends: one past the last byte of every field
+        dtype: NumPy type to parse to
+
+    Returns:
+        Array of the numbers
+    """
+
+    return np.array([block[start:end] for start, end in
+                     zip(starts.tolist(), ends.tolist())],
+                    dtype=bytes).astype(dtype)
+
+
+def sumRoutes(keys, passengers, firstRow, monthly=None):
+    """
+    Add up the passengers of the entries of the same route
+
+    Args:
+        keys: route of every entry, origin code * number of airports +
+            destination code
+        passengers: passengers of every entry
+        firstRow: row every entry is first seen on
+        monthly: optional entries x 12 array of passengers by month
+
+    Returns:
+        routes: sorted array of the routes that occur
+        passengers: passengers of every route
+        firstRow: first row of every route
+        monthly: routes x 12 array of passengers by month, None if not given
+    """
+
+    routes, inverse = np.unique(keys, return_inverse=True)
+    total = np.bincount(inverse, weights=passengers, minlength=len(routes))
+    first = np.full(len(routes), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(first, inverse, firstRow)
+    if monthly is not None:
+        byMonth = np.zeros((len(routes), MONTHS_IN_YEAR), dtype=np.float64)
+        np.add.at(byMonth, inverse, monthly)
+        monthly = byMonth
+
+    return routes, total, first, monthly
+
+
+def aggregateFile(task):
+    """
+    Total the passengers of every approved route in one T-100 file, only
+    keeping the routes that occur
+
+    Args:
+        task: (file path, {approved IATA code: integer code})
+
+    Returns:
+        Routes, passengers, first rows and monthly passengers (None if the
+        file has no month column) like sumRoutes()
+    """
+
+    dataFile, codes = task
+    numAirports = len(codes)
+    parts = list()
+    hasMonths = False
+
+    # Approved airports as packed codes, sorted for searchsorted
+    approved = [(packCodes(np.frombuffer(airport.encode(), dtype=np.uint8),
+                           np.array([0]), np.array([3]))[0], code)
+                for airport, code in codes.items() if len(airport) == 3]
+    approved.sort()
+    packedApproved = np.array([packed for packed, code in approved] or [-2],
+                              dtype=np.int64)
+    approvedCodes = np.array([code for packed, code in approved] or [-1],
+                             dtype=np.int64)
+
+    def encode(packed):
+        position = np.minimum(np.searchsorted(packedApproved, packed),
+                              len(packedApproved) - 1)
+        return np.where(packedApproved[position] == packed,
+                        approvedCodes[position], -1)
+
+    with open(dataFile, 'rb') as data:
+        header = data.readline().decode(errors="replace")
+        columns = findColumns(next(csv.reader([header]), None))
+        hasMonths = len(columns) > len(COLUMNS)
+        row = 0
+        for block in readBlocks(data, BLOCK_BYTES):
+            text = np.frombuffer(block, dtype=np.uint8)
+            starts, ends = splitFields(text, columns)
+            starts, ends = unquote(text, starts, ends)
+            lineNumbers = row + np.arange(len(starts))
+            row += len(starts)
+
+            # Drop routes outside the approved airports before parsing
+            # passenger numbers
+            origins = encode(packCodes(text, starts[:, 1], ends[:, 1]))
+            destinations = encode(packCodes(text, starts[:, 2], ends[:, 2]))
+            keep = np.flatnonzero((origins >= 0) & (destinations >= 0))
+            counts = parseFields(block, starts[keep, 0], ends[keep, 0],
+                                 np.float64)
+            flying = keep[counts > 0]
+            counts = counts[counts > 0]
+            keys = origins[flying] * numAirports + destinations[flying]
+
+            monthly = None
+            if hasMonths:
+                # Parsed like the passengers, so months written as 5.0 count
+                months = parseFields(block, starts[flying, 3],
+                                     ends[flying, 3], np.float64)
+                valid = np.flatnonzero((months >= 1) &
+                                       (months < MONTHS_IN_YEAR + 1))
+                monthly = np.zeros((len(keys), MONTHS_IN_YEAR),
+                                   dtype=np.float64)
+                monthly[valid, months[valid].astype(np.int64) - 1] = \
+                    counts[valid]
+
+            parts.append(sumRoutes(keys, counts, lineNumbers[flying],
+                                   monthly))
+
+    if not parts:
+        parts.append(sumRoutes(np.zeros(0, dtype=np.int64), np.zeros(0),
+                               np.zeros(0, dtype=np.int64),
+                               np.zeros((0, MONTHS_IN_YEAR))
+                               if hasMonths else None))
+
+    return sumRoutes(*(np.concatenate(part) if part[0] is not None else None
+                       for part in zip(*parts)))
+
+
+def aggregateFiles(dataFiles, codes, workers=None):
+    """
+    Total the passengers of every approved route over several T-100 files
+
+    Args:
+        dataFiles: file paths of the T-100 files
+        codes: {approved IATA code: integer code}
+        workers: number of processes reading files, number of CPUs if None
+
+    Returns:
+        routes: routes in the order they are first seen across the files,
+            origin code * number of airports + destination code
+        passengers: passengers of every route
+        monthly: routes x 12 array of passengers by month, None unless every
+            file has a month column
+    """
+
+    tasks = [(dataFile, codes) for dataFile in dataFiles]
+    workers = min(workers or os.cpu_count(), len(tasks))
+    if workers > 1:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(aggregateFile, tasks)
+    else:
+        results = [aggregateFile(task) for task in tasks]
+
+    # Routes of every file in the order they are first seen in it, then
+    # the files in order
+    ordered = np.concatenate([fileRoutes[np.argsort(firstRow, kind="stable")]
+                              for fileRoutes, filePassengers, firstRow,
+                              fileMonthly in results])
+    keys = np.concatenate([result[0] for result in results])
+    routes, passengers, firstRow, monthly = sumRoutes(
+        keys, np.concatenate([result[1] for result in results]),
+        np.zeros(len(keys), dtype=np.int64),
+        np.concatenate([result[3] for result in results])
+        if all(result[3] is not None for result in results) else None)
+
+    positions = np.searchsorted(routes, ordered)
+    seen, first = np.unique(positions, return_index=True)
+    order = positions[np.sort(first)]
+
+    return routes[order], passengers[order], \
+        None if monthly is None else monthly[order]
+
+
+def checkTokenizer(dataFile):
+    """
+    Compare the fields found by splitFields() with csv.reader on every row of
+    a T-100 file
+
+    Args:
+        dataFile: file path of the T-100 file
+
+    Returns:
+        Number of rows whose fields differ, or that only one of them finds
+    """
+
+    with open(dataFile, 'rb') as data:
+        header = data.readline().decode(errors="replace")
+        columns = findColumns(next(csv.reader([header]), None))
+        found = list()
+        for block in readBlocks(data, BLOCK_BYTES):
+            text = np.frombuffer(block, dtype=np.uint8)
+            starts, ends = unquote(text, *splitFields(text, columns))
+            found.extend(tuple(block[start:end].decode(errors="replace")
+                               for start, end in zip(rowStarts, rowEnds))
+                         for rowStarts, rowEnds in zip(starts.tolist(),
+                                                       ends.tolist()))
+
+    with open(dataFile, 'r', newline="", errors="replace") as data:
+        reader = csv.reader(data)
+        next(reader, None)
+        expected = [tuple(row[column] for column in columns)
+                    for row in reader if len(row) > max(columns)]
+
+    mismatches = abs(len(found) - len(expected)) + \
+        sum(a != b for a, b in zip(found, expected))
+    print(dataFile, len(found), "rows tokenized,", len(expected),
+          "rows from csv.reader,", mismatches, "mismatches")
+
+    return mismatches
+
+
+def main():
+
+    opts, args = getopt.getopt(sys.argv[1:], "", ["workers=", "out=",
+                                                  "monthly=", "check"])
+
+    if ("--check", "") in opts and args:
+        exit(1 if sum(checkTokenizer(dataFile) for dataFile in args) else 0)
+
+    if len(args) < 2:
+        print(__doc__)
+        exit()
+
+    workers = None
+    outputPath = OUTPUT_FILE
+    monthlyPath = MONTHLY_FILE
+    for opt, par in opts:
+        if opt == "--workers":
+            workers = int(par)
+        elif opt == "--out":
+            outputPath = par
+        elif opt == "--monthly":
+            monthlyPath = par
+
+    dataFiles = args[:-1]
+    approvedAirports = loadApprovedAirports(args[-1])
+    airports = list(approvedAirports)
+    codes = {airport: i for i, airport in enumerate(airports)}
+
+    order, passengers, monthly = aggregateFiles(dataFiles, codes, workers)
+
+    routes = list()
+    routeKeys = list()
+    with open(outputPath, 'w') as outputFile:
+        for i, key in enumerate(order.tolist()):
+            if passengers[i] > MIN_PASSENGERS:
+                org = airports[key // len(airports)]
+                des = airports[key % len(airports)]
+                # Org IATA code, Org Airport ID, Des IATA code,
+                # Des Airport ID, # Passengers
+                tempList = [org, approvedAirports[org], des,
+                            approvedAirports[des], str(float(passengers[i])),
+                            "\n"]
+                outputFile.write(",".join(tempList))
+                routes.append(i)
+                routeKeys.append(tempList[:4])
 
-    # load approved Airports
-    for line in airports:
-        segmentedLine = line.split(",")
-        approvedAirports[segmentedLine[2]] = segmentedLine[0]
-    airports.close()
-
-    foundRoutes = dict()
-
-    # Iterate through each line in airline flight data file
-    data.readline() # throw away header
-    for line in data:
-        segmentedLine = re.split('"?,?"?',line) # split on the separators
-        # Look for IATA code in approvedAirports list
-        if segmentedLine[4] in approvedAirports and segmentedLine[6] in \
-                approvedAirports and float(segmentedLine[0]) > 0:
-            # Org IATA code, Org Airport ID, Des IATA code,
-            # Des Airport ID, Year, # Passengers
-            if (segmentedLine[4],segmentedLine[6]) not in foundRoutes:
-                foundRoutes[(segmentedLine[4],segmentedLine[6])] = \
-                float(segmentedLine[0])
-            else:
-                foundRoutes[(segmentedLine[4],segmentedLine[6])] += \
-                float(segmentedLine[0])
-
-    for org, des in foundRoutes:
-        if foundRoutes[(org,des)] > 365:
-            tempList = [org, approvedAirports[org], des, approvedAirports[des],
-                        str(foundRoutes[(org,des)]), "\n"]
-            outputFile.write(",".join(tempList))
-
-    data.close()
-    outputFile.close()
+    # Routes in the same order as the .csv file with their passengers for
+    # every month
+    if monthly is not None:
+        np.savez(monthlyPath,
+                 routes=np.array(routeKeys, dtype=str).reshape(-1, 4),
+                 passengers=monthly[routes])
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -1,41 +1,159 @@
-import sys
-import re
+"""
+convertAirports.py converts the OpenFlights airports.dat file into the
+airports file used by zikaSim.py.  By default only the 25 hubs are kept, with
+the populations below.  With -w every airport with an IATA code is kept, the
+populations are joined from a lookup table, and a mosquito curves file is
+written for them too.
+
+Usage:
+    convertAirports.py [-w] [--pop=<IATA,population .csv>]
+        [--defaultpop=<population>] [--mos=<mosquito curves .csv>]
+        <airports.dat>
+
+Flags:
+    -w          Keep every airport (world network), writes
+                ./Data/airportsWorld.csv and ./Data/mosCurvesWorld.csv
 
+Option:
+    --pop         Populations to join by IATA code, added to the hub
+                  populations
+    --defaultpop  Population of airports missing from the lookup table
+                  (they are left out by default)
+    --mos         Mosquito curves to keep by IATA code, airports without one
+                  get a curve for their latitude (./Data/mosCurves.csv is
+                  default)
+"""
 
+import csv
+import getopt
+import sys
 
 # python convertAirports.py ./Data/airports.dat
+# python convertAirports.py -w --pop=./Data/populations.csv ./Data/airports.dat
+
+
+# GLOBAL
+HUB_POPULATIONS = {'ATL':456002,'LAX':3928864,'ORD':2084044,
+                   'DFW':1281047,'JFK':5618852,'SFO':852469,'MIA':430332,
+                   'CLT':809958,'LAS':613599,'PHX':1537058,'IAH':2239558,
+                   'MCO':262372,'EWR':280579,'MSP':407207,'BOS':655884,
+                   'PHL':1560297,'LGA':2872227,'FLL':176013,'BWI':622793,
+                   'IAD':335210,'MDW':638345,'DCA':323683,'HNL':350399,
+                   'SAN':1381069,'TPA':358699}
+HUBS_FILE = './Data/airportsMin.csv'
+WORLD_FILE = './Data/airportsWorld.csv'
+WORLD_CURVES_FILE = './Data/mosCurvesWorld.csv'
+CURVES_FILE = './Data/mosCurves.csv'
+
+# Mosquito curves for airports without one, by distance from the equator,
+# January to December in the northern hemisphere
+TROPICS = 23.5
+SUBTROPICS = 35
+TEMPERATE = 45
+TROPICAL_CURVE = [0.67] * 12
+SUBTROPICAL_CURVE = [0.33, 0, 0, 0.33, 0.67, 1, 1, 1, 1, 0.67, 0.67, 0.33]
+TEMPERATE_CURVE = [0, 0, 0, 0, 0, 0.33, 0.67, 0.67, 0.67, 0.67, 0, 0]
+COLD_CURVE = [0] * 12
+
+
+def loadPopulations(populationFile):
+    """
+    Read a population lookup table
+
+    Args:
+        populationFile: file of IATA code, population lines
+
+    Returns:
+        {IATA: population}
+    """
+
+    populations = dict()
+    with open(populationFile, 'r', newline='') as f:
+        for row in csv.reader(f):
+            if len(row) >= 2 and row[1].strip().isdigit():
+                populations[row[0].strip()] = int(row[1])
+
+    return populations
+
+
+def latitudeCurve(lat):
+    """
+    Mosquito curve for an airport without one, from its latitude, with the
+    seasons turned around south of the equator
+
+    Args:
+        lat: latitude of the airport
+
+    Returns:
+        List of 12 monthly mosquito values
+    """
+
+    distance = abs(lat)
+    if distance <= TROPICS:
+        curve = TROPICAL_CURVE
+    elif distance <= SUBTROPICS:
+        curve = SUBTROPICAL_CURVE
+    elif distance <= TEMPERATE:
+        curve = TEMPERATE_CURVE
+    else:
+        curve = COLD_CURVE
+
+    if lat < 0:
+        curve = curve[6:] + curve[:6]
+
+    return curve
+
 
 def main():
 
-    args = sys.argv
+    opts, args = getopt.getopt(sys.argv[1:], "w", ["pop=", "defaultpop=",
+                                                   "mos="])
 
-    dataFile = args[1] # airports.dat
+    if len(args) < 1:
+        print(__doc__)
+        exit()
 
-    data = open(dataFile, 'r')
-    outputFile = open('./Data/airportsMin.csv','w')
+    world = False
+    populations = dict(HUB_POPULATIONS)
+    defaultPopulation = None
+    curvesFile = CURVES_FILE
+    for opt, par in opts:
+        if opt == "-w":
+            world = True
+        elif opt == "--pop":
+            populations.update(loadPopulations(par))
+        elif opt == "--defaultpop":
+            defaultPopulation = int(par)
+        elif opt == "--mos":
+            curvesFile = par
 
-    approvedAirports = {'ATL':456002,'LAX':3928864,'ORD':2084044,
-                         'DFW':1281047,'JFK':5618852,'SFO':852469,'MIA':430332,
-                         'CLT':809958,'LAS':613599,'PHX':1537058,'IAH':2239558,
-                         'MCO':262372,'EWR':280579,'MSP':407207,'BOS':655884,
-                         'PHL':1560297,'LGA':2872227,'FLL':176013,'BWI':622793,
-                         'IAD':335210,'MDW':638345,'DCA':323683,'HNL':350399,
-                         'SAN':1381069,'TPA':358699}
+    dataFile = args[0] # airports.dat
 
     foundAirports = list()
+    found = set()
+    missing = 0
 
     # Iterate through each line in original file
-    for line in data:
-        segmentedLine = re.split('"?,?"?',line) # split on the separators
-        # Look for IATA code in approvedAirports list
-        for item in segmentedLine:
-            if item in approvedAirports:
-                # Save ID, Airport Name, IATA code, lat, long
-                outputList = [segmentedLine[1],segmentedLine[4],
-                              segmentedLine[6],segmentedLine[7],
-                              str(approvedAirports[item]),'\n']
+    with open(dataFile, 'r', newline='', encoding='utf-8') as data:
+        for segmentedLine in csv.reader(data):
+            airport = segmentedLine[4]
+            # Only the first airport with an IATA code
+            if airport in found:
+                continue
+            # Look for IATA code in approvedAirports list
+            if world and airport not in populations and len(airport) == 3:
+                if defaultPopulation is None:
+                    missing += 1
+                    continue
+                populations[airport] = defaultPopulation
+            if airport in populations and (world or
+                                           airport in HUB_POPULATIONS):
+                # Save Airport Name, IATA code, lat, long, population
+                outputList = [segmentedLine[1].replace(",", ""), airport,
+                              segmentedLine[6], segmentedLine[7],
+                              str(populations[airport]), '\n']
                 foundAirports.append(outputList)
-                #outputFile.write(",".join(outputList))
+                found.add(airport)
 
     # Sort based on population
     foundAirports = sorted(foundAirports, key=lambda airport: int(airport[4]),
@@ -46,11 +164,27 @@ def main():
     for item in foundAirports:
         item.insert(0,str(count))
         count += 1
-        outputFile.write(",".join(item))
 
-    data.close()
-    outputFile.close()
+    with open(WORLD_FILE if world else HUBS_FILE, 'w') as outputFile:
+        for item in foundAirports:
+            outputFile.write(",".join(item))
+
+    if world:
+        curves = dict()
+        with open(curvesFile, 'r') as f:
+            for line in f:
+                entries = line.rstrip().split(",")
+                curves[entries[1]] = entries[2:14]
+
+        with open(WORLD_CURVES_FILE, 'w') as outputFile:
+            for item in foundAirports:
+                curve = curves.get(item[2]) or \
+                    [str(value) for value in latitudeCurve(float(item[3]))]
+                outputFile.write(",".join([item[0], item[2]] + curve) + "\n")
+
+        print(len(foundAirports), "airports written,", missing,
+              "left out without a population")
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,81 @@
+"""
+convertOpenFlightsRoutes.py converts the OpenFlights routes.dat file into the
+routes file used by zikaSim.py for the world network of convertAirports.py -w.
+OpenFlights lists which airlines fly a route but not how many passengers, so
+every airline flying a route is counted as a daily flight of the given size.
+
+Usage:
+    convertOpenFlightsRoutes.py [--seats=<passengers per flight>]
+        [--out=<routes .csv>] <routes.dat> <airports file>
+
+Option:
+    --seats     Passengers on the daily flight of each airline (150 is
+                default)
+    --out       File to write routes to (./Data/airlineRoutesWorld.csv is
+                default)
+"""
+
+import csv
+import getopt
+import sys
+
+# python convertOpenFlightsRoutes.py ./Data/Archive/routes.dat
+# ./Data/airportsWorld.csv
+
+
+# GLOBAL
+DAYS_IN_YEAR = 365
+SEATS = 150
+OUTPUT_FILE = './Data/airlineRoutesWorld.csv'
+
+
+def main():
+
+    opts, args = getopt.getopt(sys.argv[1:], "", ["seats=", "out="])
+
+    if len(args) < 2:
+        print(__doc__)
+        exit()
+
+    seats = SEATS
+    outputPath = OUTPUT_FILE
+    for opt, par in opts:
+        if opt == "--seats":
+            seats = int(par)
+        elif opt == "--out":
+            outputPath = par
+
+    routesFile = args[0] # routes.dat
+    airportsFile = args[1]
+
+    # load approved Airports
+    approvedAirports = dict()
+    with open(airportsFile, 'r') as airports:
+        for line in airports:
+            segmentedLine = line.split(",")
+            approvedAirports[segmentedLine[2]] = segmentedLine[0]
+
+    # Count the airlines flying every route, codeshares are another airline
+    # selling seats on the same flight
+    foundRoutes = dict()
+    with open(routesFile, 'r', newline='', encoding='utf-8') as data:
+        for segmentedLine in csv.reader(data):
+            org = segmentedLine[2]
+            des = segmentedLine[4]
+            if org in approvedAirports and des in approvedAirports and \
+                    org != des and segmentedLine[6] != "Y":
+                foundRoutes[(org, des)] = foundRoutes.get((org, des), 0) + 1
+
+    with open(outputPath, 'w') as outputFile:
+        for (org, des), airlines in foundRoutes.items():
+            # Org IATA code, Org Airport ID, Des IATA code,
+            # Des Airport ID, # Passengers
+            tempList = [org, approvedAirports[org], des, approvedAirports[des],
+                        str(float(airlines * seats * DAYS_IN_YEAR)), "\n"]
+            outputFile.write(",".join(tempList))
+
+    print(len(foundRoutes), "routes written")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+test_zikaEngine.py checks that the numpy engine in zikaEngine.py, with and
+without the Numba loop of zikaKernel.py, produces the same I, S, V and R
+histories as the python engine of zikaSim.py on the ./Data network, for
+single runs and for the -a sweep.  The network fixture is in conftest.py.
+
+Run it from the repository with pytest.
+"""
+
+# Title:  test_zikaEngine.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+import contextlib
+import io
+
+import numpy as np
+import pytest
+
+import zikaKernel
+import zikaSim
+
+
+# GLOBAL
+# (city to infect, date to infect, vaccinate, screen percent)
+SCENARIOS = [("ATL", 1, False, 0), ("ATL", 125, True, 0),
+             ("MIA", 200, False, 0.5), ("TPA", 300, False, 0)]
+
+
+def runHistory(network, engine, city, date, vaccinate, screen, jit=False):
+    """
+    Run one simulation and return its recorded history
+
+    Args:
+        network: networkX graph network from create_network()
+        engine: "python" or "numpy"
+        city: The IATA code for hub to start infection at
+        date: Start day of infection
+        vaccinate: Vaccinate using O'Leary vaccination formula
+        screen: Screen rate at airports
+        jit: True for the zikaKernel.py loop
+
+    Returns:
+        (time steps, airports, 4) array of I, S, V, R
+    """
+
+    simulation = zikaSim.Simulation(network, cityToInfect=city,
+                                    dateToInfect=date, vaccinate=vaccinate,
+                                    screenPerc=screen, engine=engine, jit=jit)
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulation.run()
+
+    return simulation.history.data[:simulation.history.length]
+
+
+@pytest.mark.parametrize("city, date, vaccinate, screen", SCENARIOS)
+def test_numpyMatchesPython(network, city, date, vaccinate, screen):
+    expected = runHistory(network, "python", city, date, vaccinate, screen)
+    actual = runHistory(network, "numpy", city, date, vaccinate, screen)
+
+    assert expected[:, :, 0].any()
+    np.testing.assert_array_equal(actual, expected)
+
+
+@pytest.mark.parametrize("city, date, vaccinate, screen", SCENARIOS)
+def test_jitMatchesPython(network, city, date, vaccinate, screen):
+    if not zikaKernel.available():
+        pytest.skip("Numba is not installed")
+
+    expected = runHistory(network, "python", city, date, vaccinate, screen)
+    actual = runHistory(network, "numpy", city, date, vaccinate, screen,
+                        jit=True)
+
+    np.testing.assert_array_equal(actual, expected)
+
+
+@pytest.mark.parametrize("recovery", ["oldest", "every"])
+def test_runAllMatchesPython(network, recovery):
+    results = dict()
+    for engine in ("python", "numpy"):
+        simulation = zikaSim.Simulation(network, engine=engine,
+                                        recovery=recovery)
+        with contextlib.redirect_stdout(io.StringIO()):
+            results[engine] = simulation.runAll()
+
+    assert results["numpy"] == results["python"]
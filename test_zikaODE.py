@@ -0,0 +1,67 @@
+"""
+test_zikaODE.py checks the continuous time engine in zikaODE.py: the history
+of a single run and of the same scenario in the -a sweep trajectories must
+agree, whatever day each solve integrates to, and an outbreak the python
+engine sees die out must die out too.  The network fixture is in conftest.py.
+
+Run it from the repository with pytest.
+"""
+
+# Title:  test_zikaODE.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+import contextlib
+import io
+
+import numpy as np
+
+import zikaHistory
+import zikaSim
+
+
+# GLOBAL
+CITY_TO_INFECT = "ATL"
+MONTH = 4  # sweep month of the scenario, infecting on day 125
+DIE_OUT_DATE = 1  # the January infection of the hub never spreads
+
+
+def test_sweepMatchesSingleRun(network, tmp_path):
+    date = 1 + MONTH * zikaSim.DAYS_IN_MONTH
+    single = zikaSim.Simulation(network, engine="ode",
+                                cityToInfect=CITY_TO_INFECT,
+                                dateToInfect=date, start=date)
+    sweep = zikaSim.Simulation(network, engine="ode",
+                               trajectories=str(tmp_path))
+    # Only the months of one hub
+    sweep.approvedAirports = {
+        CITY_TO_INFECT: network.graph["approvedAirports"][CITY_TO_INFECT]}
+    with contextlib.redirect_stdout(io.StringIO()):
+        single.run()
+        sweep.runAll()
+
+    store = zikaHistory.TrajectoryStore(str(tmp_path))
+    days, data = store.scenario(MONTH)
+    # The sweep wraps its days around the end of the year, the single run
+    # counts on, so they share the days before the wrap
+    singleDays = single.history.days
+    shared = int(np.sum(singleDays < single.simulationLength))
+    expected = single.history.data[:shared]
+
+    assert expected[:, :, 0].max() > 1
+    np.testing.assert_array_equal(days[:shared], singleDays[:shared])
+    np.testing.assert_array_equal(data[:shared], expected)
+
+
+def test_dieOutLikePython(network):
+    recovered = dict()
+    for engine in ("python", "ode"):
+        simulation = zikaSim.Simulation(network, engine=engine,
+                                        cityToInfect=CITY_TO_INFECT,
+                                        dateToInfect=DIE_OUT_DATE)
+        with contextlib.redirect_stdout(io.StringIO()):
+            simulation.run()
+        final = simulation.history.data[simulation.history.length - 1]
+        recovered[engine] = final[:, 3].sum()
+
+    assert recovered["python"] == 1
+    assert recovered["ode"] == recovered["python"]
@@ -0,0 +1,432 @@
+#!/usr/bin/python3
+"""
+zikaCache.py compiles the airport, route and mosquito curve files into a
+binary network snapshot so zikaSim.py does not re-parse the .csv files on
+every run.  A snapshot is a folder of .npy files (node arrays, the routes,
+the CSR passenger flow matrix, the monthly flows and the mosquito matrix) that
+are memory mapped when loaded.  Snapshots are keyed by a hash of the source
+files and the snapshot version, so an edited data file or a new format
+compiles a new one.
+
+The results of single simulations are cached next to the snapshots, keyed by
+a hash of the source files and every simulation parameter, so running the
+same scenario again loads its I, S, V, R history instead of simulating it.
+The least recently used results are removed once they pass RESULT_CACHE_BYTES.
+
+Usage:
+    zikaCache.py [--cache=<cache folder>] [--monthly=<monthly flows .npz>]
+        <airport database> <route database> <mosquito curves database>
+    zikaCache.py --clearresults [--cache=<cache folder>]
+
+Option:
+    --cache     Folder holding the snapshots (./Data/Cache is default)
+    --monthly   Monthly passenger flows from convertAirlinePassenger.py
+    --clearresults  Remove every cached simulation result
+"""
+
+# Title:  zikaCache.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+# python zikaCache.py ./Data/airportsMin.csv
+# ./Data/airlineRoutesPassengerData.csv ./Data/mosCurves.csv
+
+import getopt
+import hashlib
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+from scipy import sparse
+
+import zikaEngine
+import zikaODE
+
+
+# GLOBAL
+CACHE_VERSION = 2   # bump when the snapshot layout changes
+CACHE_DIR = "./Data/Cache"
+RESULT_DIR = "Results"  # folder of cached results inside the cache folder
+RESULT_CACHE_BYTES = 1 << 28  # most disk the cached results may take
+RESULT_PARAMS = ["cityToInfect", "dateToInfect", "start", "simulationLength",
+                 "tau", "incubation", "toRecover", "vaccinate",
+                 "vaccinatePerc", "screenPerc", "imports", "recovery",
+                 "historyEvery"]
+DAYS_IN_YEAR = 365  # match zikaSim.py
+MONTHS_IN_YEAR = 12
+
+
+def sourceKey(paths):
+    """
+    Hash the snapshot version and the contents of the source files
+
+    Args:
+        paths: file paths of the airport, route and mosquito curve files
+
+    Returns:
+        Hex digest naming the snapshot
+    """
+
+    digest = hashlib.sha256(("v" + str(CACHE_VERSION)).encode())
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(b"\0")
+
+    return digest.hexdigest()[:24]
+
+
+def saveSnapshot(directory, network, arrays):
+    """
+    Write the network and its arrays as a folder of .npy files
+
+    Args:
+        directory: snapshot folder to create
+        network: networkX graph network from create_network()
+        arrays: network arrays from zikaEngine.buildArrays()
+
+    Returns:
+        Nothing
+    """
+
+    nodes = arrays["nodes"]
+    details = [network.node[node] for node in nodes]
+    routes = list(network.graph["routeInfo"].items())
+    edges = network.edges(data=True)
+
+    snapshot = {
+        "version": np.array([CACHE_VERSION]),
+        "nodes": np.array(nodes, dtype=np.int64),
+        "name": np.array([detail["name"] for detail in details], dtype=str),
+        "IATA": np.array(arrays["IATA"], dtype=str),
+        "lat": np.array([detail["lat"] for detail in details], dtype=str),
+        "lon": np.array([detail["lon"] for detail in details], dtype=str),
+        "pop": arrays["pop"],
+        "MOS": arrays["MOS"],
+        "routeKeys": np.array([key for key, passengers in routes],
+                              dtype=str).reshape(-1, 4),
+        "routePassengers": np.array([passengers for key, passengers in routes],
+                                    dtype=np.float64),
+        "approvedAirports": np.array(list(
+            network.graph["approvedAirports"].items()),
+                                     dtype=str).reshape(-1, 2),
+        "edges": np.array([(a, b) for a, b, data in edges],
+                          dtype=np.int64).reshape(-1, 2),
+        "edgeIATA": np.array([(data.get("IATAFrom", ""),
+                               data.get("IATATo", ""))
+                              for a, b, data in edges],
+                             dtype=str).reshape(-1, 2),
+        "flow.data": arrays["flow"].data,
+        "flow.indices": arrays["flow"].indices,
+        "flow.indptr": arrays["flow"].indptr}
+    if arrays.get("monthlyFlow") is not None:
+        monthlyRouteInfo = network.graph["monthlyRouteInfo"]
+        snapshot["routeMonthly"] = np.array(
+            [monthlyRouteInfo[key] for key, passengers in routes],
+            dtype=np.float64).reshape(-1, MONTHS_IN_YEAR)
+        snapshot["monthlyFlow"] = arrays["monthlyFlow"]
+
+    # Write next to the final folder and rename, so a reader never sees a
+    # half written snapshot
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    temporary = tempfile.mkdtemp(dir=parent)
+    for key, value in snapshot.items():
+        np.save(os.path.join(temporary, key + ".npy"), value)
+    try:
+        os.rename(temporary, directory)
+    except OSError:
+        # Another process compiled the same snapshot first
+        shutil.rmtree(temporary)
+
+
+def loadSnapshot(directory, routes=True):
+    """
+    Rebuild the network from a snapshot folder, memory mapping the arrays
+
+    Args:
+        directory: snapshot folder written by saveSnapshot()
+        routes: False to skip the graph edges and the routeInfo and
+            inboundRoutes dictionaries, which only the python engine and the
+            maps use; the numpy engine runs from G.graph["arrays"]
+
+    Returns:
+        G: A NetworkX Graph object like create_network(), with the network
+           arrays for zikaEngine.py in G.graph["arrays"]
+    """
+
+    import networkx as nx
+
+    def load(key):
+        return np.load(os.path.join(directory, key + ".npy"), mmap_mode="r")
+
+    monthly = os.path.exists(os.path.join(directory, "monthlyFlow.npy"))
+
+    if int(load("version")[0]) != CACHE_VERSION:
+        raise ValueError("snapshot version mismatch: " + directory)
+
+    nodes = load("nodes").tolist()
+    IATA = load("IATA").tolist()
+    lat = load("lat").tolist()
+    lon = load("lon").tolist()
+    pop = load("pop")
+    MOS = load("MOS")
+    popList = pop.tolist()
+    MOSList = MOS.tolist()
+
+    names = load("name").tolist()
+
+    G = nx.Graph()
+    G.add_nodes_from((node, {"name": names[i],
+                             "IATA": IATA[i],
+                             "lat": lat[i],
+                             "lon": lon[i],
+                             "pop": popList[i],
+                             "pos": (float(lat[i]), float(lon[i])),
+                             "MOS": MOSList[i]})
+                     for i, node in enumerate(nodes))
+    G.graph["approvedAirports"] = {airport: int(node) for airport, node in
+                                   load("approvedAirports").tolist()}
+    G.graph["routeInfo"] = None
+    G.graph["inboundRoutes"] = None
+    G.graph["monthlyRouteInfo"] = None
+    G.graph["monthlyInbound"] = None
+
+    if routes:
+        G.add_edges_from((a, b, {"IATAFrom": iataFrom, "IATATo": iataTo})
+                         for (a, b), (iataFrom, iataTo) in
+                         zip(load("edges").tolist(), load("edgeIATA").tolist()))
+
+        routeInfo = dict()
+        inboundRoutes = dict()
+        for key, passengers in zip(load("routeKeys").tolist(),
+                                   load("routePassengers").tolist()):
+            routeInfo[tuple(key)] = passengers
+        for key in routeInfo:
+            inboundRoutes.setdefault(int(key[3]), []).append(
+                (int(key[1]), routeInfo[key] / DAYS_IN_YEAR))
+
+        G.graph["routeInfo"] = routeInfo
+        G.graph["inboundRoutes"] = inboundRoutes
+
+        if monthly:
+            daysInMonth = DAYS_IN_YEAR / MONTHS_IN_YEAR
+            monthlyRouteInfo = dict(zip(routeInfo,
+                                        load("routeMonthly").tolist()))
+            monthlyInbound = [dict() for month in range(MONTHS_IN_YEAR)]
+            for key, passengers in monthlyRouteInfo.items():
+                for month, inbound in enumerate(monthlyInbound):
+                    inbound.setdefault(int(key[3]), []).append(
+                        (int(key[1]), passengers[month] / daysInMonth))
+            G.graph["monthlyRouteInfo"] = monthlyRouteInfo
+            G.graph["monthlyInbound"] = monthlyInbound
+
+    G.graph["arrays"] = zikaEngine.arraysFromFlow(
+        nodes, IATA, pop, MOS,
+        sparse.csr_matrix((load("flow.data"), load("flow.indices"),
+                           load("flow.indptr")),
+                          shape=(len(nodes), len(nodes)), copy=False),
+        load("monthlyFlow") if monthly else None)
+
+    return G
+
+
+def cachedNetwork(nodes, edges, curves, createNetwork, cacheDir=CACHE_DIR,
+                  routes=True, monthly=None):
+    """
+    Load the network snapshot for the source files, compiling it with
+    createNetwork first if the files are new or changed
+
+    Args:
+        nodes: The file path to the nodes .csv file.
+        edges: The file path to the edges .csv file.
+        curves: The file path to the mosquito curves .csv file.
+        createNetwork: zikaSim.create_network
+        cacheDir: folder holding the snapshots
+        routes: False to load only what the numpy engine needs, see
+            loadSnapshot()
+        monthly: optional file path to the monthly flows .npz file
+
+    Returns:
+        G: A NetworkX Graph object like create_network(), with the network
+           arrays for zikaEngine.py in G.graph["arrays"]
+    """
+
+    sources = [nodes, edges, curves] + ([monthly] if monthly else [])
+    directory = os.path.join(cacheDir, "network-" + sourceKey(sources))
+
+    if os.path.isdir(directory):
+        print("-- Loading network snapshot --\n")
+        sys.stdout.flush()
+        return loadSnapshot(directory, routes)
+
+    G = createNetwork(nodes, edges, curves, monthly)
+    G.graph["arrays"] = zikaEngine.buildArrays(G, G.graph["inboundRoutes"])
+    saveSnapshot(directory, G, G.graph["arrays"])
+
+    return G
+
+
+def resultKey(sources, simulation):
+    """
+    Hash the source files and the parameters of a simulation
+
+    Args:
+        sources: file paths of the airport, route, mosquito curve and
+            optional monthly flow files
+        simulation: zikaSim.Simulation to be run
+
+    Returns:
+        Hex digest naming the result
+    """
+
+    digest = hashlib.sha256(sourceKey(sources).encode())
+    for name in RESULT_PARAMS:
+        digest.update((name + "=" + repr(getattr(simulation, name)) +
+                       "\0").encode())
+    digest.update(np.dtype(simulation.historyDtype).str.encode())
+    # The python and numpy engines give the same history, the ode engine
+    # its own for its solver settings
+    if simulation.engine == "ode":
+        digest.update(repr(("ode", zikaODE.ODE_STAGES, zikaODE.ODE_METHOD,
+                            zikaODE.ODE_RTOL, zikaODE.ODE_ATOL,
+                            zikaODE.ODE_MIN_INFECTIOUS)).encode())
+
+    return digest.hexdigest()[:24]
+
+
+def cachedRun(simulation, sources, cacheDir=CACHE_DIR,
+              maxBytes=RESULT_CACHE_BYTES):
+    """
+    Run a single simulation, or load its history if the same files and
+    parameters were run before.  A loaded simulation has its history and
+    timeStepsTracker but not the airport states at the end of the run.
+
+    Args:
+        simulation: zikaSim.Simulation to run
+        sources: file paths of the airport, route, mosquito curve and
+            optional monthly flow files
+        cacheDir: folder holding the snapshots and the Results folder
+        maxBytes: most disk the cached results may take
+
+    Returns:
+        True if the history was loaded from the cache
+    """
+
+    directory = os.path.join(cacheDir, RESULT_DIR)
+    path = os.path.join(directory, resultKey(sources, simulation) + ".npz")
+
+    if os.path.exists(path):
+        print("-- Loading cached results --\n")
+        sys.stdout.flush()
+
+        simulation.reset()
+        simulation.timeStepsTracker = simulation.timeSteps()
+        history = simulation.history
+        with np.load(path) as saved:
+            history.length = len(saved["days"])
+            history.recorded = int(saved["recorded"])
+            history.data[:history.length] = saved["data"]
+            history.days[:] = saved["days"]
+        # Touch the file so the least recently used results go first
+        os.utime(path)
+        return True
+
+    simulation.run()
+
+    history = simulation.history
+    os.makedirs(directory, exist_ok=True)
+    handle, temporary = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    with os.fdopen(handle, 'wb') as f:
+        np.savez(f, data=history.data[:history.length], days=history.days,
+                 recorded=np.array(history.recorded))
+    os.replace(temporary, path)
+    evictResults(directory, maxBytes)
+
+    return False
+
+
+def evictResults(directory, maxBytes):
+    """
+    Remove the least recently used results until they fit in maxBytes
+
+    Args:
+        directory: folder of the cached results
+        maxBytes: most disk the cached results may take
+
+    Returns:
+        Nothing
+    """
+
+    results = list()
+    for name in os.listdir(directory):
+        if name.endswith(".npz"):
+            stat = os.stat(os.path.join(directory, name))
+            results.append((stat.st_mtime, stat.st_size, name))
+
+    total = sum(size for used, size, name in results)
+    for used, size, name in sorted(results):
+        if total <= maxBytes:
+            break
+        os.remove(os.path.join(directory, name))
+        total -= size
+
+
+def clearResults(cacheDir=CACHE_DIR):
+    """
+    Remove every cached result
+
+    Args:
+        cacheDir: folder holding the snapshots and the Results folder
+
+    Returns:
+        Nothing
+    """
+
+    shutil.rmtree(os.path.join(cacheDir, RESULT_DIR), ignore_errors=True)
+
+
+def main():
+    """
+    Compile the snapshot for the files given on the command line
+
+    Args:
+        Nothing
+
+    Returns:
+        Nothing
+    """
+
+    import zikaSim
+
+    opts, args = getopt.getopt(sys.argv[1:], "", ["cache=", "monthly=",
+                                                  "clearresults"])
+
+    cacheDir = CACHE_DIR
+    monthly = None
+    clear = False
+    for opt, par in opts:
+        if opt == "--cache":
+            cacheDir = par
+        elif opt == "--monthly":
+            monthly = par
+        elif opt == "--clearresults":
+            clear = True
+
+    if clear:
+        clearResults(cacheDir)
+        print("-- Cached results removed --\n")
+        return
+
+    if len(args) < 3:
+        print(__doc__)
+        exit()
+
+    cachedNetwork(args[0], args[1], args[2], zikaSim.create_network, cacheDir,
+                  monthly=monthly)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,774 @@
+"""
+zikaEngine.py is the array backed infection engine for zikaSim.py.  It keeps
+the S, I, V, R and Iair compartments of every airport in NumPy arrays and
+advances one time step with a handful of vectorized operations, following the
+same rules as infection() in zikaSim.py.
+
+Every state array has a leading scenario axis of shape (scenarios, airports),
+so a single run is one scenario and the -a sweep of every city and month runs
+all of its scenarios together in one pass.
+
+Given seeds, the engine is stochastic: imports, vaccinations and new
+infections are drawn from Poisson and binomial distributions with the means
+of the deterministic rules, and after INCUBATION days every infected person
+recovers with a chance per time step that takes TO_RECOVER days on average.
+Every scenario is a replicate with its own np.random.Generator seeded from
+its seed, drawing for all of its airports at once, so a replicate draws the
+same numbers whatever batch it runs in.
+
+With params["JIT"] and Numba installed, the recovery, vaccination and
+infection of the deterministic engine run in the compiled loop of
+zikaKernel.py instead of the NumPy operations, with the same results.
+
+Select it from the command line with --engine=numpy.
+"""
+
+# Title:  zikaEngine.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+import sys
+
+import numpy as np
+from scipy import sparse
+
+import zikaKernel
+
+
+# GLOBAL (match zikaSim.py)
+DAYS_IN_YEAR = 365
+DAYS_IN_MONTH = 31
+MONTHS_IN_YEAR = 12
+MONTH_MAP = {0: "January", 1: "February", 2: "March", 3: "April", 4: "May",
+             5:"June", 6: "July", 7: "August", 8: "September", 9: "October",
+             10: "November", 11: "December"}
+COHORT_SLACK = 2  # extra ring slots for the seed and off grid time steps
+
+
+def buildArrays(network, inboundRoutes):
+    """
+    Convert the NetworkX graph and inbound route index into arrays
+
+    Args:
+        network: networkX graph network from create_network()
+        inboundRoutes: {destination node: [(origin node, daily passengers)]}
+
+    Returns:
+        Dictionary of network arrays:
+            nodes: node ids in array order
+            IATA: IATA codes in array order
+            index: {IATA: array position}
+            pop: population per airport
+            MOS: N x 12 matrix of mosquito curves
+            flow: sparse N x N daily passenger matrix (destination, origin)
+            arrivals: sparse N x routes matrix summing each stored route of
+                flow into its destination
+            originPop: population of the origin of each stored route of flow
+            operators: cache of importOperator() matrices
+            monthlyFlow: 12 x routes matrix of the daily passengers of each
+                stored route of flow by month, None without monthly flows
+    """
+
+    nodes = list(network.nodes())
+    position = {node: i for i, node in enumerate(nodes)}
+    numNodes = len(nodes)
+
+    rows = list()
+    cols = list()
+    data = list()
+    for destination, routes in inboundRoutes.items():
+        for origin, dailyPassengers in routes:
+            rows.append(position[destination])
+            cols.append(position[origin])
+            data.append(dailyPassengers)
+
+    rows = np.array(rows, dtype=np.int64)
+    cols = np.array(cols, dtype=np.int64)
+    flow = sparse.csr_matrix((np.array(data, dtype=np.float64), (rows, cols)),
+                             shape=(numNodes, numNodes))
+
+    # The same routes in the same order every month, so each month lines up
+    # with flow.data
+    monthlyFlow = None
+    monthlyInbound = network.graph.get("monthlyInbound")
+    if monthlyInbound is not None:
+        monthlyFlow = np.zeros((MONTHS_IN_YEAR, flow.nnz), dtype=np.float64)
+        for month, inbound in enumerate(monthlyInbound):
+            data = [dailyPassengers for destination in inboundRoutes
+                    for origin, dailyPassengers in inbound[destination]]
+            monthFlow = sparse.csr_matrix((np.array(data, dtype=np.float64),
+                                           (rows, cols)),
+                                          shape=(numNodes, numNodes))
+            monthlyFlow[month] = monthFlow.data
+
+    return arraysFromFlow(
+        nodes,
+        [network.node[node]["IATA"] for node in nodes],
+        np.array([network.node[node]["pop"] for node in nodes],
+                 dtype=np.int64),
+        np.array([network.node[node]["MOS"] for node in nodes],
+                 dtype=np.float64).reshape(numNodes, MONTHS_IN_YEAR),
+        flow, monthlyFlow)
+
+
+def arraysFromFlow(nodes, IATA, pop, MOS, flow, monthlyFlow=None):
+    """
+    Assemble the network arrays from node arrays and the passenger matrix
+
+    Args:
+        nodes: node ids in array order
+        IATA: IATA codes in array order
+        pop: population per airport
+        MOS: N x 12 matrix of mosquito curves
+        flow: sparse N x N daily passenger matrix (destination, origin)
+        monthlyFlow: optional 12 x routes matrix of daily passengers by month
+            in the order of flow.data
+
+    Returns:
+        Dictionary of network arrays, see buildArrays()
+    """
+
+    numNodes = len(nodes)
+    numRoutes = flow.nnz
+    arrivals = sparse.csr_matrix((np.ones(numRoutes),
+                                  (np.repeat(np.arange(numNodes),
+                                             np.diff(flow.indptr)),
+                                   np.arange(numRoutes))),
+                                 shape=(numNodes, numRoutes))
+
+    return {"nodes": nodes,
+            "IATA": IATA,
+            "index": {airport: i for i, airport in enumerate(IATA)},
+            "pop": pop,
+            "MOS": MOS,
+            "flow": flow,
+            "arrivals": arrivals,
+            "originPop": pop[flow.indices].astype(np.float64),
+            "operators": dict(),
+            "monthlyFlow": monthlyFlow}
+
+
+def cohortCapacity(params):
+    """
+    Number of infection groups an airport can hold at once, the time steps
+    that fit in the TO_RECOVER + INCUBATION days before a group recovers
+
+    Args:
+        params: simulation parameters with TO_RECOVER and INCUBATION
+
+    Returns:
+        Size of the cohort ring of every airport
+    """
+
+    days = params["TO_RECOVER"] + params["INCUBATION"]
+    return int(np.ceil(days / max(1, params["INCUBATION"]))) + COHORT_SLACK
+
+
+def setupState(arrays, scenarios, params, history=None, seeds=None,
+               profiler=None):
+    """
+    Create a fresh, uninfected state for every scenario
+
+    Args:
+        arrays: network arrays from buildArrays()
+        scenarios: list of (city to infect, date to infect) pairs, one per
+            scenario
+        params: simulation parameters, see infection(), to size the cohort
+            rings
+        history: optional zikaHistory.History to record the I, S, V, R of
+            the first scenario in every time step
+        seeds: optional seed or np.random.SeedSequence per scenario to run
+            them as stochastic replicates, each with its own generator, see
+            replicateDraws()
+        profiler: optional zikaProfile.Profiler to time the phases of every
+            time step
+
+    Returns:
+        Dictionary of state arrays of shape (scenarios, airports).  "I" is the
+        total infected and "Inew" the last group newly infected, like
+        AirportState.I and AirportState.Inew in zikaSim.py.  The infection
+        groups waiting to recover are kept in a fixed size ring per airport,
+        cohortT (time step) and cohortN (count), holding "count" groups from
+        "head" onwards.
+    """
+
+    shape = (len(scenarios), len(arrays["nodes"]))
+    cohortShape = shape + (cohortCapacity(params),)
+
+    return {"I": np.zeros(shape, dtype=np.int64),
+            "Inew": np.zeros(shape, dtype=np.int64),
+            "Iair": np.zeros(shape, dtype=np.int64),
+            "S": np.broadcast_to(arrays["pop"], shape).copy(),
+            "V": np.zeros(shape, dtype=np.int64),
+            "R": np.zeros(shape, dtype=np.int64),
+            "cohortT": np.zeros(cohortShape, dtype=np.int64),
+            "cohortN": np.zeros(cohortShape, dtype=np.int64),
+            "head": np.zeros(shape, dtype=np.int64),
+            "count": np.zeros(shape, dtype=np.int64),
+            "cities": [city for city, date in scenarios],
+            "seedCity": np.array([arrays["index"].get(city, -1)
+                                  for city, date in scenarios],
+                                 dtype=np.int64),
+            "seedDate": np.array([date for city, date in scenarios],
+                                 dtype=np.int64),
+            "history": history,
+            "generators": None if seeds is None else
+            [np.random.default_rng(seed) for seed in seeds],
+            "profiler": profiler}
+
+
+def addCohort(state, rows, cols, timeSteps, counts):
+    """
+    Queue newly infected groups to recover later at the end of their rings
+
+    Args:
+        state: state arrays from setupState()
+        rows: scenario of each new group
+        cols: airport of each new group
+        timeSteps: time step each group was infected
+        counts: number of people in each new group
+
+    Returns:
+        Nothing
+    """
+
+    count = state["count"][rows, cols]
+    if len(count) and count.max() >= state["cohortT"].shape[2]:
+        growCohorts(state)
+
+    capacity = state["cohortT"].shape[2]
+    slot = (state["head"][rows, cols] + count) % capacity
+    state["cohortT"][rows, cols, slot] = timeSteps
+    state["cohortN"][rows, cols, slot] = counts
+    state["count"][rows, cols] += 1
+
+
+def growCohorts(state):
+    """
+    Double the cohort rings, unrolled so every ring starts at slot 0.  Only
+    needed when the time steps are closer together than INCUBATION days, or
+    when groups wait behind the oldest one with params["RECOVERY"] "oldest".
+
+    Args:
+        state: state arrays from setupState(), updated in place
+
+    Returns:
+        Nothing
+    """
+
+    capacity = state["cohortT"].shape[2]
+    position = (state["head"][:, :, np.newaxis] + np.arange(capacity)) % \
+        capacity
+    for key in ("cohortT", "cohortN"):
+        state[key] = np.concatenate(
+            (np.take_along_axis(state[key], position, axis=2),
+             np.zeros_like(state[key])), axis=2)
+    state["head"][:] = 0
+
+
+def elapsedDays(timeSteps, groupT, params):
+    """
+    Days since infection groups were infected, counted around the end of the
+    simulation length with params["RECOVERY"] "every", so the -a sweep keeps
+    recovering after it wraps
+
+    Args:
+        timeSteps: time step of every group
+        groupT: time step every group was infected
+        params: simulation parameters, see infection()
+
+    Returns:
+        Integer array of the days
+    """
+
+    elapsed = timeSteps - groupT
+    if params.get("RECOVERY", "oldest") == "every":
+        elapsed %= params.get("SIMULATION_LENGTH", DAYS_IN_YEAR)
+
+    return elapsed
+
+
+def recoverCohorts(state, timeSteps, params, activeRows):
+    """
+    Recover the infection groups that have been infected for TO_RECOVER +
+    INCUBATION days, only the oldest one like infection() in zikaSim.py or,
+    with params["RECOVERY"] "every", every one oldest first.
+
+    Args:
+        state: state arrays from setupState(), updated in place
+        timeSteps: time step of every scenario
+        params: simulation parameters, see infection()
+        activeRows: (scenarios, 1) boolean array of the scenarios to step
+
+    Returns:
+        Nothing
+    """
+
+    rows, cols = np.nonzero((state["count"] > 0) & activeRows)
+    if not len(rows):
+        return
+
+    capacity = state["cohortT"].shape[2]
+    offsets = np.arange(capacity)
+    head = state["head"][rows, cols]
+    slots = (head[:, np.newaxis] + offsets) % capacity
+    groupT = state["cohortT"][rows[:, np.newaxis], cols[:, np.newaxis], slots]
+    groupN = state["cohortN"][rows[:, np.newaxis], cols[:, np.newaxis], slots]
+
+    elapsed = elapsedDays(timeSteps[rows, np.newaxis], groupT, params)
+    due = (offsets < state["count"][rows, cols, np.newaxis]) & \
+        (elapsed >= params["TO_RECOVER"] + params["INCUBATION"])
+    # Only the expired groups at the head of the ring, in infection order
+    due = np.logical_and.accumulate(due, axis=1)
+    if params.get("RECOVERY", "oldest") == "oldest":
+        due[:, 1:] = False
+
+    numDue = due.sum(axis=1)
+    group = np.where(due, groupN, 0).sum(axis=1)
+    state["I"][rows, cols] -= group
+    state["R"][rows, cols] += group
+    state["head"][rows, cols] = (head + numDue) % capacity
+    state["count"][rows, cols] -= numDue
+
+    # If a recovered amount leaving matches the last one, then clear
+    cleared = (due & (groupN == state["Inew"][rows, cols, np.newaxis])).any(
+        axis=1)
+    state["Inew"][rows[cleared], cols[cleared]] = 0
+
+
+def drawRecoveries(state, timeSteps, params, activeRows):
+    """
+    Recover the replicates' infection groups at random.  Once past its
+    INCUBATION days each person of a group recovers with the same chance
+    every time step of INCUBATION days, a geometric delay of TO_RECOVER days
+    on average, drawn as a binomial per group and time step.  Emptied groups
+    at the head of the ring are dropped.
+
+    Args:
+        state: state arrays from setupState() with seeds, updated in place
+        timeSteps: time step of every scenario
+        params: simulation parameters, see infection()
+        activeRows: (scenarios, 1) boolean array of the scenarios to step
+
+    Returns:
+        Nothing
+    """
+
+    rows, cols = np.nonzero((state["count"] > 0) & activeRows)
+    if not len(rows):
+        return
+
+    capacity = state["cohortT"].shape[2]
+    offsets = np.arange(capacity)
+    head = state["head"][rows, cols]
+    count = state["count"][rows, cols]
+    slots = (head[:, np.newaxis] + offsets) % capacity
+    groupT = state["cohortT"][rows[:, np.newaxis], cols[:, np.newaxis], slots]
+    groupN = state["cohortN"][rows[:, np.newaxis], cols[:, np.newaxis], slots]
+
+    # Groups past their incubation, each recovering a share of INCUBATION
+    # out of TO_RECOVER days per time step on average
+    elapsed = elapsedDays(timeSteps[rows, np.newaxis], groupT, params)
+    live = offsets < count[:, np.newaxis]
+    group, offset = np.nonzero(live & (groupN > 0) &
+                               (elapsed > params["INCUBATION"]))
+    chance = min(1.0, max(1, params["INCUBATION"]) /
+                 max(1, params["TO_RECOVER"]))
+    recovered = np.zeros_like(groupN)
+    recovered[group, offset] = replicateDraws(
+        state, rows[group], "binomial", groupN[group, offset],
+        np.full(len(group), chance))
+
+    left = groupN - recovered
+    state["cohortN"][rows[:, np.newaxis], cols[:, np.newaxis], slots] = left
+    total = recovered.sum(axis=1)
+    state["I"][rows, cols] -= total
+    state["R"][rows, cols] += total
+
+    # The last group only keeps infecting with the people it has left
+    newest = left[np.arange(len(rows)), count - 1]
+    state["Inew"][rows, cols] = np.minimum(state["Inew"][rows, cols], newest)
+
+    # Only the emptied groups at the head of the ring, in infection order
+    empty = np.logical_and.accumulate(live & (left == 0), axis=1)
+    numEmpty = empty.sum(axis=1)
+    state["head"][rows, cols] = (head + numEmpty) % capacity
+    state["count"][rows, cols] -= numEmpty
+
+
+def infection(arrays, state, timeStep, params, active=None):
+    """
+    Run infection simulation one time step
+
+    Args:
+        arrays: network arrays from buildArrays()
+        state: state arrays from setupState(), updated in place
+        timeStep: current time step of simulation to work on in days, either
+            one day for every scenario or an array with a day per scenario
+        params: simulation parameters named like the zikaSim.py globals
+            (TAU, INCUBATION, TO_RECOVER, VACCINATE, VACCINATE_PERC,
+            SCREEN_PERC, SIMULATION_LENGTH) and IMPORTS, "route" to round
+            the infected passengers of every route like infection() in
+            zikaSim.py or "expected" to import the expected number, see
+            expectedImports(), RECOVERY, "oldest" to recover one group per
+            time step like infection() in zikaSim.py or "every" for every
+            due group, see recoverCohorts(), and JIT, True for the
+            zikaKernel.py loop when Numba is installed
+        active: optional boolean array of the scenarios to step, the others
+            are left untouched
+
+    Returns:
+        Nothing
+    """
+
+    I = state["I"]
+    S = state["S"]
+    V = state["V"]
+    R = state["R"]
+    numScenarios = I.shape[0]
+    timeSteps = np.broadcast_to(np.asarray(timeStep, dtype=np.int64),
+                                (numScenarios,))
+    approxMonth = timeSteps // DAYS_IN_MONTH % MONTHS_IN_YEAR
+    if active is None:
+        active = np.ones(numScenarios, dtype=bool)
+    activeRows = active[:, np.newaxis]
+    profiler = state["profiler"]
+    if profiler is not None:
+        profiler.mark()
+
+    # Fast forward while nothing is infected and no city is infected today,
+    # the step could not change anything
+    if not I.any() and not (active & (timeSteps == state["seedDate"])).any():
+        recordHistory(state, timeSteps)
+        if profiler is not None:
+            profiler.lap("fast forward", timeSteps=1)
+        return
+
+    if state["generators"] is not None:
+        # Infected passengers landing at every airport, drawn around the
+        # expected number
+        imports = expectedImports(arrays, I, params["SCREEN_PERC"],
+                                  approxMonth)
+        state["Iair"] += drawPoisson(state, np.where(activeRows, imports, 0))
+    elif params.get("IMPORTS", "route") == "expected":
+        # Spread disease to other Airports, one sparse product for every
+        # scenario
+        imports = expectedImports(arrays, I, params["SCREEN_PERC"],
+                                  approxMonth)
+        state["Iair"] += np.trunc(imports).astype(np.int64)
+    else:
+        # Daily passengers of every route, looked up by month with monthly
+        # flows
+        dailyPassengers = arrays["flow"].data
+        if arrays.get("monthlyFlow") is not None:
+            months = np.unique(approxMonth)
+            dailyPassengers = arrays["monthlyFlow"][months[0]] \
+                if len(months) == 1 else arrays["monthlyFlow"][approxMonth]
+
+        # Spread disease to other Airports, rounding every route like
+        # infection()
+        perRoute = np.ceil(np.trunc(I[:, arrays["flow"].indices] /
+                                    arrays["originPop"] * dailyPassengers) *
+                           (1-params["SCREEN_PERC"]))
+        state["Iair"] += (arrays["arrivals"] @ perRoute.T).T.astype(np.int64)
+    if profiler is not None:
+        profiler.lap("routes", routesScanned=arrays["flow"].nnz *
+                     int(active.sum()))
+
+    #  Record stats
+    recordHistory(state, timeSteps)
+    if profiler is not None:
+        profiler.lap("record")
+
+    # The rest of the step in one compiled loop over every airport
+    if params.get("JIT") and zikaKernel.available() and \
+            state["generators"] is None:
+        seeding = active & (timeSteps == state["seedDate"]) & \
+            (state["seedCity"] >= 0)
+        announceInfection(state, np.flatnonzero(seeding))
+        # Room for a new group and the seed at every airport
+        if state["count"].max() + 2 > state["cohortT"].shape[2]:
+            growCohorts(state)
+        zikaKernel.step(arrays["MOS"], state, timeSteps, approxMonth, active,
+                        seeding, params)
+        state["Iair"][:] = 0
+        if profiler is not None:
+            profiler.lap("kernel", timeSteps=1,
+                         nodesActive=int(np.count_nonzero(I)))
+        return
+
+    # Check for recovery, every expired group of every airport
+    if profiler is not None:
+        groups = int(state["count"].sum())
+    if state["generators"] is not None:
+        drawRecoveries(state, timeSteps, params, activeRows)
+    else:
+        recoverCohorts(state, timeSteps, params, activeRows)
+    if profiler is not None:
+        profiler.lap("recovery",
+                     cohortsRecovered=groups - int(state["count"].sum()))
+        vaccinated = int(V.sum())
+
+    # Vaccinate people, each susceptible with the chance that gives the
+    # O'Leary number on average
+    if params["VACCINATE"] and state["generators"] is not None:
+        vaccinating = (I > 0) & (S > 0) & activeRows
+        numVaccinate = drawBinomial(state, S, np.where(
+            vaccinating, params["VACCINATE_PERC"] * I /
+            np.maximum(I + S, 1), 0))
+        V += numVaccinate
+        S -= numVaccinate
+    elif params["VACCINATE"]:
+        rows, cols = np.nonzero((I > 0) & (S > 0) & activeRows)
+        infected = I[rows, cols]
+        susceptible = S[rows, cols]
+        numVaccinate = np.minimum(np.ceil(params["VACCINATE_PERC"] *
+                                          infected * susceptible /
+                                          (infected + susceptible)),
+                                  susceptible).astype(np.int64)
+        V[rows, cols] += numVaccinate
+        S[rows, cols] -= numVaccinate
+    if profiler is not None:
+        profiler.lap("vaccination", vaccinated=int(V.sum()) - vaccinated)
+
+    # Infect cities
+    seeded = np.flatnonzero(active & (timeSteps == state["seedDate"]) &
+                            (state["seedCity"] >= 0))
+    if len(seeded):
+        infectCity(state, seeded)
+        if profiler is not None:
+            profiler.lap("infectCity")
+
+    expected = params["TAU"] * arrays["MOS"].T[approxMonth] * \
+        (state["Inew"] + state["Iair"])
+    if state["generators"] is not None:
+        # Each susceptible is infected with the chance that gives the
+        # expected number on average
+        newlyInfected = drawBinomial(state, S, np.where(
+            activeRows, expected / np.maximum(S, 1), 0))
+    else:
+        newlyInfected = np.minimum(np.ceil(expected), S).astype(np.int64)
+
+    rows, cols = np.nonzero((newlyInfected > 0) & activeRows)
+    newGroup = newlyInfected[rows, cols]
+    S[rows, cols] -= newGroup
+    addCohort(state, rows, cols, timeSteps[rows], newGroup)
+    I[rows, cols] += newGroup
+    state["Inew"][rows, cols] = newGroup
+
+    # Remove temporary airport visitors
+    state["Iair"][:] = 0
+    if profiler is not None:
+        profiler.lap("infection", timeSteps=1,
+                     newlyInfected=int(newGroup.sum()),
+                     airportsStepped=int(active.sum()) * I.shape[1],
+                     nodesActive=int(np.count_nonzero(I)))
+
+
+def recordHistory(state, timeSteps):
+    """
+    Record the I, S, V, R of the first scenario in the history, if any
+
+    Args:
+        state: state arrays from setupState()
+        timeSteps: time step of every scenario
+
+    Returns:
+        Nothing
+    """
+
+    if state["history"] is not None:
+        state["history"].record(timeSteps[0], np.stack(
+            (state["I"][0], state["S"][0], state["V"][0], state["R"][0]),
+            axis=1))
+
+
+def replicateDraws(state, rows, method, *parameters):
+    """
+    Draws of the replicates, each from its own generator with one call for
+    all of its draws, so a replicate only uses its own numbers whatever
+    batch it runs in
+
+    Args:
+        state: state arrays from setupState() with seeds
+        rows: replicate of each draw, in increasing order
+        method: np.random.Generator method, "binomial" or "poisson"
+        parameters: arrays of the parameters of the distribution, one value
+            per draw
+
+    Returns:
+        Integer array of the shape of rows
+    """
+
+    drawn = np.zeros(len(rows), dtype=np.int64)
+    replicates, starts = np.unique(rows, return_index=True)
+    for replicate, begin, end in zip(replicates, starts,
+                                     np.append(starts[1:], len(rows))):
+        draw = getattr(state["generators"][replicate], method)
+        drawn[begin:end] = draw(*[values[begin:end]
+                                  for values in parameters])
+
+    return drawn
+
+
+def drawBinomial(state, n, p):
+    """
+    Binomial draws for every airport of every replicate
+
+    Args:
+        state: state arrays from setupState() with seeds
+        n: number of trials of shape (scenarios, airports)
+        p: chance of success of shape (scenarios, airports)
+
+    Returns:
+        Integer array of shape (scenarios, airports)
+    """
+
+    p = np.clip(p, 0, 1)
+    drawn = np.zeros(n.shape, dtype=np.int64)
+    rows, cols = np.nonzero((n > 0) & (p > 0))
+    drawn[rows, cols] = replicateDraws(state, rows, "binomial",
+                                       n[rows, cols], p[rows, cols])
+
+    return drawn
+
+
+def drawPoisson(state, mean):
+    """
+    Poisson draws for every airport of every replicate
+
+    Args:
+        state: state arrays from setupState() with seeds
+        mean: expected counts of shape (scenarios, airports)
+
+    Returns:
+        Integer array of shape (scenarios, airports)
+    """
+
+    drawn = np.zeros(mean.shape, dtype=np.int64)
+    rows, cols = np.nonzero(mean > 0)
+    drawn[rows, cols] = replicateDraws(state, rows, "poisson",
+                                       mean[rows, cols])
+
+    return drawn
+
+
+def importOperator(arrays, screenPerc, month=None):
+    """
+    Sparse matrix taking the infected fraction of every airport to the
+    expected number of infected passengers landing at every airport in a day,
+    with screening folded into the weights.  Built once per screening rate and
+    month and kept in arrays["operators"].
+
+    Args:
+        arrays: network arrays from buildArrays()
+        screenPerc: Screen rate at airports
+        month: month of the monthly flows, None for the annual flows
+
+    Returns:
+        Sparse N x N matrix (destination, origin)
+    """
+
+    key = (screenPerc, month)
+    operators = arrays.setdefault("operators", dict())
+    if key not in operators:
+        flow = arrays["flow"]
+        dailyPassengers = flow.data if month is None or \
+            arrays.get("monthlyFlow") is None else arrays["monthlyFlow"][month]
+        operators[key] = sparse.csr_matrix(
+            (dailyPassengers * (1-screenPerc), flow.indices, flow.indptr),
+            shape=flow.shape)
+
+    return operators[key]
+
+
+def expectedImports(arrays, I, screenPerc, approxMonth):
+    """
+    Expected infected passengers landing at every airport, without rounding
+    each route
+
+    Args:
+        arrays: network arrays from buildArrays()
+        I: infected of shape (scenarios, airports)
+        screenPerc: Screen rate at airports
+        approxMonth: month of every scenario
+
+    Returns:
+        Float array of shape (scenarios, airports)
+    """
+
+    fraction = I / arrays["pop"]
+    if arrays.get("monthlyFlow") is None:
+        return (importOperator(arrays, screenPerc) @ fraction.T).T
+
+    # Scenarios in the same month share one product with a batch of columns
+    imports = np.zeros(I.shape)
+    for month in np.unique(approxMonth):
+        rows = approxMonth == month
+        imports[rows] = (importOperator(arrays, screenPerc, int(month)) @
+                         fraction[rows].T).T
+
+    return imports
+
+
+def infectCity(state, seeded):
+    """
+    Infect designated city with first infection of 1
+
+    Args:
+        state: state arrays from setupState(), updated in place
+        seeded: scenarios whose city is infected on this time step
+
+    Returns:
+        Nothing
+    """
+
+    announceInfection(state, seeded)
+
+    cols = state["seedCity"][seeded]
+    state["S"][seeded, cols] -= 1
+    addCohort(state, seeded, cols, state["seedDate"][seeded], 1)
+    state["I"][seeded, cols] += 1
+    state["Inew"][seeded, cols] += 1
+
+
+def announceInfection(state, seeded):
+    """
+    Print the city and month of every scenario infected on this time step
+
+    Args:
+        state: state arrays from setupState()
+        seeded: scenarios whose city is infected on this time step
+
+    Returns:
+        Nothing
+    """
+
+    for scenario in seeded:
+        print("-- Infecting " + state["cities"][scenario] + " in " +
+              MONTH_MAP[(state["seedDate"][scenario]//DAYS_IN_MONTH) %
+                        MONTHS_IN_YEAR] + " --\n")
+    sys.stdout.flush()
+
+
+def runAllTimeSteps(date, simulationLength, incubation):
+    """
+    Time steps of one -a scenario, a year from the infection date wrapped at
+    the end of the simulation length
+
+    Args:
+        date: date to infect
+        simulationLength: number of days in the simulation
+        incubation: days between time steps
+
+    Returns:
+        List of time steps in order
+    """
+
+    timeSteps = list()
+    for j in range(date, DAYS_IN_YEAR + date):
+        j %= simulationLength
+        if j % incubation == 0 or j == date:
+            timeSteps.append(j)
+
+    return timeSteps
+
@@ -0,0 +1,328 @@
+"""
+zikaHistory.py holds the I, S, V and R history of a simulation in one
+preallocated NumPy array of shape (time steps, airports, compartments), sized
+before the run from the start day, simulation length and incubation days, so
+its memory is known up front instead of growing a list per airport every time
+step.
+
+Both engines of zikaSim.py record into a History, and the stats plots and
+updateIDic() read it back through views of the array without copying.  A
+History can store float32 instead of int64, or keep only every n-th time step,
+to halve or divide its memory for long runs.
+
+A TrajectoryStore keeps the history of every scenario of a sweep on disk, as
+a folder of memory mapped .npy files with one contiguous chunk per scenario.
+Each worker writes the chunks of its own scenarios once, and analysis scripts
+open the folder and slice a scenario or an airport without reading the rest.
+"""
+
+# Title:  zikaHistory.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+import collections.abc
+import os
+
+import numpy as np
+
+
+# GLOBAL
+COMPARTMENTS = ("I", "S", "V", "R")
+SCENARIO_FIELDS = {"CITY_TO_INFECT": str, "DATE_TO_INFECT": np.int64,
+                   "TAU": np.float64, "VACCINATE_PERC": np.float64,
+                   "SCREEN_PERC": np.float64}
+TRAJECTORY_DTYPE = np.int32  # exact for any airport population
+
+
+class History(object):
+    """
+    Preallocated I, S, V, R history of every airport
+
+    Attributes:
+        IATA: IATA codes in array order
+        index: {IATA: array position}
+        every: only every n-th recorded time step is kept
+        data: (time steps, airports, compartments) array, filled up to length
+        length: number of time steps stored so far
+        recorded: number of time steps recorded, stored or skipped
+        current: (airports, compartments) values the next record() stores
+    """
+
+    def __init__(self, IATA, numSteps, dtype=np.int64, every=1, data=None,
+                 days=None):
+        """
+        Args:
+            IATA: IATA codes of the airports in array order
+            numSteps: number of time steps the simulation records
+            dtype: np.int64 for exact counts or np.float32 for half the memory
+            every: keep every n-th time step, 1 keeps them all
+            data: optional (time steps, airports, compartments) array to
+                record into instead of allocating one, e.g. a chunk of a
+                TrajectoryStore
+            days: optional array of the days of the time steps to go with
+                data
+        """
+
+        self.IATA = list(IATA)
+        self.index = {airport: i for i, airport in enumerate(self.IATA)}
+        self.every = every
+        self.data = data if data is not None else \
+            np.zeros((-(-numSteps // every), len(self.IATA),
+                      len(COMPARTMENTS)), dtype=dtype)
+        self.length = 0
+        self.recorded = 0
+        self._days = days if days is not None else \
+            np.zeros(self.data.shape[0], dtype=np.int64)
+        self.current = np.zeros(self.data.shape[1:], dtype=self.data.dtype)
+
+    @property
+    def nbytes(self):
+        """
+        Memory held by the history in bytes
+        """
+
+        return self.data.nbytes + self._days.nbytes
+
+    @property
+    def days(self):
+        """
+        Days of the stored time steps, a view
+        """
+
+        return self._days[:self.length]
+
+    def update(self, positions, compartments):
+        """
+        Change the current values of some airports, for engines that only
+        step the airports with something to do
+
+        Args:
+            positions: array positions of the airports
+            compartments: (airports, compartments) array or list of their I,
+                S, V and R
+
+        Returns:
+            Nothing
+        """
+
+        self.current[positions] = compartments
+
+    def record(self, day, compartments=None):
+        """
+        Store the compartments of every airport for one time step
+
+        Args:
+            day: time step in days
+            compartments: (airports, compartments) array or list of the I,
+                S, V and R of every airport, None to store the current values
+                kept by update()
+
+        Returns:
+            Nothing
+        """
+
+        if compartments is not None:
+            self.current[...] = compartments
+
+        self.recorded += 1
+        if (self.recorded - 1) % self.every:
+            return
+
+        self.data[self.length] = self.current
+        self._days[self.length] = day
+        self.length += 1
+
+    def compartment(self, name):
+        """
+        History of one compartment for every airport, a view
+
+        Args:
+            name: "I", "S", "V" or "R"
+
+        Returns:
+            (time steps, airports) array
+        """
+
+        return self.data[:self.length, :, COMPARTMENTS.index(name)]
+
+    def view(self, name):
+        """
+        History of one compartment keyed by airport, every value a view
+
+        Args:
+            name: "I", "S", "V" or "R"
+
+        Returns:
+            CompartmentView of {IATA: array over the time steps}
+        """
+
+        return CompartmentView(self, COMPARTMENTS.index(name))
+
+
+class CompartmentView(collections.abc.Mapping):
+    """
+    Read only {IATA: count at every time step} mapping over one compartment
+    of a History, what Simulation.I, S, V and R in zikaSim.py return
+    """
+
+    def __init__(self, history, compartment):
+        self.history = history
+        self.compartment = compartment
+
+    def __getitem__(self, airport):
+        history = self.history
+        return history.data[:history.length, history.index[airport],
+                            self.compartment]
+
+    def __iter__(self):
+        return iter(self.history.IATA)
+
+    def __len__(self):
+        return len(self.history.IATA)
+
+
+class TrajectoryStore(object):
+    """
+    Memory mapped history of every scenario of a sweep, in a folder of .npy
+    files that np.load(mmap_mode="r") can also open directly
+
+    Attributes:
+        directory: folder holding the store
+        IATA: IATA codes in array order
+        index: {IATA: array position}
+        data: (scenarios, time steps, airports, compartments) memory map
+        days: (scenarios, time steps) memory map of the days recorded
+        lengths: (scenarios,) memory map of the time steps recorded by each
+            scenario, 0 until it has been written
+        scenarios: {field: array over the scenarios} of SCENARIO_FIELDS
+    """
+
+    def __init__(self, directory, mode="r"):
+        """
+        Args:
+            directory: folder written by TrajectoryStore.create()
+            mode: "r" to read or "r+" for workers to write their chunks
+        """
+
+        def load(key, loadMode=mode):
+            return np.load(os.path.join(directory, key + ".npy"),
+                           mmap_mode=loadMode)
+
+        self.directory = directory
+        self.IATA = load("IATA", None).tolist()
+        self.index = {airport: i for i, airport in enumerate(self.IATA)}
+        self.data = load("trajectories")
+        self.days = load("days")
+        self.lengths = load("lengths")
+        self.scenarios = {field: load(field, None)
+                          for field in SCENARIO_FIELDS}
+
+    @classmethod
+    def create(cls, directory, IATA, scenarios, numSteps,
+               dtype=TRAJECTORY_DTYPE):
+        """
+        Allocate the files of a store on disk, without writing the histories
+
+        Args:
+            directory: folder to create
+            IATA: IATA codes of the airports in array order
+            scenarios: list of {field: value} of SCENARIO_FIELDS, one per
+                scenario in store order
+            numSteps: most time steps any scenario records
+            dtype: type of the stored counts
+
+        Returns:
+            The TrajectoryStore opened for writing
+        """
+
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "IATA.npy"),
+                np.array(IATA, dtype=str))
+        for field, fieldType in SCENARIO_FIELDS.items():
+            np.save(os.path.join(directory, field + ".npy"),
+                    np.array([scenario[field] for scenario in scenarios],
+                             dtype=fieldType))
+
+        # Sparse files, the chunks only take disk space once written
+        shapes = {"trajectories": ((len(scenarios), numSteps, len(IATA),
+                                    len(COMPARTMENTS)), dtype),
+                  "days": ((len(scenarios), numSteps), np.int64),
+                  "lengths": ((len(scenarios),), np.int64)}
+        for key, (shape, keyType) in shapes.items():
+            np.lib.format.open_memmap(os.path.join(directory, key + ".npy"),
+                                      mode="w+", dtype=keyType,
+                                      shape=shape).flush()
+
+        return cls(directory, "r+")
+
+    def history(self, scenario):
+        """
+        History recording straight into the chunk of one scenario
+
+        Args:
+            scenario: scenario number in the store
+
+        Returns:
+            History over the chunk, pass it to finish() when done
+        """
+
+        return History(self.IATA, self.data.shape[1], data=self.data[scenario],
+                       days=self.days[scenario])
+
+    def finish(self, scenario, history):
+        """
+        Mark the chunk of a scenario as written
+
+        Args:
+            scenario: scenario number in the store
+            history: History from history() after the simulation
+
+        Returns:
+            Nothing
+        """
+
+        self.lengths[scenario] = history.length
+
+    def scenario(self, scenario):
+        """
+        History of one scenario, memory mapped
+
+        Args:
+            scenario: scenario number in the store
+
+        Returns:
+            (days, (time steps, airports, compartments) array)
+        """
+
+        length = int(self.lengths[scenario])
+        return self.days[scenario, :length], self.data[scenario, :length]
+
+    def airport(self, airport, compartment="I"):
+        """
+        One compartment of one airport in every scenario, memory mapped.
+        Scenarios with fewer time steps are padded with zeros past their
+        length.
+
+        Args:
+            airport: IATA code
+            compartment: "I", "S", "V" or "R"
+
+        Returns:
+            (scenarios, time steps) array
+        """
+
+        return self.data[:, :, self.index[airport],
+                         COMPARTMENTS.index(compartment)]
+
+    def flush(self):
+        """
+        Write the chunks held in memory back to disk
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+
+        for value in (self.data, self.days, self.lengths):
+            value.flush()
@@ -0,0 +1,217 @@
+"""
+zikaKernel.py is the compiled inner loop of the numpy engine in zikaEngine.py.
+After the infected passengers of a time step are counted, the rest of the
+step works airport by airport with branches on the data: popping the expired
+infection groups of each airport, vaccinating only where there are infected
+and susceptible, and clipping the newly infected at the susceptible.  Here
+that is one loop over every airport of every scenario, compiled with Numba in
+nopython mode, following the same rules as zikaEngine.infection() so both
+give the same results.
+
+Numba is optional and only imported by available() when the kernel is first
+asked for, so runs without --jit never load it.  Without it available() is
+False and zikaEngine.py keeps using its NumPy operations.  The first call
+compiles the kernel, or loads it from the Numba cache in __pycache__, which
+warmUp() times on its own.
+
+Select it from the command line with --jit.
+"""
+
+# Title:  zikaKernel.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+import math
+import time
+
+import numpy as np
+
+
+# GLOBAL
+AVAILABLE = None  # whether Numba imports, None until available() is called
+stepAirportsJit = None  # stepAirports() compiled by available()
+
+
+def available():
+    """
+    Import Numba and wrap the kernel on the first call
+
+    Args:
+        Nothing
+
+    Returns:
+        True if Numba is installed and the kernel can be compiled
+    """
+    global AVAILABLE, stepAirportsJit
+
+    if AVAILABLE is None:
+        try:
+            import numba
+        except ImportError:
+            AVAILABLE = False
+        else:
+            stepAirportsJit = numba.njit(cache=True)(stepAirports)
+            AVAILABLE = True
+
+    return AVAILABLE
+
+
+def stepAirports(I, Inew, Iair, S, V, R, cohortT, cohortN, head, count, MOS,
+                 approxMonth, timeSteps, active, seeding, seedCity, seedDate,
+                 tau, incubation, toRecover, vaccinate, vaccinatePerc,
+                 simulationLength, recoverEvery):
+    """
+    Recover, vaccinate, infect the seed city and infect at every airport of
+    every active scenario for one time step, the state arrays from
+    zikaEngine.setupState() updated in place.  The cohort rings must have
+    room for two more groups at every airport.
+
+    Args:
+        I, Inew, Iair, S, V, R: (scenarios, airports) compartments
+        cohortT, cohortN, head, count: cohort rings of the infection groups
+        MOS: N x 12 matrix of mosquito curves
+        approxMonth: month of every scenario
+        timeSteps: time step of every scenario
+        active: scenarios to step
+        seeding: scenarios whose city is infected on this time step
+        seedCity, seedDate: airport and date to infect of every scenario
+        tau, incubation, toRecover, vaccinate, vaccinatePerc,
+            simulationLength: simulation parameters, see
+            zikaEngine.infection()
+        recoverEvery: True to recover every due group with the days counted
+            around the simulation length, False for only the oldest one
+
+    Returns:
+        Nothing
+    """
+
+    numScenarios, numNodes = I.shape
+    capacity = cohortT.shape[2]
+    expired = toRecover + incubation
+
+    for s in range(numScenarios):
+        if not active[s]:
+            continue
+        timeStep = timeSteps[s]
+        month = approxMonth[s]
+
+        for a in range(numNodes):
+            # Check for recovery, the oldest or every expired group from the
+            # head of the ring
+            recovered = 0
+            cleared = False
+            while count[s, a] > 0:
+                slot = head[s, a]
+                elapsed = timeStep - cohortT[s, a, slot]
+                if recoverEvery:
+                    elapsed %= simulationLength
+                if elapsed < expired:
+                    break
+                recovered += cohortN[s, a, slot]
+                if cohortN[s, a, slot] == Inew[s, a]:
+                    cleared = True
+                head[s, a] = (slot + 1) % capacity
+                count[s, a] -= 1
+                if not recoverEvery:
+                    break
+            I[s, a] -= recovered
+            R[s, a] += recovered
+            # If a recovered amount leaving matches the last one, then clear
+            if cleared:
+                Inew[s, a] = 0
+
+            # Vaccinate people
+            if vaccinate and I[s, a] > 0 and S[s, a] > 0:
+                numVaccinate = min(math.ceil(vaccinatePerc * I[s, a] *
+                                             S[s, a] / (I[s, a] + S[s, a])),
+                                   S[s, a])
+                V[s, a] += numVaccinate
+                S[s, a] -= numVaccinate
+
+            # Infect cities
+            if seeding[s] and a == seedCity[s]:
+                S[s, a] -= 1
+                slot = (head[s, a] + count[s, a]) % capacity
+                cohortT[s, a, slot] = seedDate[s]
+                cohortN[s, a, slot] = 1
+                count[s, a] += 1
+                I[s, a] += 1
+                Inew[s, a] += 1
+
+            newlyInfected = min(math.ceil(tau * MOS[a, month] *
+                                          (Inew[s, a] + Iair[s, a])),
+                                S[s, a])
+            if newlyInfected > 0:
+                S[s, a] -= newlyInfected
+                slot = (head[s, a] + count[s, a]) % capacity
+                cohortT[s, a, slot] = timeStep
+                cohortN[s, a, slot] = newlyInfected
+                count[s, a] += 1
+                I[s, a] += newlyInfected
+                Inew[s, a] = newlyInfected
+
+
+def step(MOS, state, timeSteps, approxMonth, active, seeding, params):
+    """
+    Run the compiled kernel over the state of zikaEngine.setupState()
+
+    Args:
+        MOS: N x 12 matrix of mosquito curves
+        state: state arrays from zikaEngine.setupState(), updated in place
+        timeSteps: time step of every scenario
+        approxMonth: month of every scenario
+        active: boolean array of the scenarios to step
+        seeding: boolean array of the scenarios whose city is infected on
+            this time step
+        params: simulation parameters, see zikaEngine.infection()
+
+    Returns:
+        Nothing
+    """
+
+    # Same argument types every call, so the kernel compiles once
+    stepAirportsJit(state["I"], state["Inew"], state["Iair"], state["S"],
+                    state["V"], state["R"], state["cohortT"],
+                    state["cohortN"], state["head"], state["count"],
+                    np.ascontiguousarray(MOS, dtype=np.float64),
+                    approxMonth.astype(np.int64),
+                    timeSteps.astype(np.int64), active.astype(np.bool_),
+                    seeding.astype(np.bool_), state["seedCity"],
+                    state["seedDate"], float(params["TAU"]),
+                    float(params["INCUBATION"]), float(params["TO_RECOVER"]),
+                    bool(params["VACCINATE"]),
+                    float(params["VACCINATE_PERC"]),
+                    int(params.get("SIMULATION_LENGTH", 365)),
+                    params.get("RECOVERY", "oldest") == "every")
+
+
+def warmUp():
+    """
+    Compile the kernel, or load it from the Numba cache, on a one airport
+    state so the time it takes is kept out of the time steps
+
+    Args:
+        Nothing
+
+    Returns:
+        Seconds taken, 0 without Numba
+    """
+
+    if not available():
+        return 0
+
+    shape = (1, 1)
+    state = {key: np.zeros(shape, dtype=np.int64)
+             for key in ("I", "Inew", "Iair", "S", "V", "R", "head", "count")}
+    state.update(cohortT=np.zeros(shape + (2,), dtype=np.int64),
+                 cohortN=np.zeros(shape + (2,), dtype=np.int64),
+                 seedCity=np.zeros(1, dtype=np.int64),
+                 seedDate=np.zeros(1, dtype=np.int64))
+    params = {"TAU": 0, "INCUBATION": 1, "TO_RECOVER": 1, "VACCINATE": False,
+              "VACCINATE_PERC": 0, "RECOVERY": "oldest"}
+
+    begin = time.perf_counter()
+    step(np.zeros((1, 12)), state, np.zeros(1, dtype=np.int64),
+         np.zeros(1, dtype=np.int64), np.ones(1, dtype=bool),
+         np.zeros(1, dtype=bool), params)
+
+    return time.perf_counter() - begin
@@ -0,0 +1,253 @@
+"""
+zikaODE.py is the continuous time infection engine for zikaSim.py.  It writes
+the rules of infection() in zikaSim.py as rates per day for every airport and
+integrates them with scipy.integrate.solve_ivp, so the solver picks its own
+step size to a tolerance instead of stepping every INCUBATION days.
+
+It approximates the discrete model, it does not reproduce it: the results
+follow the same outbreaks and die outs but differ by day and by count, so
+keep them apart from the python and numpy results.
+
+The delays of the discrete model become chains of stages (the linear chain
+trick): the newly infected pass through ODE_STAGES stages lasting INCUBATION
+days in all, the only ones infecting others like AirportState.Inew, then
+through ODE_STAGES more lasting TO_RECOVER days before they recover.  The
+newly infected and infected visitors infect at a rate calibrated by growth()
+so the newly infected grow by TAU times the mosquito curve of the month every
+INCUBATION days like the groups of the discrete model, at most the
+susceptible, and vaccination runs at the O'Leary rate spread evenly over the
+INCUBATION days.  Infected visitors are rounded like the discrete model, with
+--imports, so a route carries none until its origin fills a seat a day, and an
+airport with less than ODE_MIN_INFECTIOUS newly infected infects no one, so
+an outbreak can die out.
+
+Select it from the command line with --engine=ode.
+"""
+
+# Title:  zikaODE.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+import sys
+
+import numpy as np
+
+import zikaEngine
+
+
+# GLOBAL (match zikaSim.py)
+DAYS_IN_YEAR = 365
+DAYS_IN_MONTH = 31
+MONTHS_IN_YEAR = 12
+ODE_STAGES = 4  # stages of each delay, more follow the fixed delays closer
+ODE_METHOD = "RK45"
+ODE_RTOL = 1e-4
+ODE_ATOL = 1e-2  # people
+ODE_MIN_INFECTIOUS = 0.5  # newly infected people that still infect others
+
+
+def growth(R):
+    """
+    Infections per newly infected that make the chain of ODE_STAGES stages
+    grow by R every INCUBATION days, like the groups of the discrete model
+    infecting R times themselves after INCUBATION days.  With every stage
+    infecting, a chain growing by exp(r * INCUBATION) = R needs log(R) / (1
+    - (1 + log(R) / ODE_STAGES) ** -ODE_STAGES) infections, 1 when R is 1.
+
+    Args:
+        R: TAU times the mosquito curve of every airport
+
+    Returns:
+        Float array of the infections, 0 where R is too small to sustain any
+    """
+
+    logR = np.log(np.maximum(R, np.exp(-ODE_STAGES)))
+    infections = np.where(logR > -ODE_STAGES, 1.0, 0.0)
+    changes = (logR != 0) & (logR > -ODE_STAGES)
+    infections[changes] = logR[changes] / (
+        1 - (1 + logR[changes] / ODE_STAGES) ** -ODE_STAGES)
+
+    return infections
+
+
+def derivatives(day, y, arrays, params):
+    """
+    Rates of change of every compartment of every airport, the right hand
+    side for solve_ivp()
+
+    Args:
+        day: day of the simulation
+        y: flattened (compartments, airports) state, see setupState()
+        arrays: network arrays from zikaEngine.buildArrays()
+        params: simulation parameters, see zikaEngine.infection()
+
+    Returns:
+        Flattened rates of change per day, shaped like y
+    """
+
+    pop = arrays["pop"]
+    y = y.reshape(-1, len(pop))
+    # Solver error can leave compartments a little below 0, which must not
+    # drive the rates
+    S = np.maximum(y[0], 0)
+    newlyInfected = y[3:3 + ODE_STAGES]
+    infected = y[3 + ODE_STAGES:]
+    infectious = np.maximum(newlyInfected.sum(axis=0), 0)
+    I = np.maximum(newlyInfected.sum(axis=0) + infected.sum(axis=0), 0)
+    incubation = params["INCUBATION"]
+    simulationLength = params.get("SIMULATION_LENGTH", DAYS_IN_YEAR)
+    # Month of the day like the time steps of the discrete model
+    month = int(day % simulationLength) // DAYS_IN_MONTH % MONTHS_IN_YEAR
+
+    # Infected visitors, rounded like zikaEngine.infection(), so a route
+    # only carries infected passengers once the infected fraction of its
+    # origin fills one seat a day
+    if params.get("IMPORTS", "route") == "expected":
+        visitors = np.trunc(zikaEngine.expectedImports(
+            arrays, I[np.newaxis], params["SCREEN_PERC"],
+            np.array([month]))[0])
+    else:
+        dailyPassengers = arrays["flow"].data
+        if arrays.get("monthlyFlow") is not None:
+            dailyPassengers = arrays["monthlyFlow"][month]
+        perRoute = np.ceil(np.trunc(I[arrays["flow"].indices] /
+                                    arrays["originPop"] * dailyPassengers) *
+                           (1-params["SCREEN_PERC"]))
+        visitors = arrays["arrivals"] @ perRoute
+
+    # Less than ODE_MIN_INFECTIOUS newly infected have died out, like a
+    # group of the discrete model that recovered before infecting anyone
+    infectious = np.where(infectious >= ODE_MIN_INFECTIOUS, infectious, 0)
+
+    # Each INCUBATION days the newly infected and visitors infect enough to
+    # grow by TAU times the mosquito curve, at most the susceptible
+    infect = np.minimum(growth(params["TAU"] * arrays["MOS"][:, month]) *
+                        (infectious + visitors), S) / incubation
+
+    vaccinate = np.zeros(len(pop))
+    if params["VACCINATE"]:
+        vaccinate = params["VACCINATE_PERC"] * np.divide(
+            I * S, I + S, out=vaccinate, where=I + S > 0) / incubation
+
+    rates = np.zeros_like(y)
+    flowNew = ODE_STAGES / incubation * newlyInfected
+    flowInfected = ODE_STAGES / params["TO_RECOVER"] * infected
+    rates[0] = -infect - vaccinate
+    rates[1] = vaccinate
+    rates[2] = flowInfected[-1]
+    rates[3:3 + ODE_STAGES] = -flowNew
+    rates[3] += infect
+    rates[4:3 + ODE_STAGES] += flowNew[:-1]
+    rates[3 + ODE_STAGES:] = -flowInfected
+    rates[3 + ODE_STAGES] += flowNew[-1]
+    rates[4 + ODE_STAGES:] += flowInfected[:-1]
+
+    return rates.ravel()
+
+
+def setupState(arrays):
+    """
+    Create a fresh, uninfected state
+
+    Args:
+        arrays: network arrays from zikaEngine.buildArrays()
+
+    Returns:
+        (compartments, airports) float array: S, V, R, the ODE_STAGES stages
+        of the newly infected, then the ODE_STAGES stages of the infected
+        waiting to recover
+    """
+
+    y = np.zeros((3 + 2 * ODE_STAGES, len(arrays["pop"])))
+    y[0] = arrays["pop"]
+
+    return y
+
+
+def compartments(y):
+    """
+    I, S, V and R of every airport from a state
+
+    Args:
+        y: (compartments, airports) state from setupState()
+
+    Returns:
+        (airports, compartments) array of I, S, V and R like the history
+    """
+
+    return np.stack((y[3:].sum(axis=0), y[0], y[1], y[2]), axis=1)
+
+
+def solve(arrays, params, cityToInfect, dateToInfect, days, history=None,
+          end=None, method=ODE_METHOD, rtol=ODE_RTOL, atol=ODE_ATOL):
+    """
+    Integrate one simulation, infecting the city with 1 on its day
+
+    Args:
+        arrays: network arrays from zikaEngine.buildArrays()
+        params: simulation parameters, see zikaEngine.infection()
+        cityToInfect: The IATA code for hub to start infection at
+        dateToInfect: Start day of infection
+        days: days to record in order, the first is the start
+        history: optional zikaHistory.History to record the I, S, V, R of
+            every airport on the days, rounded for integer histories
+        end: optional day to integrate to, the last of the days if None
+        method: solve_ivp() method
+        rtol: relative tolerance of the solver
+        atol: absolute tolerance of the solver in people
+
+    Returns:
+        (final (airports, compartments) I, S, V, R, number of evaluations of
+        the derivatives)
+    """
+
+    from scipy import integrate
+
+    days = np.asarray(days, dtype=np.float64)
+    end = days[-1] if end is None else end
+    y = setupState(arrays)
+    city = arrays["index"].get(cityToInfect, -1)
+
+    def record(recordDays, values):
+        if history is None:
+            return
+        for day, value in zip(recordDays, np.moveaxis(values, -1, 0)):
+            value = compartments(value)
+            if np.issubdtype(history.data.dtype, np.integer):
+                value = np.rint(value)
+            history.record(day, value)
+
+    # Nothing changes before the infection, then integrate after it,
+    # recording the day of the infection before infecting like infection()
+    # in zikaSim.py
+    seeding = city >= 0 and days[0] <= dateToInfect <= end
+    begin = dateToInfect if seeding else end
+    before = days[days <= begin]
+    record(before, np.broadcast_to(y[..., np.newaxis], y.shape +
+                                   (len(before),)))
+    if not seeding:
+        return compartments(y), 0
+
+    print("-- Infecting " + cityToInfect + " in " +
+          zikaEngine.MONTH_MAP[(dateToInfect//DAYS_IN_MONTH) %
+                               MONTHS_IN_YEAR] + " --\n")
+    sys.stdout.flush()
+    y[0, city] -= 1
+    y[3, city] += 1
+    if end <= begin:
+        return compartments(y), 0
+
+    # The end state comes from the same solve, as one more output time
+    after = days[(days > begin) & (days < end)]
+    solution = integrate.solve_ivp(derivatives, (begin, end), y.ravel(),
+                                   method=method,
+                                   t_eval=np.append(after, end), rtol=rtol,
+                                   atol=atol, args=(arrays, params))
+    if not solution.success:
+        raise RuntimeError(solution.message)
+    values = solution.y.reshape(y.shape + (-1,))
+    # The output times are the days after the infection, then the end, which
+    # is only recorded when it is one of the days
+    recorded = days[(days > begin) & (days <= end)]
+    record(recorded, values[..., :len(recorded)])
+
+    return compartments(values[..., -1]), solution.nfev
@@ -0,0 +1,191 @@
+"""
+zikaProfile.py times the phases of the infection time steps of zikaSim.py and
+zikaEngine.py and counts their work, for the --profile option.  A Profiler is
+handed to a Simulation, and the engines call it between the phases of every
+time step only when there is one, so a run without --profile pays one check
+per phase.
+
+Time is charged by laps: mark() starts the clock and every lap() charges the
+time since the last mark or lap to a phase, so only leaf phases are timed and
+nothing is counted twice.  The summary is written as JSON and as folded
+stacks, one "zikaSim;<phase> <microseconds>" line per phase, which
+flamegraph.pl and speedscope read.
+"""
+
+# Title:  zikaProfile.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+import collections
+import json
+import sys
+import time
+
+
+# GLOBAL
+PROFILE_ROOT = "zikaSim"  # root frame of the folded stacks
+
+
+class Profiler(object):
+    """
+    Time spent in every phase and counters of the work done
+
+    Attributes:
+        seconds: {phase: seconds spent}
+        calls: {phase: number of laps}
+        counters: {counter: total}, e.g. routesScanned or cohortsRecovered
+        began: clock when the profiler was created
+        ended: clock when stop() was called, None before
+        last: clock of the last mark() or lap()
+    """
+
+    def __init__(self):
+        self.seconds = collections.defaultdict(float)
+        self.calls = collections.defaultdict(int)
+        self.counters = collections.Counter()
+        self.began = time.perf_counter()
+        self.ended = None
+        self.last = self.began
+
+    def mark(self):
+        """
+        Start timing the next phase
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+
+        self.last = time.perf_counter()
+
+    def lap(self, phase, **counters):
+        """
+        Charge the time since the last mark() or lap() to a phase
+
+        Args:
+            phase: name of the phase that just ended
+            counters: amounts to add to the counters
+
+        Returns:
+            Nothing
+        """
+
+        now = time.perf_counter()
+        self.seconds[phase] += now - self.last
+        self.calls[phase] += 1
+        self.last = now
+        if counters:
+            self.counters.update(counters)
+
+    def count(self, **counters):
+        """
+        Add to the counters without timing anything
+
+        Args:
+            counters: amounts to add to the counters
+
+        Returns:
+            Nothing
+        """
+
+        self.counters.update(counters)
+
+    def stop(self):
+        """
+        Stop the wall clock of the run or sweep
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+
+        self.ended = time.perf_counter()
+
+    @property
+    def wall(self):
+        """
+        Seconds from creation to stop(), or to now before it
+        """
+
+        return (self.ended or time.perf_counter()) - self.began
+
+    def summary(self):
+        """
+        Summary of the phases and counters
+
+        Args:
+            Nothing
+
+        Returns:
+            Dictionary with the wall time, {phase: {seconds, calls}} and
+            {counter: total}, the time outside every phase as "other"
+        """
+
+        phases = {phase: {"seconds": seconds, "calls": self.calls[phase]}
+                  for phase, seconds in sorted(self.seconds.items(),
+                                               key=lambda item: -item[1])}
+        phases["other"] = {"seconds": max(self.wall -
+                                          sum(self.seconds.values()), 0),
+                           "calls": 0}
+
+        return {"wall": self.wall, "phases": phases,
+                "counters": dict(sorted(self.counters.items()))}
+
+    def folded(self):
+        """
+        Folded stacks of the phases in microseconds, for flame graphs
+
+        Args:
+            Nothing
+
+        Returns:
+            String of "zikaSim;<phase> <microseconds>" lines
+        """
+
+        return "".join("%s;%s %d\n" % (PROFILE_ROOT, phase,
+                                        round(1e6 * values["seconds"]))
+                       for phase, values in self.summary()["phases"].items())
+
+    def write(self, path):
+        """
+        Write the summary to <path>.json and the folded stacks to
+        <path>.folded
+
+        Args:
+            path: file path without extension
+
+        Returns:
+            Nothing
+        """
+
+        with open(path + ".json", 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        with open(path + ".folded", 'w') as f:
+            f.write(self.folded())
+
+    def report(self, out=sys.stdout):
+        """
+        Print the phases and counters as a table
+
+        Args:
+            out: file to print to
+
+        Returns:
+            Nothing
+        """
+
+        summary = self.summary()
+        print("%-20s %10s %7s %12s" % ("phase", "seconds", "share", "calls"),
+              file=out)
+        for phase, values in summary["phases"].items():
+            print("%-20s %10.3f %6.1f%% %12d" % (
+                phase, values["seconds"],
+                100 * values["seconds"] / max(summary["wall"], 1e-12),
+                values["calls"]), file=out)
+        print("%-20s %10.3f" % ("wall", summary["wall"]), file=out)
+        for counter, total in summary["counters"].items():
+            print("%-20s %10d" % (counter, total), file=out)
+        out.flush()
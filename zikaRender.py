@@ -0,0 +1,560 @@
+"""
+zikaRender.py draws the infection maps of zikaSim.py without a display.  The
+projected airports and routes are computed once into a frame context, and
+every frame only draws the background raster, the routes as one
+LineCollection and the airports as one scatter, colored by their infected
+fraction, on a Figure of the Agg backend.  The 12 months of -z are rendered
+in parallel on a pool of worker processes that each receive the context once.
+matplotlib, Basemap and pyproj are imported only by the functions that draw
+or project, so runs without maps never load them.
+
+An outbreak is animated to .mp4 or .gif by drawing the background and
+routes once into a still image behind one scatter of the airports, then
+streaming the time steps or months of the history to the movie writer, only
+recoloring the airports and changing the title between frames.
+
+The projected bluemarble background, the coastlines and the projection are
+cached on disk as a folder of .npy files keyed by a hash of the projection
+and the map corners, like the network snapshots of zikaCache.py.  Only the
+first map of an extent builds a Basemap and reprojects the image; later maps,
+in this run or the next, memory map the raster and project the airports with
+pyproj.  Every process loads a background once, when it first draws it.
+"""
+
+# Title:  zikaRender.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+import contextlib
+import hashlib
+import json
+import math
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+
+# GLOBAL (match zikaSim.py)
+DAYS_IN_MONTH = 31
+MONTHS_IN_YEAR = 12
+MONTH_MAP = {0: "January", 1: "February", 2: "March", 3: "April", 4: "May",
+             5: "June", 6: "July", 7: "August", 8: "September", 9: "October",
+             10: "November", 11: "December"}
+IMAGE_FOLDER = "./Images/"
+COLOR_LIMITS = [.333, .667]  # infected fraction limits of the colors
+NODE_COLORS = np.array(["c", "y", "r"])
+NODE_SIZE = 49  # points^2, markersize 7 of the old map.plot() markers
+EDGE_COLOR = "gray"
+EDGE_ALPHA = 0.5
+CUT = 1.05  # margin of the plot limits around the airports
+MAP_VERSION = 1  # bump when the cached background layout changes
+MAP_CACHE_DIR = "./Data/Cache/Maps"
+MAP_PROJECTION = {"projection": "merc", "ellps": "WGS84", "resolution": "l"}
+COASTLINES = False  # draw the cached coastlines over the background
+COASTLINE_COLOR = "white"
+STEP_FPS = 10  # frames per second of time step animations
+MONTH_FPS = 1  # frames per second of monthly animations
+workerContext = None
+backgrounds = dict()  # {key: background} loaded by this process
+
+
+def backgroundKey(bounds):
+    """
+    Hash the cache version, the projection and the map corners
+
+    Args:
+        bounds: Basemap corner arguments, see zikaSim.mapBounds()
+
+    Returns:
+        Hex digest naming the background
+    """
+
+    settings = dict(MAP_PROJECTION, version=MAP_VERSION, **bounds)
+
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode()
+                          ).hexdigest()[:24]
+
+
+def saveBackground(directory, bounds):
+    """
+    Project the bluemarble image and the coastlines with Basemap and write
+    them with the projection as a folder of .npy files
+
+    Args:
+        directory: background folder to create
+        bounds: Basemap corner arguments, see zikaSim.mapBounds()
+
+    Returns:
+        Nothing
+    """
+
+    from matplotlib.figure import Figure
+    from mpl_toolkits.basemap import Basemap
+
+    print("-- Projecting the map background --\n")
+    sys.stdout.flush()
+
+    map = Basemap(**MAP_PROJECTION, **bounds)
+    image = map.bluemarble(ax=Figure().add_subplot(111))
+    coastlines = [np.array(segment, dtype=np.float64).reshape(-1, 2)
+                  for segment in map.coastsegs]
+
+    # Basemap measures Mercator x from the lower left longitude, at the
+    # radius of curvature of the latitude of true scale
+    projection = map.projtran
+    latitude = math.radians(projection.projparams["lat_ts"])
+    xScale = projection.rmajor * math.cos(latitude) / math.sqrt(
+        1 - projection.esq * math.sin(latitude) ** 2)
+
+    background = {
+        "version": np.array([MAP_VERSION]),
+        "raster": np.rint(255 * np.ma.getdata(image.get_array())
+                          ).astype(np.uint8),
+        "extent": np.array(image.get_extent(), dtype=np.float64),
+        "origin": np.array(image.origin),
+        "projparams": np.array(json.dumps(
+            {key: str(value) if isinstance(value, str) else float(value)
+             for key, value in projection.projparams.items()})),
+        "xProjection": np.array([xScale, projection.llcrnrlon]),
+        "coastPoints": np.concatenate(coastlines + [np.empty((0, 2))]),
+        "coastStarts": np.cumsum([0] + [len(segment)
+                                        for segment in coastlines[:-1]],
+                                 dtype=np.int64)}
+
+    # Write next to the final folder and rename, so a reader never sees a
+    # half written background
+    parent = os.path.dirname(os.path.abspath(directory))
+    os.makedirs(parent, exist_ok=True)
+    temporary = tempfile.mkdtemp(dir=parent)
+    for key, value in background.items():
+        np.save(os.path.join(temporary, key + ".npy"), value)
+    try:
+        os.rename(temporary, directory)
+    except OSError:
+        # Another process projected the same background first
+        shutil.rmtree(temporary)
+
+
+def loadBackground(bounds, cacheDir=MAP_CACHE_DIR):
+    """
+    Load the projected background of an extent, projecting and caching it
+    first if it is new.  Backgrounds are kept for the life of the process.
+
+    Args:
+        bounds: Basemap corner arguments, see zikaSim.mapBounds()
+        cacheDir: folder holding the cached backgrounds
+
+    Returns:
+        Dictionary with the uint8 RGBA raster (memory mapped), its extent
+        and origin, the projection and the list of coastline segments
+    """
+
+    key = backgroundKey(bounds)
+    if key in backgrounds:
+        return backgrounds[key]
+
+    directory = os.path.join(cacheDir, "background-" + key)
+    if not os.path.isdir(directory):
+        saveBackground(directory, bounds)
+
+    def load(name):
+        return np.load(os.path.join(directory, name + ".npy"),
+                       mmap_mode='r')
+
+    points = load("coastPoints")
+    backgrounds[key] = {
+        "raster": load("raster"),
+        "extent": tuple(load("extent")),
+        "origin": str(load("origin")),
+        "projparams": json.loads(str(load("projparams"))),
+        "xProjection": tuple(load("xProjection")),
+        "coastlines": np.split(np.asarray(points),
+                               np.asarray(load("coastStarts"))[1:])}
+
+    return backgrounds[key]
+
+
+def project(background, lon, lat):
+    """
+    Project longitudes and latitudes to the map coordinates of a background,
+    the same as calling its Basemap
+
+    Args:
+        background: background from loadBackground()
+        lon: array of longitudes
+        lat: array of latitudes
+
+    Returns:
+        x, y arrays of map coordinates
+    """
+
+    import pyproj
+
+    xScale, lowerLeftLon = background["xProjection"]
+    x = xScale * np.radians(lon - lowerLeftLon)
+    y = pyproj.Proj(background["projparams"])(np.full_like(lat, lowerLeftLon),
+                                               lat)[1]
+
+    return x, np.asarray(y)
+
+
+def buildContext(network, bounds):
+    """
+    Project the airports and routes of the network once, for every frame
+
+    Args:
+        network: networkX graph network
+        bounds: Basemap corner arguments, see zikaSim.mapBounds()
+
+    Returns:
+        Picklable dictionary with the map corners of the background, its
+        extent and origin, the IATA codes and projected x, y of the airports,
+        the route segments and the plot limits
+    """
+
+    nodes = network.nodes()
+    lon = np.array([float(network.node[node]['lon']) for node in nodes])
+    lat = np.array([float(network.node[node]['lat']) for node in nodes])
+
+    background = loadBackground(bounds)
+    x, y = project(background, lon, lat)
+
+    index = {node: i for i, node in enumerate(nodes)}
+    edges = np.array([(index[u], index[v]) for u, v in network.edges()],
+                     dtype=np.int64).reshape(-1, 2)
+    segments = np.stack((np.stack((x[edges[:, 0]], y[edges[:, 0]]), axis=1),
+                         np.stack((x[edges[:, 1]], y[edges[:, 1]]), axis=1)),
+                        axis=1)
+
+    # Adjust the plot limits like the original maps
+    xmin = x.min() - CUT * x.min()
+    ymin = CUT * y.min()
+    ymin = ymin - CUT * ymin
+
+    return {"bounds": dict(bounds),
+            "IATA": [network.node[node]['IATA'] for node in nodes],
+            "x": x, "y": y,
+            "segments": segments,
+            "xlim": (xmin, CUT * x.max()),
+            "ylim": (ymin, CUT * y.max())}
+
+
+def drawBackground(ax, context, coastlines=COASTLINES):
+    """
+    Draw the cached background of a frame context, and the coastlines
+
+    Args:
+        ax: matplotlib axes to draw on
+        context: frame context from buildContext()
+        coastlines: True to draw the coastlines over the image
+
+    Returns:
+        Nothing
+    """
+
+    from matplotlib.collections import LineCollection
+
+    background = loadBackground(context["bounds"])
+    ax.imshow(background["raster"], extent=background["extent"],
+              origin=background["origin"])
+    if coastlines:
+        ax.add_collection(LineCollection(background["coastlines"],
+                                         linewidths=0.5,
+                                         colors=COASTLINE_COLOR))
+
+
+def nodeColors(values):
+    """
+    Correlate infected fractions to colors
+
+    Args:
+        values: infected fraction of every airport
+
+    Returns:
+        Array of the color of every airport
+    """
+
+    return NODE_COLORS[np.searchsorted(COLOR_LIMITS, values)]
+
+
+def framePath(month, vaccinate=False):
+    """
+    File a month of -z is saved to
+
+    Args:
+        month: month of the frame
+        vaccinate: True if the simulation vaccinated
+
+    Returns:
+        Path of the .png file
+    """
+
+    name = "infectionWithVaccination-" if vaccinate else "infection-"
+
+    return IMAGE_FOLDER + name + MONTH_MAP[month] + ".png"
+
+
+def renderFrame(context, values, title, path):
+    """
+    Draw one map and save it
+
+    Args:
+        context: frame context from buildContext()
+        values: infected fraction of every airport in context order
+        title: title of the figure
+        path: file to save to
+
+    Returns:
+        Nothing
+    """
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+
+    drawBackground(ax, context)
+    ax.add_collection(LineCollection(context["segments"], linewidths=1,
+                                     colors=EDGE_COLOR, alpha=EDGE_ALPHA))
+    ax.scatter(context["x"], context["y"], s=NODE_SIZE,
+               c=nodeColors(values), linewidths=1, zorder=3)
+
+    ax.set_xlim(*context["xlim"])
+    ax.set_ylim(*context["ylim"])
+    ax.set_title(title)
+    ax.axis('off')
+    figure.savefig(path)
+
+
+def setupWorker(context):
+    """
+    Pool initializer, keep the frame context in this worker
+
+    Args:
+        context: frame context from buildContext()
+
+    Returns:
+        Nothing
+    """
+    global workerContext
+
+    workerContext = context
+
+
+def renderTask(task):
+    """
+    Render one frame in a worker
+
+    Args:
+        task: (values, title, path) of the frame
+
+    Returns:
+        Path of the saved frame
+    """
+
+    values, title, path = task
+    renderFrame(workerContext, values, title, path)
+
+    return path
+
+
+def monthFrames(context, IDic, start, vaccinate=False):
+    """
+    Frames of the months of the infection dictionary
+
+    Args:
+        context: frame context from buildContext()
+        IDic: Infection dictionary from Simulation.updateIDic()
+        start: start day of the simulation
+        vaccinate: True if the simulation vaccinated, for the file names
+
+    Returns:
+        List of (values, title, path) of every month, for renderFrames()
+    """
+
+    values = np.array([IDic[airport] for airport in context["IATA"]])
+    frames = list()
+    for position in range(values.shape[1]):
+        month = (position + start//DAYS_IN_MONTH) % MONTHS_IN_YEAR
+        frames.append((values[:, position],
+                       "Zika Infection for the Month of " + MONTH_MAP[month],
+                       framePath(month, vaccinate)))
+
+    return frames
+
+
+def renderFrames(context, frames, workers=None):
+    """
+    Render frames on a pool of worker processes
+
+    Args:
+        context: frame context from buildContext()
+        frames: list of (values, title, path)
+        workers: number of worker processes, number of CPUs if None; 1
+            renders in this process
+
+    Returns:
+        Paths of the saved frames, in the order they completed
+    """
+
+    workers = min(workers or os.cpu_count(), len(frames))
+    paths = list()
+    with contextlib.ExitStack() as stack:
+        if workers > 1:
+            pool = stack.enter_context(multiprocessing.Pool(
+                workers, setupWorker, (context,)))
+            done = pool.imap_unordered(renderTask, frames)
+        else:
+            setupWorker(context)
+            done = map(renderTask, frames)
+        for path in done:
+            print("-- Saved", path, "--\n")
+            sys.stdout.flush()
+            paths.append(path)
+
+    return paths
+
+
+def stepFrames(context, history, pop):
+    """
+    Frames of the recorded time steps of a history, read one at a time
+
+    Args:
+        context: frame context from buildContext()
+        history: zikaHistory.History of the simulation
+        pop: population of every airport in history order, see
+            Simulation.population() in zikaSim.py
+
+    Returns:
+        Generator of (values, title) of every time step, for animate()
+    """
+
+    column = {airport: i for i, airport in enumerate(history.IATA)}
+    order = np.array([column[airport] for airport in context["IATA"]],
+                     dtype=np.int64)
+    pop = np.asarray(pop, dtype=np.float64)[order]
+    I = history.compartment("I")
+    days = history.days
+
+    for step in range(history.length):
+        yield I[step, order] / pop, "Zika Infection on Day %d" % days[step]
+
+
+def staticFigure(context):
+    """
+    Figure whose background and routes are drawn once into a still image,
+    so redrawing it only draws the airports and the title
+
+    Args:
+        context: frame context from buildContext()
+
+    Returns:
+        (figure, scatter of the airports, title)
+    """
+
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+
+    figure = Figure()
+    FigureCanvasAgg(figure)
+    ax = figure.add_subplot(111)
+    ax.set_xlim(*context["xlim"])
+    ax.set_ylim(*context["ylim"])
+    ax.axis('off')
+
+    # Render the still layers at the pixel size of the figure and keep
+    # them behind the axes, where they are copied without resampling
+    drawBackground(ax, context)
+    ax.add_collection(LineCollection(context["segments"], linewidths=1,
+                                     colors=EDGE_COLOR, alpha=EDGE_ALPHA))
+    figure.canvas.draw()
+    still = np.array(figure.canvas.buffer_rgba())
+    for artist in list(ax.images) + list(ax.collections):
+        artist.remove()
+    figure.figimage(still, zorder=-1)
+
+    nodes = ax.scatter(context["x"], context["y"], s=NODE_SIZE,
+                       c=NODE_COLORS[0], linewidths=1, zorder=3)
+
+    return figure, nodes, ax.set_title("")
+
+
+def canAnimate(path):
+    """
+    Check a movie can be written before running the simulation: a .gif with
+    ffmpeg or Pillow, an .mp4 only with ffmpeg
+
+    Args:
+        path: movie file to write
+
+    Returns:
+        True if animate() can write the file
+    """
+
+    from matplotlib import animation
+
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".mp4":
+        return animation.FFMpegWriter.isAvailable()
+
+    return extension == ".gif"
+
+
+def animationWriter(path, fps):
+    """
+    Movie writer for a file, streaming to ffmpeg.  Without ffmpeg a .gif is
+    written with Pillow, which keeps every frame until the end.
+
+    Args:
+        path: .mp4 or .gif file to write
+        fps: frames per second
+
+    Returns:
+        matplotlib.animation.MovieWriter
+    """
+
+    from matplotlib import animation
+
+    if animation.FFMpegWriter.isAvailable():
+        return animation.FFMpegWriter(fps=fps)
+    if path.lower().endswith(".gif"):
+        return animation.PillowWriter(fps=fps)
+
+    raise RuntimeError("ffmpeg is needed to write " + path)
+
+
+def animate(context, frames, path, fps=STEP_FPS):
+    """
+    Animate an outbreak, one frame at a time
+
+    Args:
+        context: frame context from buildContext()
+        frames: iterable of (values, title, ...) like stepFrames() or
+            monthFrames()
+        path: .mp4 or .gif file to write
+        fps: frames per second
+
+    Returns:
+        Number of frames written
+    """
+
+    figure, nodes, title = staticFigure(context)
+    writer = animationWriter(path, fps)
+
+    count = 0
+    with writer.saving(figure, path, figure.dpi):
+        for frame in frames:
+            values, text = frame[:2]
+            nodes.set_facecolor(nodeColors(values))
+            title.set_text(text)
+            writer.grab_frame()
+            count += 1
+
+    return count
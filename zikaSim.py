@@ -10,7 +10,12 @@ Usage:
     simulator.py -msavz [c=<IATA>] [d=<start infection data]
         [start=<start simulation>] [days=<end simulation>]
         [tau=<tau of disease>] [inc=<incubation days>] [vac=<vaccinate rate>]
-        [screen=<screen passenger rate>]
+        [screen=<screen passenger rate>] [engine=<python|numpy|ode>]
+        [workers=<processes>] [monthly=<monthly flows .npz>]
+        [imports=<route|expected>] [recovery=<oldest|every>] [nocache]
+        [trajectories=<folder>] [rerun] [clearresults] [replicates=<number>]
+        [seed=<seed>] [jit] [profile] [animate=<movie .mp4|.gif>]
+        [frames=<step|month>]
         <airport database> <route database> <mosquito curves database>
 
 Flags:
@@ -18,7 +23,8 @@ Flags:
     -s          Show stats at infected city
     -a          Run simulation on all combinations of cities and months
     -v          Vaccinate using O'Leary vaccination formula (1-(1/tau)) default
-    -z          Produce nework visualization for all months of interest
+    -z          Produce nework visualization for all months of interest,
+                saved to ./Images by zikaRender.py on --workers processes
 
 Option:
     --c         The IATA code for hub to start infection at (ATL is default)
@@ -30,6 +36,46 @@ Option:
                 passed again
     --vac       Set vac rate to something different than (1-(1/tau))
     --screen    Set screen rate at airports to prevent sick humans from moving
+    --engine    Infection engine to run, "python" node dictionaries (default),
+                "numpy" arrays from zikaEngine.py or "ode" continuous time
+                rates integrated with an adaptive step by zikaODE.py, an
+                approximation whose results differ from the other two
+    --workers   Run the -a simulations on this many worker processes with
+                zikaSweep.py (not with --engine=ode)
+    --monthly   Monthly passenger flows from convertAirlinePassenger.py, so
+                air travel follows the month of the time step instead of a
+                flat daily rate from the annual total
+    --imports   How infected passengers are counted with the numpy and ode
+                engines, "route" rounds every route like the python engine
+                (default), "expected" imports the expected number with one
+                sparse product over the infected fraction of every airport
+    --recovery  Which infection groups recover each time step, "oldest"
+                pops the oldest due group like the original simulator
+                (default), "every" pops every due group with the days
+                counted around the end of the simulation, so the -a sweep
+                keeps recovering after the year wraps
+    --nocache   Parse the .csv files instead of loading the compiled network
+                snapshot from zikaCache.py
+    --trajectories  Write the I, S, V, R history of every -a simulation to a
+                memory mapped zikaHistory.py store in this folder
+    --rerun     Run the simulation even if its result is in the result cache
+    --clearresults  Remove every cached simulation result before running
+    --replicates    Also run this many stochastic replicates of the
+                simulation and report the chance every airport is infected,
+                with -s the mean and 5-95% band of infected at the infected
+                city
+    --seed      Seed of the stochastic replicates (random is default)
+    --jit       Step the numpy engine and worker processes with the Numba
+                compiled loop of zikaKernel.py, the numpy engine if Numba is
+                not installed
+    --profile   Time the phases of every time step and count the routes
+                scanned, cohorts recovered and airports active, printed at
+                the end and written to zikaProfile.json and, for flame
+                graphs, zikaProfile.folded (not in worker processes)
+    --animate   Animate the infected fraction of every airport to this .mp4
+                (needs ffmpeg) or .gif file with zikaRender.py (not with -a)
+    --frames    Frames of --animate, every recorded "step" (default) or the
+                highest infected fraction of every "month"
 """
 
 # Title:  zikaSim.py
@@ -42,34 +88,32 @@ Option:
 # python zikaSim.py -s --d 125 --r1 120 --r2 365 --t 4 ./Data/airportsMin.csv
 # ./Data/airlineRoutesPassengerData.csv ./Data/mosCurves.csv
 
+import collections
+import contextlib
 import copy
 import getopt
+import io
 import math
-import networkx as nx
-import matplotlib.pyplot as plt
 import operator
 import os
 import random
 import sys
-from scipy import stats
 import time
-from mpl_toolkits.basemap import Basemap
 import queue
-import matplotlib.animation as animation
 import numpy as np
-
-
-# GLOBAL
-MAP = False
+import zikaCache
+import zikaEngine
+import zikaHistory
+import zikaKernel
+import zikaODE
+import zikaProfile
+import zikaRender
+import zikaStats
+import zikaSweep
+
+
+# GLOBAL (defaults for a Simulation)
 TAU = 4      # Zika virus "Ro", DEFAULT
-routeInfo = dict()
-approvedAirports = dict()
-airportsToInfect = dict()
-I = dict()
-S = dict()
-V = dict()
-R = dict()
-timeStepsTracker = list()
 CITY_TO_INFECT = "ATL"
 DATE_TO_INFECT = 1
 START = 1
@@ -77,14 +121,21 @@ DAYS_IN_YEAR = 365
 DAYS_IN_MONTH = 31
 MONTHS_IN_YEAR = 12
 SIMULATION_LENGTH = DAYS_IN_YEAR
-STAT = False
 INCUBATION = 3  # 3-12 days , DEFAULT 3
 TO_RECOVER = 7  # DEFAULT 7
-RUN_ALL = False
-VACCINATE_PERC = 1 - (1/TAU) # DEFAULT
 VACCINATE = False
 SCREEN_PERC = 0
-MAP_ALL = False
+ENGINE = "python"
+SCHEDULER = "active"
+IMPORTS = "route"
+RECOVERY = "oldest"
+BATCH_CELLS = 1 << 18  # scenarios x airports stepped together in a batch
+PROFILE_OUTPUT = "zikaProfile"  # .json and .folded files of --profile
+US_BOUNDS = {"llcrnrlon": -160, "urcrnrlon": -60, "llcrnrlat": 10,
+             "urcrnrlat": 80}
+WORLD_BOUNDS = {"llcrnrlon": -180, "urcrnrlon": 180, "llcrnrlat": -60,
+                "urcrnrlat": 80}
+QUANTILES = (0.05, 0.95)  # infected band of the stochastic replicates
 MONTH_MAP = {0: "January", 1: "February", 2: "March", 3: "April", 4: "May",
              5:"June", 6: "July", 7: "August", 8: "September", 9: "October",
              10: "November", 11: "December"}
@@ -101,15 +152,35 @@ def main():
         Void
 
     """
-    global MAP, CITY_TO_INFECT, START, SIMULATION_LENGTH, DATE_TO_INFECT, STAT,\
-        timeStepsTracker, INCUBATION, RUN_ALL, VACCINATE_PERC, VACCINATE, TAU, \
-        SCREEN_PERC, MAP_ALL, TO_RECOVER
+    MAP = False
+    STAT = False
+    RUN_ALL = False
+    MAP_ALL = False
+    CACHE = True
+    RERUN = False
+    PROFILE = False
+    ANIMATION = None
+    FRAMES = "step"
+    REPLICATES = 0
+    SEED = None
+    MONTHLY_FLOWS = None
+    settings = dict()
 
     # Determine the parameters of the current simulation.
     opts, args = getopt.getopt(sys.argv[1:], "msavz", ["c=", "d=", "start=",
                                                        "days=","tau=", "inc=",
                                                        "vac=", "screen=",
-                                                       "rec="])
+                                                       "rec=", "engine=",
+                                                       "workers=", "monthly=",
+                                                       "imports=", "recovery=",
+                                                       "nocache",
+                                                       "trajectories=",
+                                                       "rerun",
+                                                       "clearresults",
+                                                       "replicates=", "seed=",
+                                                       "jit", "profile",
+                                                       "animate=",
+                                                       "frames="])
 
     # Check if the data arguments are available
     if len(args) < 3:
@@ -136,92 +207,190 @@ def main():
             RUN_ALL = True
         # vaccinate using default percent based on TAU
         elif opt == "-v":
-            VACCINATE = True
+            settings["vaccinate"] = True
         elif opt == "-z":
             MAP_ALL = True
         # infect a particular city
         elif opt == "--c":
-            CITY_TO_INFECT = par
+            settings["cityToInfect"] = par
         # date to infect
         elif opt == "--d":
-            DATE_TO_INFECT = int(par)
+            settings["dateToInfect"] = int(par)
         # Beginning part of simulation
         elif opt == "--start":
-            START = int(par)
-            if DATE_TO_INFECT < START:
-                DATE_TO_INFECT = START
+            settings["start"] = int(par)
+            if settings.get("dateToInfect", DATE_TO_INFECT) < settings["start"]:
+                settings["dateToInfect"] = settings["start"]
         # Number of days to run simulation, if not entered, default is 365
         elif opt == "--days":
-            SIMULATION_LENGTH = int(par)
+            settings["simulationLength"] = int(par)
         # A different tau for mosquito dynamics and preset vaccination rate
         # based on TAU, if user wants to change it, they must use the --v option
         elif opt == "--tau":
-            TAU = float(par)
-            VACCINATE_PERC = 1 - (1/TAU)
+            settings["tau"] = float(par)
+            settings["vaccinatePerc"] = 1 - (1/settings["tau"])
         # Set the incubation period before symptoms show and the infected
         # person can propagate the disease
         elif opt == "--inc":
-            INCUBATION = float(par)
+            settings["incubation"] = float(par)
         # Change vaccination percentage and set model to vaccinate
         elif opt == "--vac":
-            VACCINATE_PERC = float(par)
-            VACCINATE = True
+            settings["vaccinatePerc"] = float(par)
+            settings["vaccinate"] = True
         # Percent of passengers to screen from normal population proportion
         # dynamics
         elif opt == "--screen":
-            SCREEN_PERC = float(par)
+            settings["screenPerc"] = float(par)
         # Change the recover rate for humans (time that they can infect others)
         elif opt == "--rec":
-            TO_RECOVER = float(par)
-
+            settings["toRecover"] = float(par)
+        # Infection engine, node dictionaries, NumPy arrays or the ODE solver
+        elif opt == "--engine":
+            if par not in ("python", "numpy", "ode"):
+                print(__doc__)
+                exit()
+            settings["engine"] = par
+        # Worker processes for the -a simulations
+        elif opt == "--workers":
+            settings["workers"] = int(par)
+        # Rounding of the infected passengers
+        elif opt == "--imports":
+            if par not in ("route", "expected"):
+                print(__doc__)
+                exit()
+            settings["imports"] = par
+        # Infection groups recovering each time step
+        elif opt == "--recovery":
+            if par not in ("oldest", "every"):
+                print(__doc__)
+                exit()
+            settings["recovery"] = par
+        # Seasonal air travel
+        elif opt == "--monthly":
+            MONTHLY_FLOWS = par
+        # Always parse the data files
+        elif opt == "--nocache":
+            CACHE = False
+        # Keep the history of every -a simulation on disk
+        elif opt == "--trajectories":
+            settings["trajectories"] = par
+        # Skip the result cache
+        elif opt == "--rerun":
+            RERUN = True
+        # Empty the result cache
+        elif opt == "--clearresults":
+            zikaCache.clearResults()
+        # Stochastic replicates of the simulation
+        elif opt == "--replicates":
+            REPLICATES = int(par)
+        elif opt == "--seed":
+            SEED = int(par)
+        # Compiled inner loop of the numpy engine
+        elif opt == "--jit":
+            settings["jit"] = True
+            if not zikaKernel.available():
+                print("-- Numba is not installed, running without --jit --\n")
+        # Movie of the simulation, of every time step or every month
+        elif opt == "--animate":
+            if not zikaRender.canAnimate(par):
+                print(__doc__)
+                exit()
+            ANIMATION = par
+        elif opt == "--frames":
+            if par not in ("step", "month"):
+                print(__doc__)
+                exit()
+            FRAMES = par
+        # Time the phases of the time steps, always running the simulation
+        elif opt == "--profile":
+            PROFILE = True
+            RERUN = True
+
+
+    # The worker processes of -a only run the python and numpy engines
+    if RUN_ALL and settings.get("engine", ENGINE) == "ode" and \
+            settings.get("workers"):
+        print(__doc__)
+        exit()
 
-    # Create the network using the command arguments
-    network = create_network(AIRPORT_DATA, ROUTE_DATA, MOSQUITO_CURVES)
+    # Create the network using the command arguments, from the compiled
+    # snapshot when the data files have not changed
+    if CACHE:
+        routes = settings.get("engine", ENGINE) == "python" and \
+            not settings.get("workers") or MAP or MAP_ALL
+        network = zikaCache.cachedNetwork(AIRPORT_DATA, ROUTE_DATA,
+                                          MOSQUITO_CURVES, create_network,
+                                          routes=routes, monthly=MONTHLY_FLOWS)
+    else:
+        network = create_network(AIRPORT_DATA, ROUTE_DATA, MOSQUITO_CURVES,
+                                 MONTHLY_FLOWS)
 
-    # Setup Global SIVR stat tracker
-    setupGlobalSIVR()
+    # Expected imports are only in the numpy and ode engines
+    if settings.get("imports") == "expected" and \
+            settings.get("engine", ENGINE) == "python" and \
+            not settings.get("workers"):
+        print(__doc__)
+        exit()
 
-    infectionAllStats = dict()
+    if PROFILE:
+        settings["profiler"] = zikaProfile.Profiler()
+    simulation = Simulation(network, **settings)
 
     # Entire network run
     if RUN_ALL:
         print ("-- Starting all simulations --\n")
         sys.stdout.flush()
 
-        for airport in approvedAirports:
-            CITY_TO_INFECT = airport
-            # print (airport)
-            infectionAllStats[airport] = list()
-            for i in range(1,DAYS_IN_YEAR,DAYS_IN_MONTH): # START + SIMULATION_LENGTH+1
-                networkCopy = network.copy()
-                setupGlobalSIVR()
-                DATE_TO_INFECT = i
-                infectionAllStats[airport].append(0)
-                # Run infection simulation
-                for j in range(i,DAYS_IN_YEAR+i): # START + SIMULATION_LENGTH+1+i
-                    j %= SIMULATION_LENGTH
-                    if j % INCUBATION == 0 or j == DATE_TO_INFECT:
-                        infection(networkCopy, j)
-
-                for node in networkCopy.nodes_iter(networkCopy):
-                    infectionAllStats[airport][-1] += node[1]["R"]
+        # Spread of the months of every hub, fed as the scenarios finish
+        summary = zikaStats.SweepStats(simulation.approvedAirports)
+        infectionAllStats = simulation.runAll(summary)
 
         for airport in infectionAllStats:
-            print(airport, infectionAllStats[airport])
+            i = summary.index[airport]
+            print(airport, infectionAllStats[airport],
+                  "mean %.0f sd %.0f worst %s" % (
+                      summary.recovered.mean[i], summary.recovered.std[i],
+                      MONTH_MAP[summary.worstMonth[i]]))
+    elif RERUN:
+        simulation.run()
     else:
+        # Load the history if the same files and parameters ran before
+        sources = [AIRPORT_DATA, ROUTE_DATA, MOSQUITO_CURVES] + \
+            ([MONTHLY_FLOWS] if MONTHLY_FLOWS else [])
+        zikaCache.cachedRun(simulation, sources)
+
+    # Chance of infection at every airport over the stochastic replicates
+    ensemble = None
+    if REPLICATES and not RUN_ALL:
+        print("-- Running", REPLICATES, "stochastic replicates --\n")
+        sys.stdout.flush()
 
-        for i in range(START,START+SIMULATION_LENGTH):
-            if i % INCUBATION == 0 or i == DATE_TO_INFECT:
-                timeStepsTracker.append(i)
-                infection(network, i)
+        ensemble = simulation.runReplicates(REPLICATES, SEED)
+        for airport, chance in sorted(ensemble.chance.items(),
+                                      key=operator.itemgetter(1),
+                                      reverse=True):
+            if chance > 0:
+                i = ensemble.index[airport]
+                print(airport, "infected %.3f attack rate %.4f peak day %.0f"
+                      % (chance, ensemble.attackRate.mean[i],
+                         ensemble.peakDay.mean[i]))
+
+    # Where the time went
+    if simulation.profiler is not None:
+        simulation.profiler.stop()
+        print("-- Profile --\n")
+        simulation.profiler.report()
+        simulation.profiler.write(PROFILE_OUTPUT)
+        print("\n-- Profile written to", PROFILE_OUTPUT + ".json and",
+              PROFILE_OUTPUT + ".folded --\n")
 
     # Print # of infected timeline
-    # for airport in approvedAirports:
-    #     print (airport, I[airport])
+    # for airport in simulation.approvedAirports:
+    #     print (airport, simulation.I[airport])
 
     # Print # of recovered per airport
-    # for airport in approvedAirports:
-    #     print(airport, R[airport][-1])
+    # for airport in simulation.approvedAirports:
+    #     print(airport, simulation.R[airport][-1])
 
 
     # Visualize network only
@@ -230,38 +399,72 @@ def main():
 
     # Visualize network for entire simulation of interest
     if MAP_ALL:
-        theIDic = updateIDic(network)
-        #print("Infected Dict Ratios: ", theIDic)
-        #print("ATL Ratio List : ", theIDic['ATL'])
-        #print("Length of ATL List", len(theIDic['ATL']))
-        for i in range(len(theIDic[CITY_TO_INFECT])):
-            month = i + START//DAYS_IN_MONTH % MONTHS_IN_YEAR
-            #print("MON", month)
-            updatedVisualize(network, theIDic, i, month)
+        print("-- Starting to Visualize every month --\n")
+        sys.stdout.flush()
+
+        context = zikaRender.buildContext(network, mapBounds(network))
+        zikaRender.renderFrames(context, zikaRender.monthFrames(
+            context, simulation.updateIDic(), simulation.start,
+            simulation.vaccinate), settings.get("workers"))
+
+    # Animate the simulation from its history
+    if ANIMATION and not RUN_ALL:
+        print("-- Animating the simulation to", ANIMATION, "--\n")
+        sys.stdout.flush()
+
+        context = zikaRender.buildContext(network, mapBounds(network))
+        if FRAMES == "month":
+            count = zikaRender.animate(context, zikaRender.monthFrames(
+                context, simulation.updateIDic(), simulation.start),
+                                       ANIMATION, zikaRender.MONTH_FPS)
+        else:
+            count = zikaRender.animate(context, zikaRender.stepFrames(
+                context, simulation.history, simulation.population()),
+                                       ANIMATION)
+        print("-- Wrote", count, "frames --\n")
 
     # Stats of infection
     if STAT:
         print ("-- Creating Stats Figure --\n")
         sys.stdout.flush()
 
-        for node in I:
-            # only for city to infect; can change to others by commenting out
-            if node == CITY_TO_INFECT:
+        import matplotlib.pyplot as plt
 
-                i, = plt.plot(timeStepsTracker, I[node],label="I")
-                s, = plt.plot(timeStepsTracker, S[node],label='S')
-                r, = plt.plot(timeStepsTracker, R[node],label='R')
-                v, = plt.plot(timeStepsTracker, V[node],label='V')
-                plt.legend(handles=[i,s,r,v], loc = 'best')
+        for node in simulation.I:
+            # only for city to infect; can change to others by commenting out
+            if node == simulation.cityToInfect:
 
-        plt.title(CITY_TO_INFECT + " Infection Dynamics")
+                # The mean of the stochastic replicates when they ran
+                if ensemble is None:
+                    i, = plt.plot(simulation.history.days,
+                                  simulation.I[node],label="I")
+                else:
+                    i, = plt.plot(ensemble.days, ensemble.infected.mean[
+                        :, ensemble.index[node]], label="I mean")
+                s, = plt.plot(simulation.history.days,
+                              simulation.S[node],label='S')
+                r, = plt.plot(simulation.history.days,
+                              simulation.R[node],label='R')
+                v, = plt.plot(simulation.history.days,
+                              simulation.V[node],label='V')
+                handles = [i,s,r,v]
+                if ensemble is not None:
+                    lower, upper = ensemble.quantile(QUANTILES, node)
+                    handles.append(plt.fill_between(
+                        ensemble.days, lower, upper, alpha=0.3,
+                        label="I %d-%d%%" % (100*QUANTILES[0],
+                                             100*QUANTILES[1])))
+                plt.legend(handles=handles, loc = 'best')
+
+        plt.title(simulation.cityToInfect + " Infection Dynamics")
         plt.xlabel('Days of Year')
         plt.ylabel('People')
-        plt.xlim(START,START+SIMULATION_LENGTH)
+        plt.xlim(simulation.start,
+                 simulation.start+simulation.simulationLength)
         plt.show()
 
 
-def create_network(nodes, edges, curves):
+def create_network(nodes, edges, curves, monthly=None):
     """
     Create a NetworkX graph object using the airport and route databases.
 
@@ -269,18 +472,24 @@ def create_network(nodes, edges, curves):
         nodes: The file path to the nodes .csv file.
         edeges: The file path to the edges .csv file.
         curves: The file path to the mosquito curves .csv file.
+        monthly: Optional file path to the monthly flows .npz file from
+            convertAirlinePassenger.py.
 
     Returns:
         G: A NetworkX Graph object populated with the nodes and edges assigned
-           by the data files from the arguments.
+           by the data files from the arguments.  G.graph holds the routeInfo,
+           inboundRoutes and approvedAirports dictionaries, and with monthly
+           flows the monthlyRouteInfo and monthlyInbound ones.
 
     """
-    global routeInfo
-    global approvedAirports
+    import networkx as nx
 
     print("-- Creating network --\n")
     sys.stdout.flush()
     G = nx.Graph()
+    routeInfo = dict()
+    inboundRoutes = dict()
+    approvedAirports = dict()
 
     print("-- Loading mosquito curves --\n", end="")
     sys.stdout.flush()
@@ -301,9 +510,6 @@ def create_network(nodes, edges, curves):
     with open(nodes, 'r', encoding='utf-8') as f:
         for line in f.readlines():
             entries = line.replace('"',"").rstrip().split(",")
-            population = int(entries[5])
-            vaccinated = 0
-
             G.add_node(int(entries[0]),
                        name=entries[1],
                        IATA=entries[2],
@@ -311,11 +517,6 @@ def create_network(nodes, edges, curves):
                        lon=entries[4],
                        pop=int(entries[5]),
                        pos=(float(entries[3]),float(entries[4])),
-                       I=[0,0],  # First num - Total I, second num new I
-                       Iair=0,
-                       S=population,       #createHumans(int(entries[5])),
-                       V=vaccinated,
-                       R=0,
                        MOS=mosquitoCurves[entries[2]]
                        )
 
@@ -354,223 +555,981 @@ def create_network(nodes, edges, curves):
                 pass
             line_num += 1
 
+    # Index the routes by destination once so each time step only visits the
+    # routes landing at an airport: [(origin node, daily passengers), ...]
+    for key in routeInfo:
+        inboundRoutes.setdefault(int(key[3]), []).append(
+            (int(key[1]), routeInfo[key] / DAYS_IN_YEAR))
+
     # print("\t\t\t\t\t\t[Done]")
 
+    # The routes travel with the graph so simulations need no globals
+    G.graph["routeInfo"] = routeInfo
+    G.graph["inboundRoutes"] = inboundRoutes
+    G.graph["approvedAirports"] = approvedAirports
+    G.graph["monthlyRouteInfo"] = None
+    G.graph["monthlyInbound"] = None
+
+    if monthly is not None:
+        print("-- Loading monthly flows --\n", end="")
+        sys.stdout.flush()
+
+        monthlyRouteInfo = loadMonthlyFlows(monthly, routeInfo)
+        G.graph["monthlyRouteInfo"] = monthlyRouteInfo
+        G.graph["monthlyInbound"] = indexMonthlyRoutes(monthlyRouteInfo)
+
     return G
 
 
-def infection(input_network, timeStep):
+def loadMonthlyFlows(monthly, routeInfo):
     """
-    Run infection simulation one time step
+    Read the passengers of every route by month
 
     Args:
-        input_network: networkX graph network
-        timeStep: current time step of simulation to work on in days
+        monthly: The file path to the monthly flows .npz file.
+        routeInfo: {route: annual passengers} from create_network()
 
     Returns:
-        Nothing
+        {route: [passengers in each month]} in routeInfo order, routes
+        missing from the file fly their annual passengers evenly
     """
 
-    global I,S,V,R
-    approxMonth = timeStep // DAYS_IN_MONTH % MONTHS_IN_YEAR
-
-
-    # Spread disease to other Airports
-    currentNodes = input_network.node
-    for node in input_network.nodes_iter(input_network):
-        for key in routeInfo:
-            if node[1]["IATA"] == key[2]:
-                nodeDetails = currentNodes[int(key[1])]
+    with np.load(monthly) as flows:
+        found = {tuple(key): passengers for key, passengers in
+                 zip(flows["routes"].tolist(), flows["passengers"].tolist())}
 
-                node[1]["Iair"] += math.ceil((int(nodeDetails["I"][0] /
-                                   nodeDetails["pop"] *
-                                   routeInfo[key] / DAYS_IN_YEAR)) *
-                                   (1-SCREEN_PERC))
+    return {key: found.get(key, [passengers / MONTHS_IN_YEAR] *
+                           MONTHS_IN_YEAR)
+            for key, passengers in routeInfo.items()}
 
-    # Infection simulation at hubs
-    for node in input_network.nodes_iter(input_network):
 
-        #  Record stats
-        I[node[1]["IATA"]].append(node[1]["I"][0])
-        S[node[1]["IATA"]].append(node[1]["S"])
-        V[node[1]["IATA"]].append(node[1]["V"])
-        R[node[1]["IATA"]].append(node[1]["R"])
-
-
-        # Check for recovery
-        if node[1]["I"][0] > 0:
-            if timeStep - node[1]["I"][2][0] >= (TO_RECOVER + INCUBATION):
-                group = node[1]["I"].pop(2)
-                node[1]["I"][0] -= group[1]
-                node[1]["R"]    += group[1]
-                # If the recovered amount leaving matches the last one, then
-                # clear
-                if group[1] == node[1]["I"][1]:
-                    node[1]["I"][1] = 0
-
-        # Vaccinate people
-        if VACCINATE:
-            if node[1]["I"][0] > 0 and node[1]["S"] > 0:
-                num_vaccinate = min(math.ceil(VACCINATE_PERC * node[1]["I"][0] *
-                                              node[1]["S"] / (node[1]["I"][0] +
-                                              node[1]["S"])), node[1]["S"])
-                node[1]["V"] += num_vaccinate
-                node[1]["S"] -= num_vaccinate
-
-
-        # Infect cities
-        if timeStep == DATE_TO_INFECT and node[1]["IATA"] == CITY_TO_INFECT:
-            infectCity(input_network)
+def indexMonthlyRoutes(monthlyRouteInfo):
+    """
+    Index the monthly routes by destination for every month, like
+    inboundRoutes, so a time step picks its month with one list index
 
-        newlyInfected = min(math.ceil(TAU * node[1]["MOS"][approxMonth] *
-                            (node[1]["I"][1] +
-                              node[1]["Iair"])),node[1]["S"])
+    Args:
+        monthlyRouteInfo: {route: [passengers in each month]}
 
-        # if node[1]["IATA"] == "ATL":
-        #     print (min(math.ceil(TAU * node[1]["MOS"][approxMonth] *
-        #                     (node[1]["I"][1] + node[1]["Iair"])),
-        #                     node[1]["S"]))
-        if newlyInfected > 0:
-            node[1]["S"] -= newlyInfected
-            node[1]["I"].append((timeStep,newlyInfected))
-            node[1]["I"][0] += newlyInfected
-            node[1]["I"][1] = newlyInfected
+    Returns:
+        List of 12 {destination node: [(origin node, daily passengers)]}
+    """
 
-        # Remove temporary airport visitors
-        node[1]["Iair"] = 0
+    # A month is a twelfth of a year of days
+    daysInMonth = DAYS_IN_YEAR / MONTHS_IN_YEAR
+    monthlyInbound = [dict() for month in range(MONTHS_IN_YEAR)]
+    for key, passengers in monthlyRouteInfo.items():
+        for month, inboundRoutes in enumerate(monthlyInbound):
+            inboundRoutes.setdefault(int(key[3]), []).append(
+                (int(key[1]), passengers[month] / daysInMonth))
 
-        # print ("newlyInfected",newlyInfected)
-        # print ("currentlyInfected",node[1]["I"])
-        # print ("currentlyRecovered",node[1]["R"])
+    return monthlyInbound
 
 
-def infectCity(input_network):
+def outbound(inboundRoutes):
     """
-    Infect designated city with first infection of 1
+    Index the routes by origin instead of destination
 
     Args:
-        input_network: networkX graph network
+        inboundRoutes: {destination node: [(origin node, daily passengers)]}
 
     Returns:
-        Nothing
+        {origin node: [(destination node, daily passengers)]}
     """
-    print("-- Infecting " + CITY_TO_INFECT + " in " +
-          MONTH_MAP[(DATE_TO_INFECT//DAYS_IN_MONTH)%MONTHS_IN_YEAR] +
-          " --\n")
 
-    for node in input_network.nodes_iter(input_network):
-        if node[1]["IATA"] == CITY_TO_INFECT:
-            node[1]["S"] -= 1
-            node[1]["I"].append((DATE_TO_INFECT,1))
-            node[1]["I"][0] += 1
-            node[1]["I"][1] += 1
+    outboundRoutes = dict()
+    for destination, routes in inboundRoutes.items():
+        for origin, dailyPassengers in routes:
+            outboundRoutes.setdefault(origin, []).append((destination,
+                                                          dailyPassengers))
 
+    return outboundRoutes
 
-def setupGlobalSIVR():
-    """
-    Setup globals to run stats on SIVR
-
-    Args:
-        Nothing
 
-    Returns:
-        Nothing
+class AirportState(object):
+    """
+    Infection state of one airport during a simulation
+
+    Attributes:
+        I: total infected
+        Inew: last group newly infected
+        cohorts: infection groups waiting to recover, (time step, count)
+        Iair: infected passengers visiting this time step
+        S: susceptible
+        V: vaccinated
+        R: recovered
     """
 
-    global I,S,V,R
+    __slots__ = ("I", "Inew", "cohorts", "Iair", "S", "V", "R")
 
-    for airport in approvedAirports:
-        I[airport] = list()
-        S[airport] = list()
-        V[airport] = list()
-        R[airport] = list()
+    def __init__(self, population):
+        self.I = 0
+        self.Inew = 0
+        self.cohorts = collections.deque()
+        self.Iair = 0
+        self.S = population
+        self.V = 0
+        self.R = 0
 
 
-def updateIDic(network):
+class Simulation(object):
     """
-    Shifts around Infection dictionary so that for each city the start of the
-    infection is first
+    Infection simulation over an airport network from create_network().  A
+    Simulation owns its parameters, the state of every airport and the SIVR
+    history, so any number of them can run in one interpreter on the same
+    network.
 
-    Args:
+    Attributes:
         network: networkX graph network
-
-    Returns:
-        Updated infection dictionary
+        cityToInfect: The IATA code for hub to start infection at
+        dateToInfect: Start day of infection
+        start: Start day of simulation
+        simulationLength: Number of days to run simulation
+        tau: Ro - Reproduction number for particular virus
+        incubation: Incubation days for infection to show symptoms in human
+            and be passed again
+        toRecover: Days for a human to recover after incubation
+        vaccinate: Vaccinate using O'Leary vaccination formula
+        vaccinatePerc: Vaccination rate, (1-(1/tau)) if not given
+        screenPerc: Screen rate at airports to prevent sick humans from moving
+        engine: "python" to step the airport states, "numpy" to use
+            zikaEngine.py or "ode" to integrate the rates with zikaODE.py
+        workers: Number of worker processes for runAll(), 0 to run in this
+            process, not with the ode engine
+        imports: "route" to round the infected passengers of every route or
+            "expected" for the expected number from zikaEngine.py, which
+            needs the numpy engine or workers
+        recovery: "oldest" to recover the oldest due infection group each
+            time step like the original simulator, or "every" to recover
+            every due group with the days counted around the end of the
+            simulation length
+        historyDtype: np.int64 for exact counts in the history or np.float32
+            for half the memory
+        historyEvery: keep every n-th time step in the history
+        trajectories: optional folder for runAll() to write the history of
+            every simulation to, see zikaHistory.TrajectoryStore
+        scheduler: "active" for the python engine to only step the airports
+            that are infected or have infected passengers landing, "all" to
+            step every airport and route
+        jit: True for the numpy engine and workers to step with the Numba
+            compiled loop of zikaKernel.py when Numba is installed
+        profiler: optional zikaProfile.Profiler timing the phases of every
+            time step in this process
+        states: {node: AirportState}
+        active: nodes infected after the last time step
+        changed: nodes stepped by the last time step, not yet in the history
+        history: zikaHistory.History of the I, S, V, R of every airport,
+            None during runAll()
+        I, S, V, R: {IATA: array of the count at every time step}, views of
+            the history
+        timeStepsTracker: time steps run by run()
     """
 
-    popIDict = {}
-    #print("ATL's I :", I['ATL'])
-    # divide all I by the population
-    for node in network.nodes_iter(network):
-        popIDict[node[1]["IATA"]] = [x / node[1]["pop"] for x in I[node[1]["IATA"]]]
-    #print("ATL's IDIC :", popIDict['ATL'])
-    #print("POPULATION IDict :", popIDict)
-    updatedIDict = {}
-    for key in popIDict:
-        updatedIDict[key] = [0] * MONTHS_IN_YEAR
-    #print("BEFORE UPDATED IDIC:",updatedIDict)
-
-    timeStepMonth = list()
-    for i in timeStepsTracker:
-        if ((i // DAYS_IN_MONTH) % MONTHS_IN_YEAR == 0):
-            #print(12)
-            timeStepMonth.append(MONTHS_IN_YEAR)
+    def __init__(self, network, cityToInfect=CITY_TO_INFECT,
+                 dateToInfect=DATE_TO_INFECT, start=START,
+                 simulationLength=SIMULATION_LENGTH, tau=TAU,
+                 incubation=INCUBATION, toRecover=TO_RECOVER,
+                 vaccinate=VACCINATE, vaccinatePerc=None,
+                 screenPerc=SCREEN_PERC, engine=ENGINE, workers=0,
+                 imports=IMPORTS, recovery=RECOVERY,
+                 historyDtype=np.int64, historyEvery=1,
+                 trajectories=None, scheduler=SCHEDULER, jit=False,
+                 profiler=None):
+        self.network = network
+        self.routeInfo = network.graph["routeInfo"]
+        self.inboundRoutes = network.graph["inboundRoutes"]
+        self.monthlyInbound = network.graph.get("monthlyInbound")
+        self.outboundRoutes = None
+        self.monthlyOutbound = None
+        if self.inboundRoutes is not None:
+            self.outboundRoutes = outbound(self.inboundRoutes)
+        if self.monthlyInbound is not None:
+            self.monthlyOutbound = [outbound(inboundRoutes) for inboundRoutes
+                                    in self.monthlyInbound]
+        self.approvedAirports = network.graph["approvedAirports"]
+        self.cityToInfect = cityToInfect
+        self.dateToInfect = dateToInfect
+        self.start = start
+        self.simulationLength = simulationLength
+        self.tau = tau
+        self.incubation = incubation
+        self.toRecover = toRecover
+        self.vaccinate = vaccinate
+        self.vaccinatePerc = 1 - (1/tau) if vaccinatePerc is None \
+            else vaccinatePerc
+        self.screenPerc = screenPerc
+        self.engine = engine
+        self.workers = workers
+        self.imports = imports
+        self.recovery = recovery
+        self.historyDtype = historyDtype
+        self.historyEvery = historyEvery
+        self.trajectories = trajectories
+        self.scheduler = scheduler
+        self.jit = jit
+        self.profiler = profiler
+        self.positions = {node: i for i, node in
+                          enumerate(network.nodes_iter())}
+        self.arrays = None
+        self.timeStepsTracker = list()
+        self.reset()
+
+    def reset(self, cityToInfect=None, dateToInfect=None, record=True):
+        """
+        Return every airport to its uninfected state and clear the history
+
+        Args:
+            cityToInfect: optional new hub to start infection at
+            dateToInfect: optional new start day of infection
+            record: allocate a history for run() when True
+
+        Returns:
+            Nothing
+        """
+
+        if cityToInfect is not None:
+            self.cityToInfect = cityToInfect
+        if dateToInfect is not None:
+            self.dateToInfect = dateToInfect
+
+        self.states = {node: AirportState(details["pop"])
+                       for node, details in self.network.nodes_iter(data=True)}
+        self.active = set()
+        self.changed = set()
+        self.setupSIVR(record)
+
+    def setupSIVR(self, record=True, history=None):
+        """
+        Setup the SIVR stat tracker, preallocated for the time steps of run()
+
+        Args:
+            record: False to run without a history
+            history: optional zikaHistory.History to record into instead
+
+        Returns:
+            Nothing
+        """
+
+        self.history = history
+        if record and history is None:
+            # Every airport, including those without routes
+            self.history = zikaHistory.History(
+                [details["IATA"]
+                 for node, details in self.network.nodes_iter(data=True)],
+                len(self.timeSteps()), self.historyDtype, self.historyEvery)
+        if self.history is not None:
+            self.history.update(slice(None), [(state.I, state.S, state.V,
+                                               state.R)
+                                              for state in
+                                              self.states.values()])
+
+    @property
+    def I(self):
+        """
+        {IATA: infected at every time step} from the history
+        """
+
+        return self.history.view("I")
+
+    @property
+    def S(self):
+        """
+        {IATA: susceptible at every time step} from the history
+        """
+
+        return self.history.view("S")
+
+    @property
+    def V(self):
+        """
+        {IATA: vaccinated at every time step} from the history
+        """
+
+        return self.history.view("V")
+
+    @property
+    def R(self):
+        """
+        {IATA: recovered at every time step} from the history
+        """
+
+        return self.history.view("R")
+
+    def params(self):
+        """
+        Collect the simulation parameters for zikaEngine.py
+
+        Args:
+            Nothing
+
+        Returns:
+            Dictionary of the parameters named like the zikaEngine.py keys
+        """
+
+        return {"TAU": self.tau,
+                "INCUBATION": self.incubation,
+                "TO_RECOVER": self.toRecover,
+                "VACCINATE": self.vaccinate,
+                "VACCINATE_PERC": self.vaccinatePerc,
+                "SCREEN_PERC": self.screenPerc,
+                "IMPORTS": self.imports,
+                "RECOVERY": self.recovery,
+                "SIMULATION_LENGTH": self.simulationLength,
+                "JIT": self.jit}
+
+    def getArrays(self):
+        """
+        Network arrays for zikaEngine.py, from the network snapshot or
+        built on first use
+
+        Args:
+            Nothing
+
+        Returns:
+            Network arrays from zikaEngine.buildArrays()
+        """
+
+        if self.arrays is None:
+            self.arrays = self.network.graph.get("arrays") or \
+                zikaEngine.buildArrays(self.network, self.inboundRoutes)
+        return self.arrays
+
+    def timeSteps(self):
+        """
+        Time steps of a single simulation
+
+        Args:
+            Nothing
+
+        Returns:
+            List of the days infection() runs on
+        """
+
+        return [i for i in range(self.start, self.start+self.simulationLength)
+                if i % self.incubation == 0 or i == self.dateToInfect]
+
+    def run(self):
+        """
+        Run a single simulation from the start day, recording the SIVR history
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+
+        self.reset()
+        self.timeStepsTracker = self.timeSteps()
+
+        if self.engine == "numpy":
+            arrays = self.getArrays()
+            params = self.params()
+            state = zikaEngine.setupState(arrays, [(self.cityToInfect,
+                                                    self.dateToInfect)],
+                                          params, self.history,
+                                          profiler=self.profiler)
+            for i in self.timeStepsTracker:
+                zikaEngine.infection(arrays, state, i, params)
+        elif self.engine == "ode":
+            if self.profiler is not None:
+                self.profiler.mark()
+            final, evaluations = zikaODE.solve(
+                self.getArrays(), self.params(), self.cityToInfect,
+                self.dateToInfect, self.timeStepsTracker, self.history)
+            if self.profiler is not None:
+                self.profiler.lap("solve", evaluations=evaluations)
         else:
-            #print((i // DAYS_IN_MONTH) % 12)
-            timeStepMonth.append((i // DAYS_IN_MONTH) % MONTHS_IN_YEAR)
-    #print("TIME STEP MONTH:" , timeStepMonth)
-
-    for key in popIDict:
-        for i in range(len(timeStepMonth)):
-            if (updatedIDict[key][(timeStepMonth[i]-1)] < popIDict[key][i]):
-                updatedIDict[key][(timeStepMonth[i]-1)] = popIDict[key][i]
-
-    #print("AFTER BUT STILL NOT FINAL updatedIDict", updatedIDict)
-    inital = timeStepMonth[0]
-    for key, value in updatedIDict.items():
-        value = value[inital-1:] + value[:inital-1]
-        updatedIDict[key] = value
-
-    #print("FINAL updatedIDict", updatedIDict)
-    # arr = (np.linspace(0, len(popIDict[CITY_TO_INFECT]),
-                       #math.ceil((SIMULATION_LENGTH)/DAYS_IN_MONTH),
-                       #endpoint=True, dtype=int))
-    #arr[-1] -= 1
-    #print(arr)
-    #for key,value in popIDict.items():
-        #updatedIDict[key] = [value[i] for i in arr]
-
-    return updatedIDict
-
-
-def getColor(value):
+            for i in self.timeStepsTracker:
+                self.infection(i)
+
+    def trajectoryStore(self):
+        """
+        Allocate the store for the history of every -a simulation, numbered
+        by city and then month like runAll()
+
+        Args:
+            Nothing
+
+        Returns:
+            zikaHistory.TrajectoryStore, None without a trajectories folder
+        """
+
+        if self.trajectories is None:
+            return None
+
+        months = list(range(1,DAYS_IN_YEAR,DAYS_IN_MONTH))
+        tasks = zikaSweep.sweepTasks(list(self.approvedAirports), months,
+                                     [self.tau], [self.vaccinatePerc],
+                                     [self.screenPerc], self.params())
+        return zikaSweep.createTrajectories(
+            self.trajectories,
+            [details["IATA"]
+             for node, details in self.network.nodes_iter(data=True)], tasks)
+
+    def runAll(self, summary=None):
+        """
+        Run every city and monthly infection date of the -a sweep with the
+        selected engine or worker processes
+
+        Args:
+            summary: optional zikaStats.SweepStats fed every scenario as it
+                finishes
+
+        Returns:
+            infectionAllStats: {IATA: [total recovered for each infection
+                month]}
+        """
+
+        if self.engine == "ode":
+            return self.runAllODE(summary)
+        elif self.workers:
+            return self.runAllWorkers(summary)
+        elif self.engine == "numpy":
+            return self.runAllScenarios(summary)
+
+        infectionAllStats = dict()
+        store = self.trajectoryStore()
+        scenario = 0
+
+        for airport in self.approvedAirports:
+            # print (airport)
+            infectionAllStats[airport] = list()
+            for i in range(1,DAYS_IN_YEAR,DAYS_IN_MONTH): # START + SIMULATION_LENGTH+1
+                self.reset(airport, i, record=False)
+                if store is not None:
+                    self.setupSIVR(history=store.history(scenario))
+                infectionAllStats[airport].append(0)
+                # Run infection simulation
+                for j in range(i,DAYS_IN_YEAR+i): # START + SIMULATION_LENGTH+1+i
+                    j %= self.simulationLength
+                    if j % self.incubation == 0 or j == self.dateToInfect:
+                        self.infection(j)
+
+                for state in self.states.values():
+                    infectionAllStats[airport][-1] += state.R
+                if summary is not None:
+                    summary.add(airport, len(infectionAllStats[airport]) - 1,
+                                infectionAllStats[airport][-1])
+                if store is not None:
+                    store.finish(scenario, self.history)
+                scenario += 1
+
+        if store is not None:
+            store.flush()
+
+        return infectionAllStats
+
+    def runAllODE(self, summary=None):
+        """
+        Run every city and monthly infection date of the -a sweep with the
+        continuous time rates of zikaODE.py, for a year from the infection
+        date
+
+        Args:
+            summary: optional zikaStats.SweepStats fed every scenario as it
+                finishes
+
+        Returns:
+            infectionAllStats: {IATA: [total recovered for each infection
+                month]}
+        """
+
+        arrays = self.getArrays()
+        params = self.params()
+        store = self.trajectoryStore()
+        infectionAllStats = dict()
+        scenario = 0
+
+        for airport in self.approvedAirports:
+            infectionAllStats[airport] = list()
+            for month, i in enumerate(range(1,DAYS_IN_YEAR,DAYS_IN_MONTH)):
+                # The same time steps as runAll(), counted on past the end
+                # of the simulation length instead of wrapping
+                schedule = zikaEngine.runAllTimeSteps(i, self.simulationLength,
+                                                      self.incubation)
+                days = i + np.cumsum(np.diff(schedule, prepend=i) %
+                                     self.simulationLength)
+                history = None if store is None else store.history(scenario)
+                final, evaluations = zikaODE.solve(arrays, params, airport, i,
+                                                   days, history,
+                                                   DAYS_IN_YEAR + i)
+                infectionAllStats[airport].append(
+                    int(round(final[:, 3].sum())))
+                if summary is not None:
+                    summary.add(airport, month, infectionAllStats[airport][-1])
+                if store is not None:
+                    history.days[:] = schedule
+                    store.finish(scenario, history)
+                scenario += 1
+
+        if store is not None:
+            store.flush()
+
+        return infectionAllStats
+
+    def runAllWorkers(self, summary=None):
+        """
+        Run every city and monthly infection date of the -a sweep on a pool of
+        worker processes with zikaSweep.py
+
+        Args:
+            summary: optional zikaStats.SweepStats fed every scenario as its
+                worker returns it
+
+        Returns:
+            infectionAllStats: {IATA: [total recovered for each infection
+                month]}
+        """
+
+        months = list(range(1,DAYS_IN_YEAR,DAYS_IN_MONTH))
+        tasks = zikaSweep.sweepTasks(list(self.approvedAirports), months,
+                                     [self.tau], [self.vaccinatePerc],
+                                     [self.screenPerc], self.params())
+
+        infectionAllStats = {airport: [0] * len(months)
+                             for airport in self.approvedAirports}
+        for task, recovered, infected in zikaSweep.runSweep(
+                self.getArrays(), tasks, self.workers,
+                trajectories=self.trajectories):
+            month = months.index(task[2])
+            infectionAllStats[task[1]][month] = recovered
+            if summary is not None:
+                summary.add(task[1], month, recovered)
+
+        return infectionAllStats
+
+    def runAllScenarios(self, summary=None):
+        """
+        Run every city and monthly infection date of the -a sweep together as
+        one batch of scenarios with zikaEngine.py
+
+        Args:
+            summary: optional zikaStats.SweepStats fed every scenario as its
+                batch finishes
+
+        Returns:
+            infectionAllStats: {IATA: [total recovered for each infection
+                month]}
+        """
+
+        arrays = self.getArrays()
+        months = list(range(1,DAYS_IN_YEAR,DAYS_IN_MONTH))
+        scenarios = [(airport, i) for airport in self.approvedAirports
+                     for i in months]
+
+        # Large networks run the scenarios in batches so the state arrays
+        # stay within BATCH_CELLS
+        batchSize = max(1, BATCH_CELLS // len(arrays["nodes"]))
+        store = self.trajectoryStore()
+        infectionAllStats = dict()
+        for first in range(0, len(scenarios), batchSize):
+            batch = scenarios[first:first + batchSize]
+            for (airport, i), recovered in zip(batch,
+                                               self.runScenarios(batch, store,
+                                                                 first)):
+                infectionAllStats.setdefault(airport, list()).append(
+                    recovered)
+                if summary is not None:
+                    summary.add(airport, months.index(i), recovered)
+
+        if store is not None:
+            store.flush()
+
+        return infectionAllStats
+
+    def runScenarios(self, scenarios, store=None, first=0):
+        """
+        Run one batch of -a scenarios together with zikaEngine.py
+
+        Args:
+            scenarios: list of (city to infect, date to infect) pairs
+            store: optional zikaHistory.TrajectoryStore to write the history
+                of every scenario to
+            first: scenario number in the store of the first scenario
+
+        Returns:
+            List of the total recovered of every scenario
+        """
+
+        arrays = self.getArrays()
+
+        # Same time steps as running the scenarios one at a time, padded at
+        # the end for scenarios that take fewer steps
+        schedules = [zikaEngine.runAllTimeSteps(i, self.simulationLength,
+                                                self.incubation)
+                     for airport, i in scenarios]
+        numSteps = max(len(schedule) for schedule in schedules)
+        timeSteps = np.zeros((numSteps, len(scenarios)), dtype=np.int64)
+        active = np.zeros((numSteps, len(scenarios)), dtype=bool)
+        for scenario, schedule in enumerate(schedules):
+            timeSteps[:len(schedule), scenario] = schedule
+            active[:len(schedule), scenario] = True
+
+        params = self.params()
+        state = zikaEngine.setupState(arrays, scenarios, params,
+                                      profiler=self.profiler)
+        rows = slice(first, first + len(scenarios))
+        for step in range(numSteps):
+            # Record like infection() does, before the step changes them,
+            # leaving the padding of finished scenarios at zero
+            if store is not None:
+                running = np.flatnonzero(active[step])
+                store.data[first + running, step] = np.stack(
+                    (state["I"][running], state["S"][running],
+                     state["V"][running], state["R"][running]), axis=-1)
+            zikaEngine.infection(arrays, state, timeSteps[step], params,
+                                 active[step])
+
+        if store is not None:
+            store.days[rows, :numSteps] = timeSteps.T
+            store.lengths[rows] = [len(schedule) for schedule in schedules]
+
+        return [int(recovered) for recovered in state["R"].sum(axis=1)]
+
+    def runReplicates(self, replicates, seed=None):
+        """
+        Run stochastic replicates of the single simulation with zikaEngine.py,
+        in batches of replicates within BATCH_CELLS, folding every time step
+        into running statistics instead of keeping the trajectories.
+        Replicate k is seeded by child k of the seed, so it draws the same
+        numbers however many replicates run.
+
+        Args:
+            replicates: number of replicates
+            seed: seed of the replicates, None for a random one
+
+        Returns:
+            zikaStats.EnsembleStats of the replicates, with quantiles of the
+            infected city only
+        """
+
+        arrays = self.getArrays()
+        params = self.params()
+        days = self.timeSteps()
+        ensemble = zikaStats.EnsembleStats(arrays["IATA"], days, arrays["pop"],
+                                           sketched=[self.cityToInfect])
+        seeds = np.random.SeedSequence(seed).spawn(replicates)
+
+        batchSize = max(1, BATCH_CELLS // len(arrays["nodes"]))
+        for first in range(0, replicates, batchSize):
+            batch = seeds[first:first + batchSize]
+            state = zikaEngine.setupState(arrays, [(self.cityToInfect,
+                                                    self.dateToInfect)] *
+                                          len(batch), params, seeds=batch,
+                                          profiler=self.profiler)
+            with contextlib.redirect_stdout(io.StringIO()):
+                for step, i in enumerate(days):
+                    # Record like infection() does, before the step changes
+                    # them
+                    ensemble.add(step, state["I"])
+                    zikaEngine.infection(arrays, state, i, params)
+            ensemble.finish(state["I"], state["R"])
+
+        return ensemble
+
+    def infection(self, timeStep):
+        """
+        Run infection simulation one time step
+
+        Args:
+            timeStep: current time step of simulation to work on in days
+
+        Returns:
+            Nothing
+        """
+
+        if self.scheduler == "all":
+            return self.infectionAll(timeStep)
+
+        approxMonth = timeStep // DAYS_IN_MONTH % MONTHS_IN_YEAR
+        states = self.states
+        outboundRoutes = self.outboundRoutes if self.monthlyOutbound is None \
+            else self.monthlyOutbound[approxMonth]
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.mark()
+
+        #  Record stats, only the airports stepped last time have changed
+        if self.history is not None:
+            if self.changed:
+                self.history.update([self.positions[node]
+                                     for node in self.changed],
+                                    [(states[node].I, states[node].S,
+                                      states[node].V, states[node].R)
+                                     for node in self.changed])
+            self.history.record(timeStep)
+        if profiler is not None:
+            profiler.lap("record")
+
+        # Spread disease to other Airports, only infected airports send
+        # infected passengers
+        currentNodes = self.network.node
+        stepping = set(self.active)
+        for origin in self.active:
+            originState = states[origin]
+            for destination, dailyPassengers in outboundRoutes.get(origin,
+                                                                   ()):
+                arriving = math.ceil((int(originState.I /
+                                          currentNodes[origin]["pop"] *
+                                          dailyPassengers)) *
+                                     (1-self.screenPerc))
+                if arriving:
+                    states[destination].Iair += arriving
+                    stepping.add(destination)
+        if profiler is not None:
+            profiler.lap("routes", routesScanned=sum(
+                len(outboundRoutes.get(origin, ())) for origin in self.active))
+
+        # The infected city joins on the day of infection
+        if timeStep == self.dateToInfect:
+            stepping.update(node for node, details in
+                            self.network.nodes_iter(data=True)
+                            if details["IATA"] == self.cityToInfect)
+
+        # Infection simulation at hubs with something to do, the others
+        # would not change
+        for node in stepping:
+            self.stepAirport(node, states[node], currentNodes[node],
+                             timeStep, approxMonth)
+
+        if profiler is not None:
+            profiler.mark()
+        self.changed = stepping
+        self.active = {node for node in stepping
+                       if states[node].I > 0 or states[node].Inew > 0}
+        if profiler is not None:
+            profiler.lap("schedule", timeSteps=1,
+                         airportsStepped=len(stepping),
+                         nodesActive=len(self.active))
+
+    def infectionAll(self, timeStep):
+        """
+        Run infection simulation one time step over every airport and route
+
+        Args:
+            timeStep: current time step of simulation to work on in days
+
+        Returns:
+            Nothing
+        """
+
+        approxMonth = timeStep // DAYS_IN_MONTH % MONTHS_IN_YEAR
+        states = self.states
+        inboundRoutes = self.inboundRoutes if self.monthlyInbound is None \
+            else self.monthlyInbound[approxMonth]
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.mark()
+
+        # Spread disease to other Airports
+        currentNodes = self.network.node
+        for node, state in states.items():
+            for origin, dailyPassengers in inboundRoutes.get(node, ()):
+                originState = states[origin]
+
+                state.Iair += math.ceil((int(originState.I /
+                                        currentNodes[origin]["pop"] *
+                                        dailyPassengers)) *
+                                        (1-self.screenPerc))
+        if profiler is not None:
+            profiler.lap("routes", routesScanned=sum(
+                len(routes) for routes in inboundRoutes.values()))
+
+        #  Record stats
+        if self.history is not None:
+            self.history.record(timeStep, [(state.I, state.S, state.V,
+                                            state.R)
+                                           for state in states.values()])
+        if profiler is not None:
+            profiler.lap("record")
+
+        # Infection simulation at hubs
+        for node, state in states.items():
+            self.stepAirport(node, state, currentNodes[node], timeStep,
+                             approxMonth)
+        if profiler is not None:
+            profiler.count(timeSteps=1, airportsStepped=len(states),
+                           nodesActive=sum(1 for state in states.values()
+                                           if state.I > 0 or state.Inew > 0))
+
+    def stepAirport(self, node, state, details, timeStep, approxMonth):
+        """
+        Recover, vaccinate and infect at one airport for one time step
+
+        Args:
+            node: node of the airport
+            state: AirportState of the airport, updated in place
+            details: node attributes of the airport
+            timeStep: current time step of simulation to work on in days
+            approxMonth: month of the time step
+
+        Returns:
+            Nothing
+        """
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.mark()
+            groups = len(state.cohorts)
+
+        # Check for recovery of the groups infected TO_RECOVER +
+        # INCUBATION days ago, the oldest one or, counting the days around
+        # the end of the simulation length, every one
+        while state.I > 0:
+            elapsed = timeStep - state.cohorts[0][0]
+            if self.recovery == "every":
+                elapsed %= self.simulationLength
+            if elapsed < self.toRecover + self.incubation:
+                break
+            group = state.cohorts.popleft()
+            state.I -= group[1]
+            state.R += group[1]
+            # If the recovered amount leaving matches the last one,
+            # then clear
+            if group[1] == state.Inew:
+                state.Inew = 0
+            if self.recovery == "oldest":
+                break
+        if profiler is not None:
+            profiler.lap("recovery",
+                         cohortsRecovered=groups - len(state.cohorts))
+            vaccinated = state.V
+
+        # Vaccinate people
+        if self.vaccinate:
+            if state.I > 0 and state.S > 0:
+                num_vaccinate = min(math.ceil(self.vaccinatePerc *
+                                              state.I * state.S /
+                                              (state.I + state.S)),
+                                    state.S)
+                state.V += num_vaccinate
+                state.S -= num_vaccinate
+        if profiler is not None:
+            profiler.lap("vaccination", vaccinated=state.V - vaccinated)
+
+
+        # Infect cities
+        if timeStep == self.dateToInfect and \
+                details["IATA"] == self.cityToInfect:
+            self.infectCity()
+            if profiler is not None:
+                profiler.lap("infectCity")
+
+        newlyInfected = min(math.ceil(self.tau *
+                                      details["MOS"][approxMonth] *
+                                      (state.Inew + state.Iair)),
+                            state.S)
+
+        if newlyInfected > 0:
+            state.S -= newlyInfected
+            state.cohorts.append((timeStep,newlyInfected))
+            state.I += newlyInfected
+            state.Inew = newlyInfected
+
+        # Remove temporary airport visitors
+        state.Iair = 0
+        if profiler is not None:
+            profiler.lap("infection",
+                         newlyInfected=max(newlyInfected, 0))
+
+    def infectCity(self):
+        """
+        Infect designated city with first infection of 1
+
+        Args:
+            Nothing
+
+        Returns:
+            Nothing
+        """
+        print("-- Infecting " + self.cityToInfect + " in " +
+              MONTH_MAP[(self.dateToInfect//DAYS_IN_MONTH)%MONTHS_IN_YEAR] +
+              " --\n")
+
+        for node, details in self.network.nodes_iter(data=True):
+            if details["IATA"] == self.cityToInfect:
+                state = self.states[node]
+                state.S -= 1
+                state.cohorts.append((self.dateToInfect,1))
+                state.I += 1
+                state.Inew += 1
+
+    def population(self):
+        """
+        Population of every airport in history order
+
+        Args:
+            Nothing
+
+        Returns:
+            Float array of the populations
+        """
+
+        return np.array([self.network.node[node]["pop"]
+                         for node in self.network.nodes_iter()],
+                        dtype=np.float64)
+
+    def updateIDic(self):
+        """
+        Shifts around Infection dictionary so that for each city the start of
+        the infection is first
+
+        Args:
+            Nothing
+
+        Returns:
+            Updated infection dictionary, {IATA: highest infected fraction of
+            the population in each month}, each a view of one array
+        """
+
+        history = self.history
+        # divide all I by the population
+        popI = history.compartment("I") / self.population()
+
+        # Month of every time step as an index, month 0 of the year is
+        # counted as month 12
+        timeStepMonth = (history.days // DAYS_IN_MONTH - 1) % MONTHS_IN_YEAR
+        monthly = np.zeros((MONTHS_IN_YEAR, popI.shape[1]))
+        np.maximum.at(monthly, timeStepMonth, popI)
+
+        # Start from the month of the first time step
+        monthly = np.roll(monthly, -timeStepMonth[0], axis=0).T
+
+        return {airport: monthly[i] for i, airport in enumerate(history.IATA)}
+
+
+def mapBounds(network):
     """
-    Correlate value to color
+    Map corners that fit the network, the United States for the hub network
+    and the world otherwise
 
     Args:
-        value: current infection rate at node
+        network: networkX graph network
 
     Returns:
-        Color for node
+        Dictionary of Basemap corner arguments
     """
 
-    if value <= .333:
-        return "co"
-    elif value <= .667:
-        return "yo"
-    else:
-        return "ro"
+    for node, details in network.nodes_iter(data=True):
+        lat, lon = details["pos"]
+        if not (US_BOUNDS["llcrnrlat"] <= lat <= US_BOUNDS["urcrnrlat"] and
+                US_BOUNDS["llcrnrlon"] <= lon <= US_BOUNDS["urcrnrlon"]):
+            return WORLD_BOUNDS
+
+    return US_BOUNDS
 
 
-def updatedVisualize(network, IDic, position, month):
+def updatedVisualize(network, IDic, position, month, vaccinate=False):
     """
-    Produce multiple visualizations of simulations
+    Produce the map of one month of a simulation, without a display
 
     Args:
         nework: networkX graph network
         IDic: Infection dictionary for entire network
         position: position in infection dictionary for saving figures
         month: Current month to print on figure
+        vaccinate: True if the simulation vaccinated, for the figure name
 
     Returns:
         Nothing
@@ -578,84 +1537,12 @@ def updatedVisualize(network, IDic, position, month):
 
     print("-- Starting to Visualize [", MONTH_MAP[month], "] --\n")
 
-    #updatedIDic = updateIDic(network)
-    #print("UPDATED DIC", updatedIDic)
-
-    map = Basemap(
-        projection='merc',
-        ellps='WGS84',
-        llcrnrlon=-160,urcrnrlon=-60,llcrnrlat=10,urcrnrlat=80,
-        resolution="l"
-        )
-    #map.drawmapboundary("aqua")
-    #map.fillcontinents('#555555')
-    #map.drawlsmask(land_color='green',ocean_color='aqua',lakes=True)
-    map.bluemarble()
-
-    pos = dict()
-
-    for pos_node in network.nodes():
-        # Normalize the lat and lon values
-        x,y = map(float(network.node[pos_node]['lon']),
-                float(network.node[pos_node]['lat']))
-        #print("x,y", float(network.node[pos_node]['lon']),float(network.node[pos_node]['lat']))
-        pos[pos_node] = [x,y]
-
-    #print("POS", network.nodes())
-    # First pass - edges
-    nx.draw_networkx_edges(network,pos,edgelist=network.edges(),
-            width=1,
-            edge_color="gray",
-            alpha=0.5,
-            arrows=False)
-
-    #Node/vertices colors
-    nx.draw_networkx_nodes(network,
-            pos,
-            linewidths=1,
-            node_size=30,
-            with_labels=False,
-            node_color = "white")
-
-
-    for pos_node in network.nodes():
-        # Normalize the lat and lon values
-        x,y = map(float(network.node[pos_node]['lon']),
-                float(network.node[pos_node]['lat']))
-        #msize = math.ceil(network.node[pos_node]['pop'] * .00001)
-        mcolor = getColor(IDic[network.node[pos_node]['IATA']][position])
-        # print("AIRPORT ATTRIBUTES:", network.node[pos_node]['IATA'], IDic[network.node[pos_node]['IATA']], mcolor)
-        map.plot(x, y, mcolor, markersize=7)
-        #print(updatedIDic[network.node[pos_node]['IATA']][2])
-
-
-    #Adjust the plot limits
-    cut = 1.05
-    xmax = cut * max(xx for xx,yy in pos.values())
-    xmin =  min(xx for xx,yy in pos.values())
-    xmin = xmin - (cut * xmin)
-
-
-    ymax = cut * max(yy for xx,yy in pos.values())
-    ymin = (cut) * min(yy for xx,yy in pos.values())
-    ymin = ymin - (cut * ymin)
-
-    plt.xlim(xmin,xmax)
-    plt.ylim(ymin,ymax)
-
-    title_string = "Zika Infection for the Month of " + MONTH_MAP[month]
-    savefigStr = "./Images/"
-    if not VACCINATE:
-        savefigStr += "infection-"
-    else:
-        savefigStr += "infectionWithVaccination-"
-    savefigStr += MONTH_MAP[month] + ".png"
-    #print(str(savefigStr))
-    plt.title(title_string)
-    plt.axis('off')
-    plt.savefig(savefigStr)
-    plt.show()
-    plt.close()
+    context = zikaRender.buildContext(network, mapBounds(network))
+    values = [IDic[airport][position] for airport in context["IATA"]]
+    zikaRender.renderFrame(context, values,
+                           "Zika Infection for the Month of " +
+                           MONTH_MAP[month],
+                           zikaRender.framePath(month, vaccinate))
 
 
 def visualize(network):
@@ -671,26 +1558,14 @@ def visualize(network):
 
     print("-- Starting to Visualize Map Network --\n")
 
-    m = Basemap(
-        projection='merc',
-        ellps='WGS84',
-        llcrnrlon=-160,urcrnrlon=-60,llcrnrlat=10,urcrnrlat=80,
-        resolution="l"
-        )
-
-    pos = dict()
-    labels = list()
-    for pos_node in network.nodes():
-        # Normalize the lat and lon values
-        x,y = m(float(network.node[pos_node]['lon']),
-                float(network.node[pos_node]['lat']))
-
-        pos[pos_node] = [x,y]
+    import matplotlib.pyplot as plt
+    import networkx as nx
 
-    #m.drawmapboundary("aqua")
-    #m.fillcontinents('#555555')
-    #m.drawlsmask(land_color='green',ocean_color='aqua',lakes=True)
-    m.bluemarble()
+    # Projected background from the map cache of zikaRender.py
+    context = zikaRender.buildContext(network, mapBounds(network))
+    zikaRender.drawBackground(plt.gca(), context)
+    pos = {node: [x, y] for node, x, y in zip(network.nodes(), context["x"],
+                                               context["y"])}
 
     # First pass - Green lines
     nx.draw_networkx_edges(network,pos,edgelist=network.edges(),
@@ -713,18 +1588,8 @@ def visualize(network):
     #plt.title=title
 
     # Adjust the plot limits
-    cut = 1.05
-    xmax = cut * max(xx for xx,yy in pos.values())
-    xmin =  min(xx for xx,yy in pos.values())
-    xmin = xmin - (cut * xmin)
-
-
-    ymax = cut * max(yy for xx,yy in pos.values())
-    ymin = (cut) * min(yy for xx,yy in pos.values())
-    ymin = ymin - (cut * ymin)
-
-    plt.xlim(xmin,xmax)
-    plt.ylim(ymin,ymax)
+    plt.xlim(*context["xlim"])
+    plt.ylim(*context["ylim"])
 
     plt.axis('off')
     plt.show()
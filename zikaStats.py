@@ -0,0 +1,323 @@
+"""
+zikaStats.py keeps running statistics of ensembles of simulations, the
+stochastic replicates of zikaSim.py and the scenarios of the -a sweep, without
+keeping their trajectories.  Means and variances are updated with Welford's
+method batch by batch, and quantiles come from a histogram sketch with
+logarithmic bins kept only for the airports asked for, so memory grows with
+airports x time steps and never with the number of replicates.
+"""
+
+# Title:  zikaStats.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+import numpy as np
+
+
+# GLOBAL
+SKETCH_BINS = 64  # histogram bins of a quantile sketch, the first holds 0
+
+
+class OnlineMoments(object):
+    """
+    Running count, mean and variance of every cell of an array, updated a
+    batch at a time (Welford's method, combined over batches)
+
+    Attributes:
+        count: number of values seen in every cell
+        mean: mean of every cell
+        M2: sum of squared differences from the mean of every cell
+    """
+
+    def __init__(self, shape):
+        self.count = np.zeros(shape, dtype=np.int64)
+        self.mean = np.zeros(shape)
+        self.M2 = np.zeros(shape)
+
+    def add(self, values, mask=None, at=None):
+        """
+        Fold a batch of values into the moments
+
+        Args:
+            values: (batch, *shape) array, or (batch, *shape[1:]) with at
+            mask: optional boolean array like values of the values to count,
+                the others are left out
+            at: optional index along the first axis of the cells to update
+
+        Returns:
+            Nothing
+        """
+
+        cells = slice(None) if at is None else at
+        values = np.asarray(values, dtype=np.float64)
+        if mask is None:
+            mask = np.ones(values.shape, dtype=bool)
+        count = mask.sum(axis=0)
+        batchMean = np.where(mask, values, 0).sum(axis=0) / \
+            np.maximum(count, 1)
+        batchM2 = np.where(mask, (values - batchMean) ** 2, 0).sum(axis=0)
+
+        seen = self.count[cells]
+        combined = seen + count
+        delta = batchMean - self.mean[cells]
+        self.mean[cells] += delta * count / np.maximum(combined, 1)
+        self.M2[cells] += batchM2 + delta ** 2 * seen * count / \
+            np.maximum(combined, 1)
+        self.count[cells] = combined
+
+    @property
+    def variance(self):
+        """
+        Sample variance of every cell, 0 with fewer than two values
+        """
+
+        return np.where(self.count > 1,
+                        self.M2 / np.maximum(self.count - 1, 1), 0)
+
+    @property
+    def std(self):
+        """
+        Sample standard deviation of every cell
+        """
+
+        return np.sqrt(self.variance)
+
+
+class QuantileSketch(object):
+    """
+    Histogram of the values of every cell of an array with logarithmic bins,
+    so quantiles of any number of values can be read back from a fixed amount
+    of memory.  Bin 0 holds exact zeros, and each of the others is a constant
+    ratio wide up to maxValue.
+
+    Attributes:
+        counts: (*shape, bins) number of values in every bin of every cell
+        scale: bins per unit of log(1 + value)
+    """
+
+    def __init__(self, shape, maxValue, bins=SKETCH_BINS):
+        self.counts = np.zeros(tuple(np.atleast_1d(shape)) + (bins,),
+                               dtype=np.uint32)
+        self.scale = (bins - 1) / np.log1p(maxValue)
+
+    def add(self, values, at=None):
+        """
+        Count a batch of values
+
+        Args:
+            values: (batch, *shape) array of non-negative values, or
+                (batch, *shape[1:]) with at
+            at: optional index along the first axis of the cells to update
+
+        Returns:
+            Nothing
+        """
+
+        counts = self.counts if at is None else self.counts[at]
+        bins = counts.shape[-1]
+        cells = counts[..., 0].size
+        values = np.asarray(values, dtype=np.float64).reshape(-1, cells)
+        binOf = np.where(values > 0,
+                         np.minimum(1 + (np.log1p(values) *
+                                         self.scale).astype(np.int64),
+                                    bins - 1), 0)
+        counts += np.bincount((np.arange(cells) * bins + binOf).ravel(),
+                              minlength=cells * bins).reshape(
+                                  counts.shape).astype(np.uint32)
+
+    def quantile(self, q, column=None):
+        """
+        Estimate quantiles of every cell, interpolating inside their bins,
+        from one cumulative count however many quantiles are asked for
+
+        Args:
+            q: quantile between 0 and 1, or a sequence of them
+            column: optional index along the last axis of the cells to read
+
+        Returns:
+            Array of the cell shape, 0 for cells without values, with a
+            leading axis per quantile for a sequence
+        """
+
+        counts = self.counts if column is None else \
+            self.counts[..., column, :]
+        cumulative = np.cumsum(counts, axis=-1, dtype=np.int64)
+        estimates = list()
+        for value in np.atleast_1d(q):
+            target = value * cumulative[..., -1:]
+            binOf = np.minimum((cumulative < np.maximum(target, 1)).sum(
+                axis=-1, keepdims=True), counts.shape[-1] - 1)
+            inBin = np.take_along_axis(counts, binOf, axis=-1)
+            before = np.take_along_axis(cumulative, binOf, axis=-1) - inBin
+            fraction = np.clip((target - before) / np.maximum(inBin, 1), 0, 1)
+
+            lower = np.expm1(np.maximum(binOf - 1, 0) / self.scale)
+            upper = np.expm1(binOf / self.scale)
+            estimates.append(np.where(binOf > 0,
+                                      lower + fraction * (upper - lower),
+                                      0)[..., 0])
+
+        return estimates[0] if np.ndim(q) == 0 else np.stack(estimates)
+
+
+class EnsembleStats(object):
+    """
+    Running statistics of the infected of every airport over replicates of
+    one simulation, fed a batch of replicates at a time, one time step after
+    another, then finished with the end state of the batch
+
+    Attributes:
+        IATA: IATA codes in array order
+        index: {IATA: array position}
+        days: days of the time steps
+        pop: population of every airport
+        infected: OnlineMoments of the infected, (time steps, airports)
+        sketched: IATA codes of the airports with quantiles
+        sketchColumns: array position of every sketched airport
+        sketch: QuantileSketch of the infected, (time steps, sketched
+            airports)
+        peakDay: OnlineMoments of the day of the most infected at every
+            airport, over the replicates that infect it
+        attackRate: OnlineMoments of the share of the population infected
+            by the end at every airport
+        reached: number of replicates infecting every airport
+        replicates: number of replicates finished
+        peak, peakAt: most infected so far and its day, per replicate and
+            airport of the current batch
+    """
+
+    def __init__(self, IATA, days, pop, sketched=None, bins=SKETCH_BINS):
+        self.IATA = list(IATA)
+        self.index = {airport: i for i, airport in enumerate(self.IATA)}
+        self.days = np.asarray(days)
+        self.pop = np.asarray(pop, dtype=np.float64)
+        self.infected = OnlineMoments((len(self.days), len(self.IATA)))
+        # A sketch of every airport is days x airports x bins counts, so
+        # only the airports that are plotted are sketched
+        self.sketched = self.IATA if sketched is None else \
+            [airport for airport in sketched if airport in self.index]
+        self.sketchColumns = np.array([self.index[airport]
+                                       for airport in self.sketched],
+                                      dtype=np.int64)
+        self.sketch = QuantileSketch(
+            (len(self.days), len(self.sketched)),
+            self.pop[self.sketchColumns].max(initial=1), bins)
+        self.peakDay = OnlineMoments(len(self.IATA))
+        self.attackRate = OnlineMoments(len(self.IATA))
+        self.reached = np.zeros(len(self.IATA), dtype=np.int64)
+        self.replicates = 0
+        self.peak = None
+        self.peakAt = None
+
+    def add(self, step, I):
+        """
+        Fold the infected of one time step of the current batch in
+
+        Args:
+            step: time step number
+            I: (replicates, airports) infected of the batch
+
+        Returns:
+            Nothing
+        """
+
+        if step == 0 or self.peak is None:
+            self.peak = np.zeros(I.shape, dtype=I.dtype)
+            self.peakAt = np.zeros(I.shape, dtype=np.int64)
+
+        self.infected.add(I, at=step)
+        if len(self.sketched):
+            self.sketch.add(I[:, self.sketchColumns], at=step)
+
+        higher = I > self.peak
+        self.peak[higher] = I[higher]
+        self.peakAt[higher] = self.days[step]
+
+    def finish(self, I, R):
+        """
+        Fold the end state of the current batch in
+
+        Args:
+            I: (replicates, airports) infected at the end
+            R: (replicates, airports) recovered at the end
+
+        Returns:
+            Nothing
+        """
+
+        reached = (I + R) > 0
+        self.peakDay.add(self.peakAt, mask=reached & (self.peak > 0))
+        self.attackRate.add((I + R) / self.pop)
+        self.reached += reached.sum(axis=0)
+        self.replicates += len(I)
+        self.peak = None
+        self.peakAt = None
+
+    def quantile(self, q, airport=None):
+        """
+        Estimated quantiles of the infected of the sketched airports at every
+        time step
+
+        Args:
+            q: quantile between 0 and 1, or a sequence of them
+            airport: optional IATA code of one sketched airport
+
+        Returns:
+            (time steps, sketched airports) array, (time steps,) for one
+            airport, with a leading axis per quantile for a sequence
+        """
+
+        if airport is None:
+            return self.sketch.quantile(q)
+
+        return self.sketch.quantile(q, self.sketched.index(airport))
+
+    @property
+    def chance(self):
+        """
+        {IATA: share of the replicates infecting the airport}
+        """
+
+        return dict(zip(self.IATA, (self.reached /
+                                    max(self.replicates, 1)).tolist()))
+
+
+class SweepStats(object):
+    """
+    Running statistics of the total recovered of the -a sweep for every hub
+    the infection starts at, fed one scenario at a time
+
+    Attributes:
+        airports: IATA codes of the hubs
+        index: {IATA: position in airports}
+        recovered: OnlineMoments of the total recovered, per hub
+        worst: highest total recovered per hub
+        worstMonth: month of the highest total recovered per hub
+    """
+
+    def __init__(self, airports):
+        self.airports = list(airports)
+        self.index = {airport: i for i, airport in enumerate(self.airports)}
+        self.recovered = OnlineMoments(len(self.airports))
+        self.worst = np.zeros(len(self.airports))
+        self.worstMonth = np.zeros(len(self.airports), dtype=np.int64)
+
+    def add(self, airport, month, recovered):
+        """
+        Fold in one scenario, in any order, the earliest of tied months
+        being the worst
+
+        Args:
+            airport: IATA code of the hub infected
+            month: month of the infection date
+            recovered: total recovered at the end
+
+        Returns:
+            Nothing
+        """
+
+        i = self.index[airport]
+        self.recovered.add([recovered], at=i)
+        if recovered > self.worst[i] or self.recovered.count[i] == 1 or \
+                recovered == self.worst[i] and month < self.worstMonth[i]:
+            self.worst[i] = recovered
+            self.worstMonth[i] = month
@@ -0,0 +1,370 @@
+#!/usr/bin/python3
+"""
+zikaSweep.py runs sweeps of zikaSim.py scenarios, every combination of seed
+city, infection date, TAU, VACCINATE_PERC and SCREEN_PERC, on a pool of worker
+processes.  The network arrays are placed in shared memory once and every
+worker attaches to them, so tasks only carry their scenario parameters.
+Results are written to the output file in the order they complete, and with
+--trajectories the I, S, V, R history of every scenario is written to a
+memory mapped zikaHistory.TrajectoryStore folder.
+
+Usage:
+    zikaSweep.py [-v] [--workers=<processes>] [--c=<IATA,...>] [--d=<day,...>]
+        [--tau=<tau,...>] [--vac=<vaccinate rate,...>]
+        [--screen=<screen passenger rate,...>] [--out=<results .csv>]
+        [--monthly=<monthly flows .npz>] [--trajectories=<folder>] [--jit]
+        <airport database> <route database> <mosquito curves database>
+
+Flags:
+    -v          Vaccinate using O'Leary vaccination formula (1-(1/tau)) default
+
+Option:
+    --workers   Number of worker processes (number of CPUs is default)
+    --c         IATA codes of the hubs to start infection at (all is default)
+    --d         Start days of infection (first day of every month is default)
+    --tau       Ro values to sweep (4 is default)
+    --vac       Vaccination rates to sweep, turns on vaccination
+    --screen    Screen rates to sweep (0 is default)
+    --out       File to write results to (./sweepResults.csv is default)
+    --monthly   Monthly passenger flows from convertAirlinePassenger.py
+    --trajectories  Folder to write the history of every scenario to
+    --jit       Step with the Numba compiled loop of zikaKernel.py
+"""
+
+# Title:  zikaSweep.py
+# Updated Authors: Tilak Patel and Derrick Williams
+
+# python zikaSweep.py --workers=32 --tau=2,4,6 --screen=0,0.5
+# ./Data/airportsMin.csv ./Data/airlineRoutesPassengerData.csv
+# ./Data/mosCurves.csv
+
+import contextlib
+import getopt
+import io
+import multiprocessing
+import os
+import sys
+from multiprocessing import shared_memory
+
+import numpy as np
+from scipy import sparse
+
+import zikaCache
+import zikaEngine
+import zikaHistory
+
+
+# GLOBAL
+SHARED_ARRAYS = ["pop", "MOS", "flow.data", "flow.indices", "flow.indptr",
+                 "arrivals.data", "arrivals.indices", "arrivals.indptr",
+                 "monthlyFlow"]
+RESULT_HEADER = ["CITY_TO_INFECT", "DATE_TO_INFECT", "TAU", "VACCINATE_PERC",
+                 "SCREEN_PERC", "recovered", "airportsInfected"]
+workerArrays = None
+workerBlocks = list()
+workerStore = None
+
+
+def shareArrays(arrays):
+    """
+    Copy the network arrays into shared memory blocks
+
+    Args:
+        arrays: network arrays from zikaEngine.buildArrays()
+
+    Returns:
+        blocks: the SharedMemory blocks, to be closed and unlinked by the
+            caller when the sweep is done
+        layout: picklable description of the blocks for attachArrays()
+    """
+
+    blocks = list()
+    layout = {"nodes": arrays["nodes"],
+              "IATA": arrays["IATA"],
+              "flowShape": arrays["flow"].shape,
+              "arrivalsShape": arrays["arrivals"].shape,
+              "blocks": dict()}
+
+    for key in SHARED_ARRAYS:
+        value = arrays
+        for part in key.split("."):
+            value = value.get(part) if isinstance(value, dict) else \
+                getattr(value, part)
+        if value is None:
+            continue
+        block = shared_memory.SharedMemory(create=True,
+                                           size=max(value.nbytes, 1))
+        np.ndarray(value.shape, value.dtype, buffer=block.buf)[...] = value
+        blocks.append(block)
+        layout["blocks"][key] = (block.name, value.shape, value.dtype.str)
+
+    return blocks, layout
+
+
+def attachArrays(layout):
+    """
+    Rebuild the network arrays on top of shared memory blocks, without copies
+
+    Args:
+        layout: description of the blocks from shareArrays()
+
+    Returns:
+        Network arrays like zikaEngine.buildArrays()
+    """
+
+    shared = dict()
+    for key, (name, shape, dtype) in layout["blocks"].items():
+        block = shared_memory.SharedMemory(name=name)
+        workerBlocks.append(block)
+        shared[key] = np.ndarray(shape, np.dtype(dtype), buffer=block.buf)
+
+    return {"nodes": layout["nodes"],
+            "IATA": layout["IATA"],
+            "index": {airport: i for i, airport in enumerate(layout["IATA"])},
+            "pop": shared["pop"],
+            "MOS": shared["MOS"],
+            "flow": sparse.csr_matrix((shared["flow.data"],
+                                       shared["flow.indices"],
+                                       shared["flow.indptr"]),
+                                      shape=layout["flowShape"], copy=False),
+            "arrivals": sparse.csr_matrix((shared["arrivals.data"],
+                                           shared["arrivals.indices"],
+                                           shared["arrivals.indptr"]),
+                                          shape=layout["arrivalsShape"],
+                                          copy=False),
+            "originPop": shared["pop"][shared["flow.indices"]].astype(
+                np.float64),
+            "operators": dict(),
+            "monthlyFlow": shared.get("monthlyFlow")}
+
+
+def setupWorker(layout, trajectories=None):
+    """
+    Pool initializer, attach this worker to the shared network arrays
+
+    Args:
+        layout: description of the blocks from shareArrays()
+        trajectories: optional TrajectoryStore folder to write the history
+            of every task to
+
+    Returns:
+        Nothing
+    """
+    global workerArrays, workerStore
+
+    workerArrays = attachArrays(layout)
+    if trajectories is not None:
+        workerStore = zikaHistory.TrajectoryStore(trajectories, "r+")
+
+
+def runTask(task):
+    """
+    Run one sweep scenario in a worker, a year from the infection date like
+    the -a sweep of zikaSim.py
+
+    Args:
+        task: (scenario number, city, date, params) where params are the
+            simulation parameters for zikaEngine.infection() plus
+            SIMULATION_LENGTH
+
+    Returns:
+        (scenario number, total recovered, number of airports infected)
+    """
+
+    scenario, city, date, params = task
+    history = None if workerStore is None else workerStore.history(scenario)
+    state = zikaEngine.setupState(workerArrays, [(city, date)], params,
+                                  history)
+    with contextlib.redirect_stdout(io.StringIO()):
+        for j in zikaEngine.runAllTimeSteps(date, params["SIMULATION_LENGTH"],
+                                            params["INCUBATION"]):
+            zikaEngine.infection(workerArrays, state, j, params)
+    if history is not None:
+        workerStore.finish(scenario, history)
+
+    return (scenario, int(state["R"].sum()),
+            int(np.count_nonzero(state["R"] + state["I"])))
+
+
+def sweepTasks(cities, dates, taus, vaccinates, screens, params):
+    """
+    List every combination of the sweep values as worker tasks
+
+    Args:
+        cities: IATA codes to infect
+        dates: dates to infect
+        taus: TAU values
+        vaccinates: VACCINATE_PERC values, or None for 1-(1/tau)
+        screens: SCREEN_PERC values
+        params: base simulation parameters the combinations are applied to
+
+    Returns:
+        List of tasks for runTask()
+    """
+
+    tasks = list()
+    for tau in taus:
+        for vaccinate in (vaccinates or [1 - (1/tau)]):
+            for screen in screens:
+                taskParams = dict(params, TAU=tau, VACCINATE_PERC=vaccinate,
+                                  SCREEN_PERC=screen)
+                for city in cities:
+                    for date in dates:
+                        tasks.append((len(tasks), city, date, taskParams))
+
+    return tasks
+
+
+def createTrajectories(directory, IATA, tasks):
+    """
+    Allocate a TrajectoryStore with a chunk for every task, numbered like the
+    tasks
+
+    Args:
+        directory: folder to create
+        IATA: IATA codes of the airports in array order
+        tasks: tasks from sweepTasks()
+
+    Returns:
+        The zikaHistory.TrajectoryStore opened for writing
+    """
+
+    numSteps = max(len(zikaEngine.runAllTimeSteps(
+        date, params["SIMULATION_LENGTH"], params["INCUBATION"]))
+                   for scenario, city, date, params in tasks)
+    scenarios = [{"CITY_TO_INFECT": city, "DATE_TO_INFECT": date,
+                  "TAU": params["TAU"],
+                  "VACCINATE_PERC": params["VACCINATE_PERC"],
+                  "SCREEN_PERC": params["SCREEN_PERC"]}
+                 for scenario, city, date, params in tasks]
+
+    return zikaHistory.TrajectoryStore.create(directory, IATA, scenarios,
+                                              numSteps)
+
+
+def runSweep(arrays, tasks, workers=None, output=None, trajectories=None):
+    """
+    Run the tasks on a process pool, yielding results as they complete
+
+    Args:
+        arrays: network arrays from zikaEngine.buildArrays()
+        tasks: tasks from sweepTasks()
+        workers: number of worker processes, number of CPUs if None
+        output: optional open file to append a .csv row to per result
+        trajectories: optional folder for a TrajectoryStore of the history of
+            every task
+
+    Returns:
+        Generator of (task, total recovered, number of airports infected)
+    """
+
+    if trajectories is not None:
+        createTrajectories(trajectories, arrays["IATA"], tasks)
+    blocks, layout = shareArrays(arrays)
+    workers = workers or os.cpu_count()
+    chunksize = max(1, len(tasks) // (workers * 16))
+
+    try:
+        with multiprocessing.Pool(workers, setupWorker,
+                                  (layout, trajectories)) as pool:
+            for scenario, recovered, infected in \
+                    pool.imap_unordered(runTask, tasks, chunksize):
+                task = tasks[scenario]
+                if output is not None:
+                    params = task[3]
+                    output.write(",".join(str(value) for value in [
+                        task[1], task[2], params["TAU"],
+                        params["VACCINATE_PERC"], params["SCREEN_PERC"],
+                        recovered, infected]) + "\n")
+                    output.flush()
+                yield task, recovered, infected
+    finally:
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def main():
+    """
+    Load the network and run the sweep given on the command line
+
+    Args:
+        Nothing
+
+    Returns:
+        Nothing
+    """
+
+    import zikaSim
+
+    opts, args = getopt.getopt(sys.argv[1:], "v", ["workers=", "c=", "d=",
+                                                   "tau=", "vac=", "screen=",
+                                                   "out=", "monthly=",
+                                                   "trajectories=", "jit"])
+
+    if len(args) < 3:
+        print(__doc__)
+        exit()
+
+    workers = None
+    vaccinate = False
+    cities = None
+    dates = list(range(1, zikaSim.DAYS_IN_YEAR, zikaSim.DAYS_IN_MONTH))
+    taus = [zikaSim.TAU]
+    vaccinates = None
+    screens = [zikaSim.SCREEN_PERC]
+    outputFile = "./sweepResults.csv"
+    monthly = None
+    trajectories = None
+    jit = False
+    for opt, par in opts:
+        if opt == "-v":
+            vaccinate = True
+        elif opt == "--workers":
+            workers = int(par)
+        elif opt == "--c":
+            cities = par.split(",")
+        elif opt == "--d":
+            dates = [int(value) for value in par.split(",")]
+        elif opt == "--tau":
+            taus = [float(value) for value in par.split(",")]
+        elif opt == "--vac":
+            vaccinates = [float(value) for value in par.split(",")]
+            vaccinate = True
+        elif opt == "--screen":
+            screens = [float(value) for value in par.split(",")]
+        elif opt == "--out":
+            outputFile = par
+        elif opt == "--monthly":
+            monthly = par
+        elif opt == "--trajectories":
+            trajectories = par
+        elif opt == "--jit":
+            jit = True
+
+    network = zikaCache.cachedNetwork(args[0], args[1], args[2],
+                                      zikaSim.create_network, routes=False,
+                                      monthly=monthly)
+    simulation = zikaSim.Simulation(network, vaccinate=vaccinate, jit=jit)
+    tasks = sweepTasks(cities or list(simulation.approvedAirports), dates,
+                       taus, vaccinates, screens, simulation.params())
+
+    print("-- Starting sweep of", len(tasks), "simulations --\n")
+    sys.stdout.flush()
+
+    with open(outputFile, 'w') as output:
+        output.write(",".join(RESULT_HEADER) + "\n")
+        for done, result in enumerate(runSweep(simulation.getArrays(), tasks,
+                                               workers, output,
+                                               trajectories), 1):
+            if done % 1000 == 0:
+                print("-- Finished", done, "of", len(tasks), "--\n")
+                sys.stdout.flush()
+
+    print("-- Results written to", outputFile, "--\n")
+    if trajectories is not None:
+        print("-- Trajectories written to", trajectories, "--\n")
+
+
+if __name__ == '__main__':
+    main()